@@ -0,0 +1,121 @@
+# Almacén de audios direccionado por contenido: cada .wav se guarda una vez con su hash SHA-256 como id
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+
+AUDIO_STORE_DIR = os.path.abspath(os.environ.get('AUDIO_STORE_DIR', 'audios'))
+MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_BYTES', 512 * 1024 * 1024))
+AUDIO_STORE_MAX_BYTES = int(os.environ.get('AUDIO_STORE_MAX_BYTES', 10 * 1024 * 1024 * 1024))
+COPY_BLOCK_SIZE = 1024 * 1024
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+def is_valid_audio_id(audio_id):
+    return audio_id is not None and re.fullmatch(r'[0-9a-f]{64}', audio_id) is not None
+
+
+def audio_path(audio_id):
+    if not is_valid_audio_id(audio_id):
+        raise ValueError(f"Invalid audio id: {audio_id!r}")
+    return os.path.join(AUDIO_STORE_DIR, f"{audio_id}.wav")
+
+
+def audio_url(audio_id):
+    return f"/audio/{audio_id}"
+
+
+def touch_audio(audio_id):
+    # Marcar el audio como usado recientemente para que no sea el primero en expulsarse
+    try:
+        os.utime(audio_path(audio_id))
+    except FileNotFoundError:
+        pass
+
+
+def store_stream(stream, max_bytes=MAX_UPLOAD_BYTES):
+    """
+    Copia un stream binario al almacén por bloques, calculando el hash mientras se escribe.
+    Devuelve el id del audio; si ya existía no se duplica.
+    """
+    os.makedirs(AUDIO_STORE_DIR, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    with tempfile.NamedTemporaryFile(dir=AUDIO_STORE_DIR, suffix='.part', delete=False) as tmp:
+        try:
+            while True:
+                block = stream.read(COPY_BLOCK_SIZE)
+                if not block:
+                    break
+                size += len(block)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"Upload exceeds {max_bytes} bytes")
+                digest.update(block)
+                tmp.write(block)
+        except BaseException:
+            tmp.close()
+            os.remove(tmp.name)
+            raise
+    return _commit(tmp.name, digest.hexdigest())
+
+
+def store_file(path, move=False):
+    """
+    Guarda un archivo local en el almacén (moviéndolo si move es True) y devuelve su id.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(COPY_BLOCK_SIZE), b''):
+            digest.update(block)
+    audio_id = digest.hexdigest()
+
+    os.makedirs(AUDIO_STORE_DIR, exist_ok=True)
+    if move:
+        return _commit(path, audio_id)
+    if os.path.exists(audio_path(audio_id)):
+        touch_audio(audio_id)
+    else:
+        tmp_path = audio_path(audio_id) + '.part'
+        shutil.copyfile(path, tmp_path)
+        os.replace(tmp_path, audio_path(audio_id))
+        _evict(keep=audio_id)
+    return audio_id
+
+
+def _commit(tmp_path, audio_id):
+    # Mover el archivo a su nombre definitivo; si el audio ya estaba se descarta la copia
+    if os.path.exists(audio_path(audio_id)):
+        os.remove(tmp_path)
+        touch_audio(audio_id)
+    else:
+        os.replace(tmp_path, audio_path(audio_id))
+        _evict(keep=audio_id)
+    return audio_id
+
+
+def _evict(keep):
+    # Borrar los audios usados hace más tiempo hasta cumplir el presupuesto de disco (nunca el recién guardado)
+    files = []
+    for name in os.listdir(AUDIO_STORE_DIR):
+        path = os.path.join(AUDIO_STORE_DIR, name)
+        try:
+            if name.endswith('.wav'):
+                files.append((os.path.getmtime(path), os.path.getsize(path), path))
+        except FileNotFoundError:
+            pass  # Otro proceso lo borró mientras se listaba
+    files.sort()
+    total = sum(size for _, size, _ in files)
+    for _, size, path in files:
+        if total <= AUDIO_STORE_MAX_BYTES:
+            break
+        if path == audio_path(keep):
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
@@ -0,0 +1,71 @@
+# Motor de análisis en paralelo: los análisis independientes de un audio (pitch, formantes, intensidad,
+# espectrograma y espectro) y los bloques de los archivos largos se reparten en un pool de procesos
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import parselmouth
+
+import graficas
+from analisis_por_bloques import read_wav_memmap, use_block_analysis, block_ranges, analyze_block, merge_blocks, BLOCK_SECONDS
+
+# Con 1 (valor por defecto) compute_analysis usa el análisis en serie
+PARALLEL_WORKERS = int(os.environ.get('ANALYSIS_PARALLEL_WORKERS', 1))
+
+engine = None
+
+
+def run_pass(pass_name, path):
+    # Se ejecuta en un proceso del pool: cada proceso lee el audio y corre uno de graficas.ANALYSIS_PASSES
+    snd = parselmouth.Sound(path)
+    return getattr(graficas, pass_name)(snd)
+
+
+class ParallelAnalysisEngine:
+    """
+    Ejecuta los mismos análisis que AudioAnalysis y analyze_audio_in_blocks, pero repartidos en
+    procesos. Los resultados se unen con el mismo código que la versión en serie, por lo que son
+    numéricamente idénticos.
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or os.cpu_count()
+        self.executor = None
+
+    def get_executor(self):
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context('spawn'))
+        return self.executor
+
+    def analyze(self, path):
+        if use_block_analysis(path):
+            return self.analyze_blocks(path)
+        return self.analyze_passes(path)
+
+    def analyze_passes(self, path):
+        # Un proceso por análisis; mientras tanto este proceso carga la señal para el oscilograma
+        executor = self.get_executor()
+        futures = [executor.submit(run_pass, analysis_pass.__name__, path) for analysis_pass in graficas.ANALYSIS_PASSES]
+        snd = parselmouth.Sound(path)
+        return graficas.AudioAnalysis(snd, results=[future.result() for future in futures])
+
+    def analyze_blocks(self, path, block_seconds=BLOCK_SECONDS):
+        # Un trabajo por bloque; merge_blocks los une en orden
+        data, rate, _ = read_wav_memmap(path)
+        executor = self.get_executor()
+        futures = [executor.submit(analyze_block, path, core_start, core_stop)
+                   for core_start, core_stop in block_ranges(len(data), rate, block_seconds)]
+        return merge_blocks(path, [future.result() for future in futures])
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+
+def get_engine():
+    # Motor compartido por el proceso, creado en el primer uso
+    global engine
+    if engine is None:
+        engine = ParallelAnalysisEngine(PARALLEL_WORKERS)
+    return engine
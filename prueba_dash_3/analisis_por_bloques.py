@@ -0,0 +1,201 @@
+# Análisis por bloques para grabaciones largas: la memoria depende del tamaño del bloque, no del archivo
+import math
+import os
+import struct
+
+import numpy as np
+import parselmouth
+
+from graficas import (AudioAnalysis, analyze_pitch, analyze_formants, analyze_intensity, analyze_spectrogram,
+                      build_spectrogram_pyramid, welch_spectrum)
+from metricas import timed
+
+BLOCK_SECONDS = float(os.environ.get('ANALYSIS_BLOCK_SECONDS', 30))
+OVERLAP_SECONDS = 1.0  # Contexto a cada lado del bloque (mayor que las ventanas de pitch y formantes)
+# Duración a partir de la cual compute_analysis usa el análisis por bloques
+BLOCK_ANALYSIS_MIN_SECONDS = float(os.environ.get('BLOCK_ANALYSIS_MIN_SECONDS', 10 * 60))
+SPECTROGRAM_TIME_STEP = 0.002  # Paso por defecto de Sound.to_spectrogram
+SPECTROGRAM_MAX_TOTAL_COLUMNS = 20000  # Columnas máximas del espectrograma de todo el archivo
+
+# (formato, bits por muestra) -> (dtype, factor de escala a [-1, 1])
+WAV_DTYPES = {
+    (1, 16): ('<i2', 1 / 32768),
+    (1, 32): ('<i4', 1 / 2 ** 31),
+    (3, 32): ('<f4', 1.0),
+    (3, 64): ('<f8', 1.0),
+}
+
+
+def read_wav_memmap(path):
+    """
+    Abre los datos PCM de un .wav como memmap (frames × canales) sin cargarlos en memoria.
+    Devuelve (memmap, frecuencia de muestreo, factor de escala a [-1, 1]).
+    """
+    fmt = None
+    with open(path, 'rb') as f:
+        riff, _, wave_id = struct.unpack('<4sI4s', f.read(12))
+        if riff != b'RIFF' or wave_id != b'WAVE':
+            raise ValueError(f"{path} is not a RIFF/WAVE file")
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError(f"{path} has no data chunk")
+            chunk_id, chunk_size = struct.unpack('<4sI', header)
+            if chunk_id == b'data':
+                offset = f.tell()
+                break
+            if chunk_id == b'fmt ':
+                fmt_data = f.read(chunk_size)
+                audio_format, channels, rate, _, _, bits = struct.unpack('<HHIIHH', fmt_data[:16])
+                if audio_format == 0xFFFE and len(fmt_data) >= 26:  # WAVE_FORMAT_EXTENSIBLE
+                    audio_format = struct.unpack('<H', fmt_data[24:26])[0]
+                fmt = (audio_format, channels, rate, bits)
+            else:
+                f.seek(chunk_size, 1)
+            if chunk_size % 2:
+                f.seek(1, 1)
+
+    if fmt is None:
+        raise ValueError(f"{path} has no fmt chunk")
+    audio_format, channels, rate, bits = fmt
+    if (audio_format, bits) not in WAV_DTYPES:
+        raise ValueError(f"Unsupported WAV encoding (format {audio_format}, {bits} bits)")
+    dtype, scale = WAV_DTYPES[(audio_format, bits)]
+
+    # Un tamaño de datos 0 o incompleto (archivo todavía abierto) se deduce del tamaño del archivo
+    frame_bytes = channels * bits // 8
+    available = os.path.getsize(path) - offset
+    data_size = chunk_size if 0 < chunk_size <= available else available
+    n_frames = data_size // frame_bytes
+
+    data = np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(n_frames, channels))
+    return data, rate, scale
+
+
+def use_block_analysis(path):
+    # Sólo los .wav PCM largos se analizan por bloques; el resto va por el análisis completo
+    try:
+        data, rate, _ = read_wav_memmap(path)
+    except (ValueError, OSError, struct.error):
+        return False
+    return len(data) / rate >= BLOCK_ANALYSIS_MIN_SECONDS
+
+
+def pool_columns(times, power, pool):
+    # Promedia (en potencia) grupos de pool columnas consecutivas
+    if pool <= 1 or len(times) == 0:
+        return times, power
+    starts = np.arange(0, len(times), pool)
+    counts = np.diff(np.append(starts, len(times)))
+    return np.add.reduceat(times, starts) / counts, np.add.reduceat(power, starts, axis=1) / counts
+
+
+def block_ranges(n_frames, rate, block_seconds=BLOCK_SECONDS):
+    # Partes centrales [inicio, fin) de cada bloque, en muestras
+    block = max(int(block_seconds * rate), 1)
+    return [(core_start, min(core_start + block, n_frames)) for core_start in range(0, n_frames, block)]
+
+
+def spectrogram_pool(n_frames, rate):
+    # El espectrograma completo se guarda con una resolución temporal acotada
+    duration = n_frames / rate
+    return max(1, math.ceil(duration / SPECTROGRAM_TIME_STEP / SPECTROGRAM_MAX_TOTAL_COLUMNS))
+
+
+@timed('analyze_block')
+def analyze_block(path, core_start, core_stop, overlap_seconds=OVERLAP_SECONDS):
+    """
+    Analiza un bloque con su contexto a ambos lados y devuelve sólo los frames de la parte
+    central [core_start, core_stop). Es independiente de los demás bloques, así que puede
+    ejecutarse en otro proceso (ver analisis_paralelo.py).
+    """
+    data, rate, scale = read_wav_memmap(path)
+    n_frames = len(data)
+    overlap = int(overlap_seconds * rate)
+    start, stop = max(core_start - overlap, 0), min(core_stop + overlap, n_frames)
+    t0, t1 = core_start / rate, core_stop / rate
+
+    # Bloque en mono, escalado a [-1, 1]
+    values = np.asarray(data[start:stop], dtype=np.float64).mean(axis=1) * scale
+    snd = parselmouth.Sound(values, sampling_frequency=rate, start_time=start / rate)
+
+    # Los mismos análisis que AudioAnalysis, recortados a la parte central
+    block = {}
+    pitch = analyze_pitch(snd)
+    keep = core_mask(pitch['pitch_times'], t0, t1)
+    block['pitch_times'] = pitch['pitch_times'][keep]
+    block['pitch_values'] = pitch['pitch_values'][keep]
+
+    formants = analyze_formants(snd)
+    keep = core_mask(formants['formant_times'], t0, t1)
+    for name in ('formant_times', 'formant_values', 'formant_bandwidths'):
+        block[name] = formants[name][keep]
+
+    intensity = analyze_intensity(snd)
+    keep = core_mask(intensity['intensity_times'], t0, t1)
+    block['intensity_times'] = intensity['intensity_times'][keep]
+    block['intensity_values'] = intensity['intensity_values'][keep]
+
+    spectrogram = analyze_spectrogram(snd)
+    keep = core_mask(spectrogram['spectrogram_times'], t0, t1)
+    power = 10 ** (spectrogram['spectrogram_db'][:, keep] / 10)
+    block['spectrogram_times'], block['spectrogram_power'] = pool_columns(
+        spectrogram['spectrogram_times'][keep], power, spectrogram_pool(n_frames, rate))
+    block['spectrogram_frequencies'] = spectrogram['spectrogram_frequencies']
+
+    # Espectro de Welch de la parte central, ponderado después por su número de muestras
+    # (mismos segmentos y frecuencias que analyze_spectrum)
+    block['spectrum_frequencies'], block['psd'] = welch_spectrum(values[core_start - start:core_stop - start], rate)
+    block['n_samples'] = core_stop - core_start
+    return block
+
+
+@timed('merge_blocks')
+def merge_blocks(path, blocks):
+    """
+    Une los resultados de analyze_block (en orden) en un AudioAnalysis.
+    """
+    data, rate, scale = read_wav_memmap(path)
+
+    analysis = AudioAnalysis()
+    analysis.sampling_frequency = rate
+    analysis.duration = len(data) / rate
+    # Las muestras no se copian: el oscilograma las lee del memmap
+    analysis.wav_path = os.path.abspath(path)
+    analysis.sample_scale = scale
+    analysis.start_time = 0.5 / rate
+    analysis.time_step = 1 / rate
+
+    for name in ('pitch_times', 'pitch_values', 'formant_times', 'formant_values', 'formant_bandwidths',
+                 'intensity_times', 'intensity_values', 'spectrogram_times'):
+        setattr(analysis, name, np.concatenate([block[name] for block in blocks]))
+
+    voiced = analysis.pitch_values[analysis.pitch_values > 0]
+    analysis.mean_pitch = float(np.mean(voiced)) if len(voiced) else float('nan')
+
+    analysis.spectrogram_frequencies = blocks[0]['spectrogram_frequencies']
+    analysis.spectrogram_db = 10 * np.log10(np.concatenate([block['spectrogram_power'] for block in blocks], axis=1))
+    analysis.spectrogram_levels = build_spectrogram_pyramid(analysis.spectrogram_times, analysis.spectrogram_db)
+
+    weights = np.array([block['n_samples'] for block in blocks], dtype=np.float64)
+    psd = np.sum([block['psd'] * weight for block, weight in zip(blocks, weights)], axis=0) / np.sum(weights)
+    analysis.spectrum_frequencies = blocks[0]['spectrum_frequencies']
+    analysis.spectrum_power = 10 * np.log10(np.maximum(psd, 1e-30))
+
+    return analysis
+
+
+def analyze_audio_in_blocks(path, block_seconds=BLOCK_SECONDS):
+    """
+    Analiza un .wav por bloques superpuestos leídos de un memmap. Cada bloque se analiza con su
+    contexto a ambos lados y sólo se conservan los frames de su parte central, de modo que las
+    pistas se unen sin huecos ni duplicados. El espectro es un promedio de Welch de todos los bloques.
+    """
+    data, rate, _ = read_wav_memmap(path)
+    ranges = block_ranges(len(data), rate, block_seconds)
+    return merge_blocks(path, [analyze_block(path, core_start, core_stop) for core_start, core_stop in ranges])
+
+
+def core_mask(times, t0, t1):
+    # Frames que pertenecen a la parte central [t0, t1) del bloque
+    return (times >= t0) & (times < t1)
@@ -0,0 +1,186 @@
+# Análisis de un corpus de .wav desde la línea de comandos, sin el servidor web.
+#
+#   python analizar_corpus.py grabaciones/ "otros/*.wav" --output resultados --workers 4
+#
+# Por cada archivo se guardan las pistas por frame (pitch, intensidad, formantes) en NPZ o Parquet
+# y un resumen en summary.jsonl. Al volver a ejecutar se saltan los archivos ya analizados.
+import argparse
+import csv
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from exportar import track_arrays
+
+MANIFEST_NAME = 'summary.jsonl'
+
+
+def find_wav_files(inputs):
+    # Directorios (recursivos), globs o archivos sueltos; sin duplicados y en orden estable
+    paths = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            paths.update(glob.glob(os.path.join(item, '**', '*.wav'), recursive=True))
+            paths.update(glob.glob(os.path.join(item, '**', '*.WAV'), recursive=True))
+        else:
+            paths.update(glob.glob(item, recursive=True))
+    return sorted(os.path.abspath(path) for path in paths if os.path.isfile(path))
+
+
+def output_name(path):
+    # Nombre de salida único: nombre del archivo más un hash corto de su ruta
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return f"{stem}-{hashlib.sha1(path.encode()).hexdigest()[:8]}"
+
+
+def summarize(path, analysis, elapsed):
+    voiced = analysis.pitch_values[analysis.pitch_values > 0]
+    summary = {
+        'path': path,
+        'duration': float(analysis.duration),
+        'sampling_frequency': float(analysis.sampling_frequency),
+        'mean_pitch': float(analysis.mean_pitch),
+        'median_pitch': float(np.median(voiced)) if len(voiced) else None,
+        'voiced_fraction': float(len(voiced) / len(analysis.pitch_values)) if len(analysis.pitch_values) else 0.0,
+        'mean_intensity': float(np.nanmean(analysis.intensity_values)) if len(analysis.intensity_values) else None,
+        'analysis_seconds': round(elapsed, 3),
+    }
+    for i in range(analysis.formant_values.shape[1]):
+        values = analysis.formant_values[:, i]
+        values = values[np.isfinite(values)]
+        summary[f'mean_F{i + 1}'] = float(np.mean(values)) if len(values) else None
+    # json no admite NaN
+    return {key: (None if isinstance(value, float) and not np.isfinite(value) else value) for key, value in summary.items()}
+
+
+def write_tracks(tracks, output_dir, name, fmt):
+    # Escritura atómica: primero a un archivo temporal y luego se renombra
+    if fmt == 'npz':
+        path = os.path.join(output_dir, f"{name}.npz")
+        arrays = {f"{track}_{column}": values for track, columns in tracks.items() for column, values in columns.items()}
+        with open(path + '.tmp', 'wb') as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(path + '.tmp', path)
+        return [path]
+
+    import pyarrow as pa  # Opcional: sólo hace falta para --format parquet
+    import pyarrow.parquet as pq
+
+    paths = []
+    for track, columns in tracks.items():
+        path = os.path.join(output_dir, f"{name}.{track}.parquet")
+        pq.write_table(pa.table({column: np.asarray(values) for column, values in columns.items()}), path + '.tmp')
+        os.replace(path + '.tmp', path)
+        paths.append(path)
+    return paths
+
+
+def process_file(path, output_dir, fmt):
+    # Se ejecuta en un proceso del pool
+    from graficas import compute_analysis
+
+    start = time.perf_counter()
+    analysis = compute_analysis(path)
+    elapsed = time.perf_counter() - start
+
+    name = output_name(path)
+    outputs = write_tracks(track_arrays(analysis), output_dir, name, fmt)
+    summary = summarize(path, analysis, elapsed)
+    summary['outputs'] = [os.path.basename(output) for output in outputs]
+    summary['status'] = 'ok'
+    return summary
+
+
+def load_done(manifest_path):
+    # Archivos ya analizados en ejecuciones anteriores
+    done = set()
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Línea incompleta de una ejecución interrumpida
+                if record.get('status') == 'ok':
+                    done.add(record['path'])
+    return done
+
+
+def write_summary_table(manifest_path, output_dir):
+    # Tabla final con el último resumen correcto de cada archivo
+    records = {}
+    with open(manifest_path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get('status') == 'ok':
+                records[record['path']] = record
+    if not records:
+        return None
+
+    columns = [key for key in next(iter(records.values())) if key != 'outputs']
+    path = os.path.join(output_dir, 'summary.csv')
+    with open(path, 'w', newline='') as f:
+        # csv se encarga de las comillas (rutas con comas, comillas o saltos de línea)
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(records.values())
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analiza un corpus de archivos .wav sin el servidor web.")
+    parser.add_argument('inputs', nargs='+', help="Directorios, globs o archivos .wav")
+    parser.add_argument('--output', default='resultados_corpus', help="Directorio de salida")
+    parser.add_argument('--format', choices=('npz', 'parquet'), default='npz', help="Formato de las pistas por frame")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Procesos en paralelo")
+    parser.add_argument('--force', action='store_true', help="Volver a analizar los archivos ya procesados")
+    args = parser.parse_args(argv)
+    if args.format == 'parquet':
+        # Comprobarlo antes de lanzar los procesos, en lugar de que falle cada archivo
+        try:
+            import pyarrow
+        except ImportError:
+            parser.error("--format parquet requiere pyarrow (pip install pyarrow)")
+
+    files = find_wav_files(args.inputs)
+    os.makedirs(args.output, exist_ok=True)
+    manifest_path = os.path.join(args.output, MANIFEST_NAME)
+
+    done = set() if args.force else load_done(manifest_path)
+    pending = [path for path in files if path not in done]
+    print(f"{len(files)} archivos, {len(files) - len(pending)} ya analizados, {len(pending)} pendientes")
+
+    failures = 0
+    with open(manifest_path, 'a') as manifest, \
+            ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        futures = {executor.submit(process_file, path, args.output, args.format): path for path in pending}
+        for i, future in enumerate(as_completed(futures), 1):
+            path = futures[future]
+            try:
+                record = future.result()
+            except Exception as e:
+                failures += 1
+                record = {'path': path, 'status': 'error', 'error': str(e)}
+            # Cada resultado se registra en cuanto termina para poder reanudar
+            manifest.write(json.dumps(record) + '\n')
+            manifest.flush()
+            print(f"[{i}/{len(pending)}] {record['status']}: {path}")
+
+    summary_path = write_summary_table(manifest_path, args.output)
+    if summary_path:
+        print(f"Resumen: {summary_path}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,36 +1,40 @@
 from dash import Dash, html, dcc, Input, Output, State,callback_context, no_update
 from layouts import layout_index, layout_analizar_voz, layout_analizar_wav
-from graficas import analyze_audio
-import parselmouth
+from graficas import (decimate_minmax, draw_waveform, draw_spectrogram, draw_spectrogram_3d, draw_power_spectrum,
+                      draw_combined_pitch_intensity_contour, compact_figure, ANALYSIS_PARAMS)
+from cache_analisis import analysis_cache, cache_key
+from trabajos import submit_analysis, analyze_now, job_status, jobs
+from metricas import (metrics, stage, timed, count_bytes, counted_chunks, TickMonitor, resident_memory_bytes,
+                      profiling_requested, start_profile, dump_profile)
+from almacen_audio import store_stream, store_file, touch_audio, audio_path, audio_url, is_valid_audio_id, UploadTooLarge
+from exportar import EXPORT_FORMATS, iter_export
+from tiempo_real import pack_live_frame
+from fuentes_audio import BrowserSource, PyAudioSource, SyntheticSource, NoAudioData, SAMPLE_WIDTH
+from sesiones import SessionManager, SESSION_COOKIE, new_session_id, is_valid_session_id
 import numpy as np
-import base64
 import plotly.graph_objs as go
-from flask import Flask
-from flask_socketio import SocketIO
-import time
-import pyaudio
-import wave
-import tempfile
+from flask import Flask, Response, request, g, send_file, abort
+from flask_socketio import SocketIO, join_room
 import os
+import time
 
 # Configuración inicial para el audio
 CHUNK = 3200
-FORMAT = pyaudio.paInt16
 CHANNELS = 1
 RATE = 16000
 
-# Variables globales para el audio
-frames = []
-audio = None
-stream = None
-is_recording = False
-data_queue = []  # Lista para almacenar los frames
 buffersize = 5  # Número máximo de frames a almacenar
-
-# Inicializar variables globales para almacenar las últimas gráficas
-last_oscillogram_fig = go.Figure()
-last_spectrogram_fig = go.Figure()
-real_time_analize = False
+live_buckets = 800  # Buckets min/max del oscilograma en vivo
+MAX_RECORDING_SECONDS = 10 * 60  # Duración máxima de una grabación por sesión
+# Origen del audio en vivo: 'browser' (micrófono del navegador), 'server' (PyAudio local) o 'synthetic'
+AUDIO_SOURCE = os.environ.get('AUDIO_SOURCE', 'browser')
+# Con LIVE_STREAMING los datos en vivo se envían por SocketIO en vez de consultarse con el intervalo
+LIVE_STREAMING = os.environ.get('LIVE_STREAMING', '1') == '1'
+# Segundos sin audio del navegador tras los que la transmisión en vivo termina la grabación
+MAX_STALL_SECONDS = float(os.environ.get('LIVE_MAX_STALL_SECONDS', 30))
+
+# Estado de grabación de cada sesión (reemplaza a las variables globales)
+sessions = SessionManager(max_samples=MAX_RECORDING_SECONDS * RATE, live_samples=buffersize * CHUNK, rate=RATE)
  
 # Configurar Flask y SocketIO
 server = Flask(__name__)
@@ -39,6 +43,64 @@ app = Dash(__name__, server=server, suppress_callback_exceptions=True, external_
 ])
 socketio = SocketIO(server)
 
+
+@server.before_request
+def load_session_id():
+    # Cada navegador se identifica con una cookie de sesión
+    g.session_id = request.cookies.get(SESSION_COOKIE)
+    g.new_session = not is_valid_session_id(g.session_id)
+    if g.new_session:
+        g.session_id = new_session_id()
+
+
+@server.after_request
+def save_session_id(response):
+    if getattr(g, 'new_session', False):
+        response.set_cookie(SESSION_COOKIE, g.session_id, httponly=True, samesite='Lax')
+    return response
+
+
+@server.before_request
+def start_request_metrics():
+    g.request_start = time.perf_counter()
+    g.profiler = start_profile() if profiling_requested(request) else None
+
+
+@server.after_request
+def record_request_metrics(response):
+    # Las rutas se agrupan por su regla para no crear una serie por URL
+    if 'request_start' not in g:
+        return response
+    route = request.url_rule.rule if request.url_rule is not None else 'other'
+    metrics.observe('tg_request_seconds', time.perf_counter() - g.request_start, route=route)
+    if request.content_length:
+        count_bytes(route, 'in', request.content_length)
+    if response.content_length is not None and not response.is_streamed:
+        count_bytes(route, 'out', response.content_length)
+    return response
+
+
+@server.teardown_request
+def save_request_profile(exception):
+    # teardown_request se ejecuta aunque la petición lance una excepción: el perfilador
+    # siempre se detiene y el perfil de una petición fallida también se guarda
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        print(f"Perfil de {request.path}: {dump_profile(profiler, request.path)}")
+
+
+def current_session():
+    return sessions.get(g.session_id)
+
+
+@socketio.on('connect')
+def join_session_room():
+    # Cada navegador recibe los datos en vivo en la sala de su sesión
+    session_id = request.cookies.get(SESSION_COOKIE)
+    if is_valid_session_id(session_id):
+        join_room(session_id)
+
+
 # Layout inicial 
 app.layout = html.Div([
     html.Div(id='main-contetn', children=layout_index()) 
@@ -52,7 +114,7 @@ app.layout = html.Div([
      Input('btn-regresar', 'n_clicks')]
 )
 def display_page( n_clicks_voz, n_clicks_wav, n_clicks_regresar):
-    global real_time_analize
+    session = current_session()
 
     ctx = callback_context  
     
@@ -60,123 +122,302 @@ def display_page( n_clicks_voz, n_clicks_wav, n_clicks_regresar):
         return layout_index()
     
     button_id = ctx.triggered[0]['prop_id'].split('.')[0]
+    session.audio_id = None  # Cada página analiza su propio audio
 
     if button_id == 'btn-analizar-voz':
-        real_time_analize = True
+        session.real_time_analize = True
         return layout_analizar_voz()
     elif button_id == 'btn-analizar-wav':
-        real_time_analize = False
+        session.real_time_analize = False
         return layout_analizar_wav()
     elif button_id == 'btn-regresar':
-        real_time_analize = False
+        session.real_time_analize = False
         return layout_index()
 
 
+@app.server.route('/upload', methods=['POST'])
+def upload_audio():
+    # El navegador envía el .wav como cuerpo binario; se guarda por bloques sin pasar por base64
+    try:
+        audio_id = store_stream(request.stream)
+    except UploadTooLarge:
+        return {"error": "file too large"}, 413
+    count_bytes('upload', 'in', os.path.getsize(audio_path(audio_id)))
+    return {"id": audio_id, "url": audio_url(audio_id)}, 200
+
+
+@app.server.route('/audio/<audio_id>')
+def serve_audio(audio_id):
+    # conditional=True responde a las peticiones Range del reproductor
+    if not is_valid_audio_id(audio_id) or not os.path.exists(audio_path(audio_id)):
+        abort(404)
+    touch_audio(audio_id)
+    return send_file(audio_path(audio_id), mimetype='audio/wav', conditional=True)
+
+
+@app.server.route('/export/<audio_id>/<fmt>')
+def export_analysis(audio_id, fmt):
+    # Las pistas del análisis se generan al pedirlas y se envían en streaming
+    if fmt not in EXPORT_FORMATS or not is_valid_audio_id(audio_id) or not os.path.exists(audio_path(audio_id)):
+        abort(404)
+    entry = load_analysis(audio_id)
+    if entry is None:
+        # Una descarga necesita los datos: si el análisis ya no está en la caché se calcula en el pool y se espera
+        entry = analyze_now(ANALYSIS_PARAMS, audio_id)
+        if entry is None:
+            abort(500)
+        analysis_cache.put(cache_key(audio_id, ANALYSIS_PARAMS), entry)
+    try:
+        chunks = iter_export(entry['analysis'], fmt)
+    except ImportError:
+        # Parquet necesita pyarrow, que es opcional
+        abort(501)
+    mimetype, extension = EXPORT_FORMATS[fmt]
+    return Response(counted_chunks(chunks, 'export'), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename=audio_analysis.{extension}'})
+
+
+@app.server.route('/metrics')
+def serve_metrics():
+    # Métricas en formato de texto de Prometheus
+    for name, value in analysis_cache.stats().items():
+        metrics.set(f'tg_analysis_cache_{name}', value)
+    metrics.set('tg_sessions', len(sessions))
+    metrics.set('tg_analysis_jobs', len(jobs))
+    resident_bytes = resident_memory_bytes()
+    if resident_bytes is not None:
+        metrics.set('tg_process_resident_bytes', resident_bytes)
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+def create_audio_source():
+    if AUDIO_SOURCE == 'server':
+        return PyAudioSource(RATE, CHUNK, CHANNELS)
+    if AUDIO_SOURCE == 'synthetic':
+        return SyntheticSource(RATE)
+    return BrowserSource()
+
+
+@socketio.on('disconnect')
+def stop_recording_on_disconnect():
+    # Al cerrar la pestaña sin "Detener" se termina la grabación (queda guardada) y la tarea de fondo
+    session_id = request.cookies.get(SESSION_COOKIE)
+    if not is_valid_session_id(session_id):
+        return
+    session = sessions.get(session_id)
+    if session.source is not None:
+        session.source.close()
+    with session.lock:
+        session.close_source()
+
+
+@socketio.on('audio-chunk')
+def receive_audio_chunk(data):
+    # Bloques PCM de 16 bits capturados por el AudioWorklet del navegador
+    session_id = request.cookies.get(SESSION_COOKIE)
+    if not is_valid_session_id(session_id):
+        return
+    session = sessions.get(session_id)
+    source = session.source
+    if isinstance(source, BrowserSource):
+        count_bytes('live_pcm', 'in', len(data))
+        source.push(data)
+
+
 @app.server.route('/start-recording', methods=['POST'])
 def start_recording():
-    global is_recording, audio, stream, frames, data_queue
-    # Limpiar referencias a stream y audio para liberar recursos
-    if not is_recording:
-        stream = None
-        audio = None
-
-        try:
-            # Crear nueva instancia de PyAudio
-            audio = pyaudio.PyAudio()
-            stream = audio.open(format=FORMAT, channels=CHANNELS,
-                                rate=RATE, input=True,
-                                frames_per_buffer=CHUNK)
-            frames = []
-            data_queue = []  # Reiniciar la cola de datos
-            is_recording = True
-
-        except Exception as e:
-            print(f"Error starting recording: {e}")
+    session = current_session()
+    with session.lock:
+        if not session.is_recording:
+            try:
+                session.source = create_audio_source()
+                session.reset_buffers()  # Reiniciar la cola de datos
+                # La grabación se escribe en disco bloque a bloque (reemplaza la anterior)
+                session.start_recording_file(SAMPLE_WIDTH)
+                session.is_recording = True
+                session.live_error = None
+                if LIVE_STREAMING:
+                    socketio.start_background_task(stream_live_audio, session)
+                else:
+                    session.tick_monitor = TickMonitor('interval', CHUNK / RATE)
+
+            except Exception as e:
+                print(f"Error starting recording: {e}")
     return {"status": "recording started"}, 200
 
 # Ruta del servidor para detener la grabación
 @app.server.route('/stop-recording', methods=['POST'])
 def stop_recording():
-    global is_recording, audio, stream, frames, data_queue
-    
-    if is_recording:
+    session = current_session()
+    if session.source is not None:
+        # Cerrar la fuente antes de tomar el lock despierta a la lectura que espera datos
+        session.source.close()
+    with session.lock:
+        if session.is_recording:
+            # Al cerrar la fuente se completa el .wav: la grabación queda lista para analizarse
+            session.close_source()
+    return {"status": "recording stopped"}, 200
 
+
+def read_live_chunk(session):
+    """
+    Lee un bloque de la fuente de audio de la sesión y lo agrega a la grabación, al buffer circular,
+    al espectrograma incremental y al seguimiento de pitch. Devuelve (muestras, tiempos y columnas
+    nuevas del espectrograma, (tiempos, F0, intensidad) de los frames de pitch nuevos) o None si no
+    se está grabando. Si el navegador no envía audio a tiempo se propaga NoAudioData y la grabación
+    sigue; si la fuente falla, la grabación termina (queda guardada) y session.live_error lo indica.
+    La lectura, que puede esperar al navegador, se hace sin session.lock para no bloquear los demás
+    callbacks de la sesión; el lock sólo se toma para actualizar la grabación y los buffers.
+    """
+    with session.read_lock:
+        with session.lock:
+            source = session.source
+            if not (session.is_recording and source is not None):
+                return None
         try:
-            # Detener y cerrar el stream y la instancia de PyAudio
-            stream.stop_stream()
-            stream.close()
-            audio.terminate()
-            is_recording = False
- 
-        except Exception as e:
-            print(f"Error stopping recording: {e}")
-    return {"status": "recording stopped"}, 200
+            data = source.read(CHUNK)
+        except IOError as e:
+            with session.lock:
+                if session.source is source:
+                    if not source.closed:
+                        # Error de la fuente (no un clic en "Detener"): terminar la grabación en lugar de dejarla colgada
+                        print(f"Error reading from audio source: {e}")
+                        session.live_error = str(e)
+                    session.close_source()
+            return None
+
+        with session.lock:
+            if session.source is not source or not session.is_recording:
+                return None  # Se detuvo o se reinició la grabación mientras se leía
+            if session.recording is not None:
+                session.recording.write(data)
+            with stage('live_chunk'):
+                np_data = np.frombuffer(data, dtype=np.int16)
+                session.live_buffer.extend(np_data)
+                column_times, columns = session.live_spectrogram.update(np_data)
+                pitch_track = session.live_pitch.update(np_data)
+            return np_data, column_times, columns, pitch_track
+
+
+def live_frame(session, chunk):
+    # Frame binario (ver pack_live_frame) con los datos nuevos de un bloque leído por read_live_chunk
+    spectrogram = session.live_spectrogram
+    np_data, column_times, columns, (pitch_times, pitch_values, intensity_values) = chunk
+
+    first_sample = session.live_buffer.total - len(np_data)
+    times = (first_sample + np.arange(len(np_data))) / RATE
+    wave_times, wave_values = decimate_minmax(times, np_data, live_buckets // buffersize)
+
+    # Los frames no sonoros se envían como NaN para que la curva de F0 quede cortada
+    pitch_values = np.where(pitch_values > 0, pitch_values, np.nan)
+    return pack_live_frame(wave_times, wave_values, column_times, columns, spectrogram.n_bins,
+                           spectrogram.frequency_step, 2 * live_buckets, spectrogram.columns.capacity,
+                           pitch_times, pitch_values, intensity_values, session.live_pitch.pitch.capacity)
+
+
+def stream_live_audio(session):
+    # Tarea de fondo: envía por SocketIO sólo los datos nuevos de cada bloque mientras se graba
+    monitor = TickMonitor('stream', CHUNK / RATE)
+    last_audio = time.monotonic()
+    while True:
+        try:
+            chunk = read_live_chunk(session)
+        except NoAudioData:
+            # Corte en el envío del navegador: seguir esperando hasta que vuelva el audio o se detenga,
+            # pero no indefinidamente (p. ej. se cerró la pestaña sin desconectar el socket)
+            monitor.reset()
+            if time.monotonic() - last_audio > MAX_STALL_SECONDS:
+                stop_stalled_recording(session)
+                break
+            continue
+        if chunk is None:
+            break
+        last_audio = time.monotonic()
+        start = time.perf_counter()
+        frame = live_frame(session, chunk)
+        socketio.emit('live-frame', frame, to=session.session_id)
+        count_bytes('live_frame', 'out', len(frame))
+        monitor.record(start, time.perf_counter())
+    if session.live_error is not None:
+        # Avisar al navegador que la grabación terminó por un error de la fuente
+        socketio.emit('live-stopped', {'error': session.live_error}, to=session.session_id)
+
+
+def stop_stalled_recording(session):
+    with session.lock:
+        if session.is_recording:
+            session.live_error = f"No audio received for {MAX_STALL_SECONDS:g} s"
+            session.close_source()
+
+
+def live_figures(session):
+    # Oscilograma, espectrograma y pitch e intensidad de la ventana en vivo de la sesión
+    with session.lock:
+        all_data = session.live_buffer.view()
+        first_sample = session.live_buffer.first_index
+        time_spec, spectrogram_db = session.live_spectrogram.matrix()
+        pitch_times, pitch_values, intensity_values = session.live_pitch.history()
+
+    # Obtener oscilograma (tiempo desde el inicio de la grabación)
+    time = (first_sample + np.arange(len(all_data))) / RATE
+    time, oscillogram_data = decimate_minmax(time, all_data, live_buckets)
+    oscillogram_trace = go.Scatter(x=time, y=oscillogram_data, mode='lines', name='Oscilograma')
+
+    # Obtener espectrograma
+    spectrogram_trace = go.Heatmap(
+        x=time_spec,
+        y=session.live_spectrogram.frequencies,
+        z=spectrogram_db,  # Ya en dB
+        colorscale='Viridis'
+    )
+
+    # Obtener pitch (sólo partes sonoras) e intensidad
+    pitch_trace = go.Scatter(x=pitch_times, y=np.where(pitch_values > 0, pitch_values, np.nan), mode='lines',
+                             name='Pitch [Hz]', line=dict(color='blue'))
+    intensity_trace = go.Scatter(x=pitch_times, y=intensity_values, mode='lines', name='Intensidad [dB]',
+                                 line=dict(color='orange'), yaxis='y2')
+    pitch_layout = go.Layout(yaxis=dict(title='Pitch [Hz]'),
+                             yaxis2=dict(title='Intensidad [dB]', overlaying='y', side='right'))
+
+    return (compact_figure(go.Figure(data=[oscillogram_trace])), compact_figure(go.Figure(data=[spectrogram_trace])),
+            compact_figure(go.Figure(data=[pitch_trace, intensity_trace], layout=pitch_layout)))
 
 
 @app.callback(
     Output('output-analizar-mi-voz','style'),    
     Output('oscillogram_live', 'figure'),
     Output('spectrogram_live', 'figure'),
+    Output('pitch_live', 'figure'),
     Input('interval', 'n_intervals'),
     Input('analizar-boton', 'n_clicks')
 
 )
 def update_graphs(n_intervals,n_clicks_analize):
-
-    global is_recording, audio, stream, frames, data_queue
-    global last_oscillogram_fig, last_spectrogram_fig
+    start = time.perf_counter()
+    session = current_session()
     ctx = callback_context  
     
     if not ctx.triggered :
-        return {'display': 'none'},last_oscillogram_fig, last_spectrogram_fig
+        return {'display': 'none'}, session.last_oscillogram_fig, session.last_spectrogram_fig, session.last_pitch_fig
         
     button_id = ctx.triggered[0]['prop_id'].split('.')[0]
     
     if button_id == 'analizar-boton':
-         return {'display': 'none'},last_oscillogram_fig, last_spectrogram_fig
-    if  is_recording and stream is not None:
-        try:
-            data = stream.read(CHUNK)
-        except IOError as e:
-            print(f"Error reading from stream: {e}")
-            return {'display': 'none'},last_oscillogram_fig, last_spectrogram_fig
-        
-        frames.append(data)
-        np_data = np.frombuffer(data, dtype=np.int16)
-        
-        # Agregar los nuevos datos a la cola
-        data_queue.append(np_data)
-        if len(data_queue) > buffersize:
-            data_queue.pop(0)  # Eliminar el elemento más antiguo si se excede el tamaño máximo
-        
-        # Concatenar los datos en data_queue para obtener los datos a graficar
-        all_data = np.concatenate(data_queue)
-
-        # Procesar con Parselmouth
-        sound = parselmouth.Sound(all_data, sampling_frequency=RATE)
-
-        # Obtener oscilograma
-        time = np.linspace(0, len(all_data) / RATE, num=len(all_data))
-        oscillogram_trace = go.Scatter(x=time, y=all_data, mode='lines', name='Oscilograma')
-
-        # Obtener espectrograma
-        spectrogram = sound.to_spectrogram()
-        spectrogram_matrix = spectrogram.values
-        time_spec, freq_spec = np.meshgrid(spectrogram.x_grid(), spectrogram.y_grid())
-        spectrogram_trace = go.Heatmap(
-            x=time_spec[0],
-            y=freq_spec[:, 0],
-            z=10 * np.log10(spectrogram_matrix),  # Convertir a dB
-            colorscale='Viridis'
-        )
-
-        # Actualizar las gráficas
-        last_oscillogram_fig = go.Figure(data=[oscillogram_trace])
-        last_spectrogram_fig = go.Figure(data=[spectrogram_trace])
-
-        return {'display': 'block'},last_oscillogram_fig, last_spectrogram_fig
-    else:
-        return {'display': 'block'},last_oscillogram_fig, last_spectrogram_fig
+         return {'display': 'none'}, session.last_oscillogram_fig, session.last_spectrogram_fig, session.last_pitch_fig
+
+    try:
+        chunk = read_live_chunk(session)
+    except NoAudioData:
+        chunk = None  # Todavía no llega audio: se mantienen las últimas figuras
+    if chunk is None:
+        return {'display': 'block'}, session.last_oscillogram_fig, session.last_spectrogram_fig, session.last_pitch_fig
+
+    # Actualizar las gráficas
+    session.last_oscillogram_fig, session.last_spectrogram_fig, session.last_pitch_fig = live_figures(session)
+    if session.tick_monitor is not None:
+        session.tick_monitor.record(start, time.perf_counter())
+
+    return {'display': 'block'}, session.last_oscillogram_fig, session.last_spectrogram_fig, session.last_pitch_fig
 
 
 @app.callback(
@@ -189,7 +430,7 @@ def update_graphs(n_intervals,n_clicks_analize):
     Input('analizar-boton', 'n_clicks')
 )
 def update_interval (n_clicks_start,n_clicks_stop, n_clicks_analize):
-    global is_recording, audio, stream, frames, data_queue
+    session = current_session()
     ctx = callback_context
     # Si no hay clics, mantener el intervalo deshabilitado
     if not ctx.triggered:
@@ -197,94 +438,250 @@ def update_interval (n_clicks_start,n_clicks_stop, n_clicks_analize):
 
     # Identificar cuál botón fue clickeado más recientemente
     button_id = ctx.triggered[0]['prop_id'].split('.')[0]
-    # Si el botón "Iniciar Grabación" fue clickeado, habilitar el intervalo
+    # Si el botón "Iniciar Grabación" fue clickeado, habilitar el intervalo (salvo que los datos lleguen por SocketIO)
     if button_id == 'start-button':
-        return False, no_update, no_update, {'display': 'none'}
+        return LIVE_STREAMING, no_update, no_update, {'display': 'none'}
     # Si el botón "Detener Grabación" fue clickeado, deshabilitar el intervalo
     if button_id == 'stop-button':
         return True, no_update, no_update, {'display': 'block'} 
     
     if button_id == 'analizar-boton':
-        # Guardar el archivo WAV
-        waveFile = wave.open('output.wav', 'wb')
-        waveFile.setnchannels(CHANNELS)
-        waveFile.setsampwidth(audio.get_sample_size(FORMAT))
-        waveFile.setframerate(RATE)
-        waveFile.writeframes(b''.join(frames))
-        waveFile.close()
-        stream = None
-        audio = None
-        frames = []
-        data_queue = []
+        with session.lock:
+            # La grabación ya está en disco: cerrar la fuente completa el .wav si seguía grabando
+            session.close_source()
+            session.reset_buffers()
         return True, {'display': 'none'}, {'display': 'none'}, {'display': 'block'}
 
 
     return True,  no_update, no_update, {'display': 'none'}
 
 
+def analysis_results(entry, audio_id):
+    # Valores de las salidas de resultados a partir de una entrada de la caché
+    # Las figuras no viajan aquí: cada gráfica se pide con el id del audio al abrir su pestaña (ver fill_figure)
+    # y el archivo de datos se descarga de /export (ver update_download_link)
+    return ('Resultados del análisis:', {'display': 'block'}, audio_url(audio_id),
+            f"Pitch promedio: {entry['mean_pitch']:.2f} Hz", audio_id)
+
+
+def load_analysis(audio_id):
+    """
+    Entrada de la caché con el análisis de un audio del almacén. Devuelve None si el audio no existe
+    o si el análisis ya no está en la caché (se expulsó, o la petición llegó a otro worker y la caché
+    no tiene disco compartido).
+    """
+    if not is_valid_audio_id(audio_id) or not os.path.exists(audio_path(audio_id)):
+        return None
+    touch_audio(audio_id)
+    return analysis_cache.get(cache_key(audio_id, ANALYSIS_PARAMS))
+
+
+def analysis_unavailable_figure():
+    # Se muestra en lugar de dejar la gráfica vacía cuando el análisis no se puede recuperar
+    return go.Figure(layout=go.Layout(title="No se pudo cargar el análisis. Vuelve a analizar el audio."))
+
+
+def reanalyze(audio_id):
+    """
+    Salidas (figura, id del audio de la figura, trabajo, intervalo desactivado) de una gráfica cuyo
+    análisis no está en la caché: el análisis se vuelve a encolar en lugar de calcularse en la petición,
+    y cuando termina poll_analysis_job vuelve a enviar el id del audio, que rellena la gráfica.
+    """
+    if not is_valid_audio_id(audio_id) or not os.path.exists(audio_path(audio_id)):
+        return analysis_unavailable_figure(), None, no_update, no_update
+    job_id = submit_analysis(ANALYSIS_PARAMS, audio_id=audio_id)
+    return go.Figure(layout=go.Layout(title="Procesando el análisis...")), None, job_id, False
+
+
 @app.callback(
     Output('resultado', 'children'),
     Output('output-audio-analysis', 'style'),
     Output('audio-player', 'src'),
-    Output('download-link', 'href'),
     Output('pitch', 'children'),
-    Output('spectrogram', 'figure'),
-    Output('spectrogram-3d', 'figure'),
-    Output('waveform', 'figure'),
-    Output('combined-pitch-intensity', 'figure'),
-    Output('spectrum', 'figure'),
+    Output('audio-id', 'data'),
+    Output('job-id', 'data'),
+    Output('job-interval', 'disabled'),
     [Input('analizar-boton', 'n_clicks')],
-    [State('upload-wav', 'contents')]
+    State('uploaded-audio-id', 'data')
 )
+@timed('update_output')
+def update_output(n_clicks, uploaded_audio_id):
+    session = current_session()
+    output_path = session.output_path
 
-def update_output(n_clicks, contents):
-    global real_time_analize
-
-    if n_clicks is None and contents is None:
+    if not n_clicks:
         # Devolver un estado inicial vacío sin gráficos
-        return '', {'display': 'none'}, '', '', '', go.Figure(), go.Figure(), go.Figure(), go.Figure(), go.Figure()
+        return ('', {'display': 'none'}, '', '') + (None, None, True)
     
-    if n_clicks is not None and n_clicks > 0:
-        if real_time_analize:
-            max_wait_time = 30 
-            start_time = time.time()
-            # Bucle de espera hasta que el archivo exista o se agote el tiempo de espera
-            while not os.path.exists("output.wav"):
-                if time.time() - start_time > max_wait_time:
-                    print("Error: Tiempo de espera agotado. El archivo .wav no se generó.")
-                    break
-                print("Esperando a que se genere el archivo...")
-                time.sleep(1)  
-        if contents is None:
-            if os.path.exists("output.wav"):
-                # Leer el archivo local
-                with open("output.wav", "rb") as f:
-                    decoded = f.read()
-                encoded_wav = base64.b64encode(decoded).decode('utf-8')
-                # Crear la cadena src en formato base64
-                contents = f"data:audio/wav;base64,{encoded_wav}"
-            else:
-                return '', {'display': 'none'}, '', '', '', go.Figure(), go.Figure(), go.Figure(), go.Figure(), go.Figure()
-
-    if isinstance(contents, str) and contents.startswith('data:'):
-        # Decodificar el archivo subido
-        decoded = base64.b64decode(contents.split(',')[1])
-
-    # Crear un archivo temporal para almacenar el contenido del .wav
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp_wav:
-        tmp_wav.write(decoded)
-        tmp_wav_path = tmp_wav.name
-
-    mean_pitch, spectrogram_3d_fig, spectrogram_fig, spectrum_fig, waveform_fig, combined_pitch_intensity_fig, text_content = analyze_audio(tmp_wav_path, False)
-
-    if spectrogram_fig is None:
-        return 'Error en el análisis. Por favor intenta con otro archivo.', {'display': 'none'}, '', '', '', go.Figure(), go.Figure(), go.Figure(), go.Figure(), go.Figure()
-
-    # Crear un download link
-    download_link = "data:text/plain;base64," + base64.b64encode(text_content.encode()).decode()
-
-    return 'Resultados del análisis:', {'display': 'block'}, contents, download_link, f'Pitch promedio: {mean_pitch:.2f} Hz', spectrogram_fig, spectrogram_3d_fig, waveform_fig, combined_pitch_intensity_fig, spectrum_fig
+    if session.real_time_analize:
+        with session.lock:
+            # Terminar la grabación si sigue en curso (update_interval puede correr después); así el .wav queda completo
+            session.close_source()
+        if os.path.exists(output_path):
+            # Mover la grabación de la sesión al almacén de audios
+            session.audio_id = store_file(output_path, move=True)
+        audio_id = session.audio_id
+    else:
+        # El archivo subido llega en la página y no en la sesión, que es de cada proceso
+        audio_id = uploaded_audio_id if is_valid_audio_id(uploaded_audio_id) else None
+
+    if audio_id is None:
+        return ('', {'display': 'none'}, '', '') + (None, None, True)
+
+    # Buscar el análisis en la caché antes de volver a calcularlo
+    key = cache_key(audio_id, ANALYSIS_PARAMS)
+    entry = analysis_cache.get(key)
+
+    if entry is None:
+        # El análisis corre en el pool de procesos; poll_analysis_job entrega los resultados
+        job_id = submit_analysis(ANALYSIS_PARAMS, audio_id=audio_id)
+        return ('Analizando...', {'display': 'none'}, audio_url(audio_id), '') + (None, job_id, False)
 
+    return analysis_results(entry, audio_id) + (None, True)
+
+
+@app.callback(
+    Output('resultado', 'children', allow_duplicate=True),
+    Output('output-audio-analysis', 'style', allow_duplicate=True),
+    Output('audio-player', 'src', allow_duplicate=True),
+    Output('pitch', 'children', allow_duplicate=True),
+    Output('audio-id', 'data', allow_duplicate=True),
+    Output('job-id', 'data', allow_duplicate=True),
+    Output('job-interval', 'disabled', allow_duplicate=True),
+    Input('job-interval', 'n_intervals'),
+    State('job-id', 'data'),
+    prevent_initial_call=True
+)
+def poll_analysis_job(n_intervals, job_id):
+    # Consultar el trabajo en segundo plano y entregar los resultados cuando estén listos
+    if job_id is None:
+        return (no_update,) * 6 + (True,)
+
+    status, job = job_status(job_id)
+
+    if status == 'queued':
+        return ('Análisis en cola...',) + (no_update,) * 6
+    if status == 'running':
+        return (f"Analizando... ({job['elapsed']:.0f} s)",) + (no_update,) * 6
+
+    if status == 'done':
+        analysis_cache.put(job['key'], job['entry'])
+        return analysis_results(job['entry'], job['audio_id']) + (None, True)
+
+    return ('Error en el análisis. Por favor intenta con otro archivo.', {'display': 'none'}, no_update, '') + (None, None, True)
+
+
+# Cada gráfica se genera cuando se abre su pestaña; el espectrograma 3D además sólo a pedido
+FIGURE_BUILDERS = {
+    'spectrogram': draw_spectrogram,
+    'waveform': draw_waveform,
+    'combined-pitch-intensity': draw_combined_pitch_intensity_contour,
+    'spectrum': draw_power_spectrum,
+    'spectrogram-3d': draw_spectrogram_3d,
+}
+
+
+def register_figure_callback(graph_id, button_id=None):
+    inputs = [Input('analysis-tabs', 'value'), Input('audio-id', 'data')]
+    if button_id is not None:
+        inputs.append(Input(button_id, 'n_clicks'))
+
+    @app.callback(
+        Output(graph_id, 'figure'),
+        Output(f'{graph_id}-figure-key', 'data'),
+        Output('job-id', 'data', allow_duplicate=True),
+        Output('job-interval', 'disabled', allow_duplicate=True),
+        *inputs,
+        State(f'{graph_id}-figure-key', 'data'),
+        prevent_initial_call=True
+    )
+    def fill_figure(tab, audio_id, *args):
+        # args: (n_clicks del botón, si lo hay) + id del audio que ya muestra la gráfica
+        loaded_id = args[-1]
+        if audio_id is None:
+            return ((go.Figure(), None) if loaded_id is not None else (no_update, no_update)) + (no_update, no_update)
+        if tab != graph_id or audio_id == loaded_id or (button_id is not None and not args[0]):
+            return (no_update,) * 4
+        entry = load_analysis(audio_id)
+        if entry is None:
+            return reanalyze(audio_id)
+        return compact_figure(FIGURE_BUILDERS[graph_id](entry['analysis'])), audio_id, no_update, no_update
+
+
+for graph_id in FIGURE_BUILDERS:
+    register_figure_callback(graph_id, 'show-3d' if graph_id == 'spectrogram-3d' else None)
+
+
+@app.callback(
+    Output('download-link', 'href'),
+    Output('download-link', 'download'),
+    Input('audio-id', 'data'),
+    Input('export-format', 'value')
+)
+def update_download_link(audio_id, fmt):
+    # El enlace sólo apunta a la ruta de exportación; el archivo se genera al descargarlo
+    if audio_id is None:
+        return '', no_update
+    return f"/export/{audio_id}/{fmt}", f"audio_analysis.{EXPORT_FORMATS[fmt][1]}"
+
+
+def get_x_range(relayout_data):
+    # Rango de tiempo pedido por un evento de zoom: (True, rango), (True, None) al restablecer o (False, None)
+    if 'xaxis.range[0]' in relayout_data:
+        return True, (relayout_data['xaxis.range[0]'], relayout_data['xaxis.range[1]'])
+    if 'xaxis.range' in relayout_data:
+        return True, tuple(relayout_data['xaxis.range'])
+    if relayout_data.get('xaxis.autorange'):
+        return True, None
+    return False, None
+
+
+def zoom_outputs(graph_id):
+    # Las mismas salidas que fill_figure, para volver a encolar el análisis si ya no está en la caché
+    return (Output(graph_id, 'figure', allow_duplicate=True),
+            Output(f'{graph_id}-figure-key', 'data', allow_duplicate=True),
+            Output('job-id', 'data', allow_duplicate=True),
+            Output('job-interval', 'disabled', allow_duplicate=True))
+
+
+@app.callback(
+    *zoom_outputs('waveform'),
+    Input('waveform', 'relayoutData'),
+    State('audio-id', 'data'),
+    prevent_initial_call=True
+)
+def zoom_waveform(relayout_data, audio_id):
+    # Al hacer zoom se envía una envolvente más detallada del tramo visible
+    if not relayout_data or audio_id is None:
+        return (no_update,) * 4
+    zoomed, x_range = get_x_range(relayout_data)
+    if not zoomed:
+        return (no_update,) * 4
+    entry = load_analysis(audio_id)
+    if entry is None:
+        return reanalyze(audio_id)
+
+    return (compact_figure(draw_waveform(entry['analysis'], x_range)),) + (no_update,) * 3
+
+
+@app.callback(
+    *zoom_outputs('spectrogram'),
+    Input('spectrogram', 'relayoutData'),
+    State('audio-id', 'data'),
+    prevent_initial_call=True
+)
+def zoom_spectrogram(relayout_data, audio_id):
+    # Al hacer zoom se envía el tramo visible desde un nivel más detallado de la pirámide
+    if not relayout_data or audio_id is None:
+        return (no_update,) * 4
+    zoomed, x_range = get_x_range(relayout_data)
+    if not zoomed:
+        return (no_update,) * 4
+    entry = load_analysis(audio_id)
+    if entry is None:
+        return reanalyze(audio_id)
+
+    return (compact_figure(draw_spectrogram(entry['analysis'], x_range)),) + (no_update,) * 3
 
 
 if __name__ == '__main__':
@@ -1,11 +1,73 @@
 setTimeout(function () {
     let vozanalize = document.getElementById("btn-analizar-voz");
-    let wavanalize = document.getElementById("btn-analizar-wav");
 
     vozanalize.addEventListener("click", () => analizarvoz());
-    wavanalize.addEventListener("click", () => analizarwav());
 }, 1000);
 
+// Selector de archivo: dash.html no tiene un componente <input>, así que se crea dentro de
+// #upload-wav-container cada vez que Dash muestra la página "Analizar un archivo .wav"
+new MutationObserver(function () {
+    let container = document.getElementById("upload-wav-container");
+    if (container && !document.getElementById("upload-wav")) {
+        let input = document.createElement("input");
+        input.id = "upload-wav";
+        input.type = "file";
+        input.accept = ".wav";
+        container.appendChild(input);
+    }
+}).observe(document.documentElement, { childList: true, subtree: true });
+
+// Subida binaria del .wav: se envía el archivo tal cual a /upload, sin pasar por base64
+document.addEventListener("change", function (event) {
+    if (event.target.id === "upload-wav" && event.target.files.length > 0) {
+        subirArchivo(event.target.files[0]);
+    }
+});
+
+function subirArchivo(file) {
+    let status = document.getElementById("upload-status");
+    let analizeButton = document.getElementById("analizar-boton");
+    if (analizeButton) {
+        analizeButton.disabled = true;
+    }
+    if (status) {
+        status.textContent = " Subiendo...";
+    }
+
+    fetch("/upload", {
+        method: "POST",
+        headers: {
+            "Content-Type": "audio/wav",
+        },
+        body: file,
+    })
+        .then((response) => {
+            if (!response.ok) {
+                throw new Error(response.status);
+            }
+            return response.json();
+        })
+        .then((data) => {
+            console.log("Archivo subido", data);
+            // El id viaja con la página: la siguiente petición puede llegar a otro worker
+            dash_clientside.set_props("uploaded-audio-id", { data: data.id });
+            if (status) {
+                status.textContent = " " + file.name;
+            }
+        })
+        .catch((error) => {
+            console.error("Error al subir el archivo:", error);
+            if (status) {
+                status.textContent = " Error al subir el archivo";
+            }
+        })
+        .finally(() => {
+            if (analizeButton) {
+                analizeButton.disabled = false;
+            }
+        });
+}
+
 function analizarvoz() {
     setTimeout(function () {
         let startButton = document.getElementById("start-button");
@@ -15,6 +77,12 @@ function analizarvoz() {
         let mediaStream = null;
 
         startButton.addEventListener("click", function () {
+            let status = document.getElementById("live-status");
+            if (status) {
+                status.textContent = "";
+            }
+            conectarEnVivo();
+            reiniciarEnVivo();
             navigator.mediaDevices
                 .getUserMedia({ audio: true })
                 .then(function (stream) {
@@ -27,7 +95,10 @@ function analizarvoz() {
                         body: JSON.stringify({ start: true }),
                     })
                         .then((response) => response.json())
-                        .then((data) => console.log("Grabación iniciada", data))
+                        .then((data) => {
+                            console.log("Grabación iniciada", data);
+                            return iniciarCaptura(stream);
+                        })
                         .catch((error) =>
                             console.error("Error al iniciar la grabación:", error)
                         );
@@ -38,7 +109,8 @@ function analizarvoz() {
         });
 
         stopButton.addEventListener("click", function () {
-            // Detener todos los tracks del micrófono
+            // Detener la captura y todos los tracks del micrófono
+            detenerCaptura();
             if (mediaStream) {
                 let tracks = mediaStream.getTracks();
                 tracks.forEach((track) => track.stop());
@@ -59,53 +131,274 @@ function analizarvoz() {
                 );
         });
 
-        analizeButton.addEventListener("click", () => analizarwav());
-
     }, 1000);
 }
 
-function analizarwav() {
-    setTimeout(function () {
-        let audioPlayer = document.getElementById("audio-player");
-
-        if (audioPlayer) {
-            audioPlayer.addEventListener("timeupdate", function () {
-                let currentTime = audioPlayer.currentTime;
-                // Selecciona las gráficas y actualiza la posición de la línea
-                let figures2d = document.querySelectorAll(".cursor2d");
-                figures2d.forEach((fig) => {
-                    // Encuentra el contenedor interno de Plotly
-                    let plotlyContainer = fig.querySelector(".js-plotly-plot");
-
-                    if (plotlyContainer) {
-                        try {
-                            Plotly.relayout(plotlyContainer, {
-                                shapes: [
-                                    {
-                                        type: "line",
-                                        x0: currentTime,
-                                        x1: currentTime,
-                                        y0: 0,
-                                        y1: 1,
-                                        xref: "x",
-                                        yref: "paper",
-                                        line: {
-                                            color: "red",
-                                            width: 2,
-                                        },
-                                    },
-                                ],
-                            });
-                        } catch (err) {
-                            console.error("Error updating plot:", err);
-                        }
-                    } else {
-                        console.error(
-                            `Element with ID ${fig.id} is not initialized as a Plotly graph.`
-                        );
-                    }
-                });
-            });
+// Cursor de reproducción: los listeners se registran una sola vez en el documento (los eventos
+// de <audio> no burbujean, por eso se escuchan en captura) y el cursor se mueve con requestAnimationFrame
+const CURSOR_3D_INTERVAL = 100; // ms entre actualizaciones del cursor 3D (restyle de WebGL)
+let cursorLoopRunning = false;
+let last3dCursorUpdate = 0;
+
+["play", "pause", "seeked", "emptied"].forEach((type) => {
+    document.addEventListener(type, function (event) {
+        if (event.target.id !== "audio-player") {
+            return;
         }
-    }, 1000);
+        if (type === "play") {
+            iniciarCursor(event.target);
+        } else {
+            moverCursores(event.target.currentTime, true);
+        }
+    }, true);
+});
+
+function iniciarCursor(audioPlayer) {
+    if (cursorLoopRunning) {
+        return;
+    }
+    cursorLoopRunning = true;
+    let tick = function () {
+        if (audioPlayer.paused || !audioPlayer.isConnected) {
+            cursorLoopRunning = false;
+            return;
+        }
+        moverCursores(audioPlayer.currentTime, false);
+        requestAnimationFrame(tick);
+    };
+    requestAnimationFrame(tick);
+}
+
+function moverCursores(currentTime, force) {
+    // Sólo se actualizan las gráficas visibles (la pestaña abierta)
+    document.querySelectorAll(".cursor2d .js-plotly-plot").forEach((plot) => {
+        if (plot.offsetParent !== null) {
+            moverCursor2d(plot, currentTime);
+        }
+    });
+    let now = performance.now();
+    if (force || now - last3dCursorUpdate >= CURSOR_3D_INTERVAL) {
+        last3dCursorUpdate = now;
+        document.querySelectorAll(".cursor3d .js-plotly-plot").forEach((plot) => {
+            if (plot.offsetParent !== null) {
+                moverCursor3d(plot, currentTime);
+            }
+        });
+    }
+}
+
+function moverCursor2d(plot, currentTime) {
+    // Línea superpuesta (un div) posicionada con el eje x: no hay relayout ni eventos de Plotly,
+    // así que no se redibujan las trazas ni se disparan los callbacks de zoom (relayoutData)
+    let fullLayout = plot._fullLayout;
+    if (!fullLayout || !fullLayout.xaxis || !fullLayout._size) {
+        return;
+    }
+    let overlay = plot.querySelector(":scope > .cursor-overlay");
+    if (!overlay) {
+        overlay = document.createElement("div");
+        overlay.className = "cursor-overlay";
+        overlay.style.cssText = "position:absolute;top:0;left:0;width:2px;background:red;pointer-events:none;z-index:10;";
+        plot.style.position = "relative";
+        plot.appendChild(overlay);
+        // Al hacer zoom la línea se recoloca aunque el audio esté en pausa
+        plot.on("plotly_relayout", () => moverCursor2d(plot, plot._cursorTime || 0));
+    }
+    plot._cursorTime = currentTime;
+
+    let xaxis = fullLayout.xaxis;
+    let range = xaxis.range;
+    if (currentTime < Math.min(range[0], range[1]) || currentTime > Math.max(range[0], range[1])) {
+        overlay.style.display = "none";
+        return;
+    }
+    let size = fullLayout._size;
+    overlay.style.display = "block";
+    overlay.style.height = size.h + "px";
+    overlay.style.transform = `translate(${size.l + xaxis.l2p(currentTime) - 1}px, ${size.t}px)`;
+}
+
+function moverCursor3d(plot, currentTime) {
+    // Plano vertical en el tiempo actual, dibujado como una traza propia que sólo se modifica con restyle
+    let scene = plot._fullLayout && plot._fullLayout.scene;
+    if (!scene || !plot.data || plot.data.length === 0) {
+        return;
+    }
+    let y = scene.yaxis.range;
+    let z = scene.zaxis.range;
+    if (!y || !z) {
+        return;
+    }
+    let cursor = {
+        x: [[currentTime, currentTime, currentTime, currentTime, currentTime]],
+        y: [[y[0], y[1], y[1], y[0], y[0]]],
+        z: [[z[0], z[0], z[1], z[1], z[0]]],
+    };
+    let index = plot.data.findIndex((trace) => trace.name === "cursor");
+    if (index === -1) {
+        Plotly.addTraces(plot, {
+            type: "scatter3d", mode: "lines", name: "cursor", showlegend: false, hoverinfo: "skip",
+            line: { color: "red", width: 4 },
+            x: cursor.x[0], y: cursor.y[0], z: cursor.z[0],
+        });
+    } else {
+        Plotly.restyle(plot, cursor, [index]);
+    }
+}
+
+// Captura en el navegador: AudioWorklet -> PCM de 16 bits -> SocketIO ("audio-chunk")
+const CAPTURE_RATE = 16000; // RATE en app.py
+const CAPTURE_CHUNK = 3200; // CHUNK en app.py
+let captureContext = null;
+
+function iniciarCaptura(stream) {
+    let source;
+    try {
+        captureContext = new AudioContext({ sampleRate: CAPTURE_RATE });
+        source = captureContext.createMediaStreamSource(stream);
+    } catch (err) {
+        // Algunos navegadores no permiten otra frecuencia que la del micrófono: el worklet remuestrea
+        if (captureContext) {
+            captureContext.close();
+        }
+        captureContext = new AudioContext();
+        source = captureContext.createMediaStreamSource(stream);
+    }
+    let context = captureContext;
+
+    return context.audioWorklet.addModule("/static/pcm-worklet.js").then(function () {
+        let node = new AudioWorkletNode(context, "pcm-capture", {
+            processorOptions: { targetRate: CAPTURE_RATE, chunkSize: CAPTURE_CHUNK },
+        });
+        node.port.onmessage = function (event) {
+            if (liveSocket) {
+                liveSocket.emit("audio-chunk", event.data);
+            }
+        };
+        // El nodo se conecta a la salida (silenciada) para que el navegador lo procese
+        let mute = context.createGain();
+        mute.gain.value = 0;
+        source.connect(node);
+        node.connect(mute);
+        mute.connect(context.destination);
+    });
+}
+
+function detenerCaptura() {
+    if (captureContext) {
+        captureContext.close();
+        captureContext = null;
+    }
+}
+
+// Datos en vivo enviados por el servidor mediante SocketIO
+let liveSocket = null;
+
+function conectarEnVivo() {
+    if (liveSocket || typeof io === "undefined") {
+        return;
+    }
+    liveSocket = io();
+    liveSocket.on("live-frame", function (buffer) {
+        actualizarEnVivo(decodificarFrame(buffer));
+    });
+    // El servidor terminó la grabación porque falló la fuente de audio (lo grabado queda guardado)
+    liveSocket.on("live-stopped", function (data) {
+        console.error("Grabación detenida por el servidor:", data.error);
+        detenerCaptura();
+        let status = document.getElementById("live-status");
+        if (status) {
+            status.textContent = "La grabación se detuvo: " + data.error;
+        }
+    });
+}
+
+function decodificarFrame(buffer) {
+    // Cabecera: 7 uint32 y un float32 (ver pack_live_frame en tiempo_real.py)
+    let header = new DataView(buffer, 0, 32);
+    let nWave = header.getUint32(0, true);
+    let nColumns = header.getUint32(4, true);
+    let nBins = header.getUint32(8, true);
+    let nPitch = header.getUint32(12, true);
+    let frame = {
+        maxWavePoints: header.getUint32(16, true),
+        maxColumns: header.getUint32(20, true),
+        maxPitchPoints: header.getUint32(24, true),
+        frequencyStep: header.getFloat32(28, true),
+        nBins: nBins,
+    };
+    let offset = 32;
+    frame.waveTimes = new Float32Array(buffer, offset, nWave);
+    offset += 4 * nWave;
+    frame.waveValues = new Float32Array(buffer, offset, nWave);
+    offset += 4 * nWave;
+    frame.columnTimes = new Float32Array(buffer, offset, nColumns);
+    offset += 4 * nColumns;
+    let columns = new Float32Array(buffer, offset, nColumns * nBins);
+    offset += 4 * nColumns * nBins;
+    frame.pitchTimes = new Float32Array(buffer, offset, nPitch);
+    offset += 4 * nPitch;
+    frame.pitchValues = new Float32Array(buffer, offset, nPitch);
+    offset += 4 * nPitch;
+    frame.intensityValues = new Float32Array(buffer, offset, nPitch);
+    frame.columns = [];
+    for (let i = 0; i < nColumns; i++) {
+        frame.columns.push(Array.from(columns.subarray(i * nBins, (i + 1) * nBins)));
+    }
+    return frame;
+}
+
+function reiniciarEnVivo() {
+    document.querySelectorAll("#oscillogram_live .js-plotly-plot, #spectrogram_live .js-plotly-plot, #pitch_live .js-plotly-plot").forEach((plot) => {
+        delete plot.dataset.liveStream;
+    });
+}
+
+function actualizarEnVivo(frame) {
+    let container = document.getElementById("output-analizar-mi-voz");
+    let oscillogram = document.querySelector("#oscillogram_live .js-plotly-plot");
+    let spectrogram = document.querySelector("#spectrogram_live .js-plotly-plot");
+    let pitch = document.querySelector("#pitch_live .js-plotly-plot");
+    if (!container || !oscillogram || !spectrogram || !pitch) {
+        return;
+    }
+    container.style.display = "block";
+
+    // En el primer frame se crean las trazas; después sólo se agregan los puntos nuevos
+    if (!oscillogram.dataset.liveStream) {
+        Plotly.react(oscillogram, [{ type: "scatter", mode: "lines", x: [], y: [], name: "Oscilograma" }], {});
+        oscillogram.dataset.liveStream = "1";
+    }
+    if (!spectrogram.dataset.liveStream) {
+        let frequencies = [];
+        for (let i = 0; i < frame.nBins; i++) {
+            frequencies.push(i * frame.frequencyStep);
+        }
+        // transpose: cada elemento de z es una columna de tiempo, así extendTraces agrega columnas
+        Plotly.react(spectrogram, [{ type: "heatmap", transpose: true, x: [], y: frequencies, z: [], colorscale: "Viridis" }], {});
+        spectrogram.dataset.liveStream = "1";
+    }
+    if (!pitch.dataset.liveStream) {
+        Plotly.react(pitch, [
+            { type: "scatter", mode: "lines", x: [], y: [], name: "Pitch [Hz]", line: { color: "blue" } },
+            { type: "scatter", mode: "lines", x: [], y: [], name: "Intensidad [dB]", line: { color: "orange" }, yaxis: "y2" },
+        ], {
+            yaxis: { title: "Pitch [Hz]" },
+            yaxis2: { title: "Intensidad [dB]", overlaying: "y", side: "right" },
+        });
+        pitch.dataset.liveStream = "1";
+    }
+
+    Plotly.extendTraces(oscillogram, { x: [Array.from(frame.waveTimes)], y: [Array.from(frame.waveValues)] }, [0], frame.maxWavePoints);
+    if (frame.columns.length > 0) {
+        Plotly.extendTraces(spectrogram, { x: [Array.from(frame.columnTimes)], z: [frame.columns] }, [0], frame.maxColumns);
+    }
+    if (frame.pitchTimes.length > 0) {
+        // Los frames no sonoros llegan como NaN y cortan la curva de F0
+        let pitchTimes = Array.from(frame.pitchTimes);
+        Plotly.extendTraces(pitch, {
+            x: [pitchTimes, pitchTimes],
+            y: [Array.from(frame.pitchValues, (value) => (isNaN(value) ? null : value)), Array.from(frame.intensityValues)],
+        }, [0, 1], frame.maxPitchPoints);
+    }
 }
@@ -0,0 +1,346 @@
+# Benchmark del análisis con señales sintéticas tipo vocal (F0 y formantes conocidos).
+#
+#   python benchmark_analisis.py --durations 1 10 60 600 1800 --rates 16000 44100
+#   python benchmark_analisis.py --baseline benchmarks/benchmark-20240101-120000.json
+#
+# Mide el tiempo y el pico de memoria de cada etapa (carga, análisis de Parselmouth, figuras,
+# serialización, exportación y ticks en vivo), el tamaño del JSON de cada figura y el arranque en frío
+# del servidor. Los resultados se guardan en benchmarks/ y, con --baseline, se comparan con una
+# ejecución anterior.
+import argparse
+import json
+import os
+import pickle
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import wave
+
+import numpy as np
+import parselmouth
+from plotly.utils import PlotlyJSONEncoder
+
+import graficas
+from analisis_por_bloques import use_block_analysis, analyze_audio_in_blocks
+from exportar import iter_export
+from fuentes_audio import synthetic_vowel
+from metricas import resident_memory_bytes
+
+DEFAULT_DURATIONS = (1, 10, 60, 600, 1800)  # Segundos
+DEFAULT_RATES = (16000, 44100)
+FIXTURE_F0 = 120.0
+FIXTURE_FORMANTS = (700.0, 1200.0, 2600.0)
+FIXTURE_BLOCK_SECONDS = 1  # La señal se genera y escribe por bloques para no tenerla completa en memoria
+RESULTS_DIR = 'benchmarks'
+REGRESSION_THRESHOLD = 1.2  # Una etapa es una regresión si tarda 20 % más que en la referencia
+LIVE_TICKS = 200
+MEMORY_SAMPLE_PERIOD = 0.002  # Segundos entre lecturas de la RSS durante cada etapa
+FIGURES = ('draw_spectrogram_3d', 'draw_spectrogram', 'draw_power_spectrum', 'draw_waveform',
+           'draw_combined_pitch_intensity_contour')
+EXPORT_FORMATS = ('txt', 'csv', 'npz')
+COMPARED_FIELDS = ('pitch_times', 'pitch_values', 'formant_times', 'formant_values', 'formant_bandwidths',
+                   'intensity_times', 'intensity_values', 'spectrogram_times', 'spectrogram_db', 'spectrum_power')
+
+
+def write_fixture(path, duration, rate, f0=FIXTURE_F0, formants=FIXTURE_FORMANTS):
+    # .wav PCM de 16 bits con una vocal sintética
+    n_samples = int(duration * rate)
+    block = FIXTURE_BLOCK_SECONDS * rate
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        for start in range(0, n_samples, block):
+            samples = synthetic_vowel(start, min(block, n_samples - start), rate, f0, formants)
+            f.writeframes((samples * 32767).astype('<i2').tobytes())
+
+
+class StageTimer:
+    """
+    Registra el tiempo, el pico de memoria y, opcionalmente, los bytes producidos por cada etapa.
+    El pico es el de la memoria residente del proceso (muestreada en un hilo) sobre la de antes de
+    la etapa, así que incluye lo que reserva Praat en C++ y no sólo las asignaciones de Python y numpy.
+    """
+
+    def __init__(self, trace_memory=True):
+        # Sin /proc (fuera de Linux) no se mide la memoria
+        self.trace_memory = trace_memory and resident_memory_bytes() is not None
+        self.stages = {}
+
+    def run(self, name, function, *args, **kwargs):
+        if self.trace_memory:
+            before = resident_memory_bytes()
+            peak = [before]
+            done = threading.Event()
+            sampler = threading.Thread(target=self._sample_memory, args=(peak, done), daemon=True)
+            sampler.start()
+        start = time.perf_counter()
+        try:
+            value = function(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start
+            if self.trace_memory:
+                done.set()
+                sampler.join()
+        stage = {'seconds': seconds}
+        if self.trace_memory:
+            stage['peak_bytes'] = peak[0] - before
+        self.stages[name] = stage
+        return value
+
+    @staticmethod
+    def _sample_memory(peak, done):
+        while True:
+            peak[0] = max(peak[0], resident_memory_bytes() or 0)
+            if done.wait(MEMORY_SAMPLE_PERIOD):
+                break
+        peak[0] = max(peak[0], resident_memory_bytes() or 0)
+
+    def set_bytes(self, name, n_bytes):
+        self.stages[name]['bytes'] = n_bytes
+
+
+def serial_analysis(path):
+    # Análisis en un solo proceso, la referencia del motor paralelo
+    if use_block_analysis(path):
+        return analyze_audio_in_blocks(path)
+    return graficas.AudioAnalysis(parselmouth.Sound(path))
+
+
+def accuracy(analysis, f0=FIXTURE_F0, formants=FIXTURE_FORMANTS):
+    # Diferencia entre lo medido y los parámetros de la señal sintética
+    result = {'mean_pitch_error_hz': float(analysis.mean_pitch - f0)}
+    for i, formant in enumerate(formants[:analysis.formant_values.shape[1]]):
+        values = analysis.formant_values[:, i]
+        values = values[np.isfinite(values)]
+        result[f'mean_F{i + 1}_error_hz'] = float(np.mean(values) - formant) if len(values) else None
+    return result
+
+
+def benchmark_fixture(path, timer):
+    # Etapas de compute_analysis por separado
+    if not use_block_analysis(path):
+        snd = timer.run('load', parselmouth.Sound, path)
+        for analysis_pass in graficas.ANALYSIS_PASSES:
+            timer.run(analysis_pass.__name__, analysis_pass, snd)
+        del snd
+    analysis = timer.run('compute_analysis', graficas.compute_analysis, path)
+
+    for name in FIGURES:
+        fig = timer.run(name, getattr(graficas, name), analysis)
+        fig_json = timer.run(f'{name}.to_json', fig.to_json)
+        timer.set_bytes(f'{name}.to_json', len(fig_json))
+        compact_json = timer.run(f'{name}.compact', lambda: json.dumps(graficas.compact_figure(fig), cls=PlotlyJSONEncoder))
+        timer.set_bytes(f'{name}.compact', len(compact_json))
+
+    for fmt in EXPORT_FORMATS:
+        n_bytes = timer.run(f'export.{fmt}', lambda: sum(len(chunk) for chunk in iter_export(analysis, fmt)))
+        timer.set_bytes(f'export.{fmt}', n_bytes)
+
+    # Lo que ocupa la entrada del análisis en la caché
+    blob = timer.run('pickle', pickle.dumps, analysis, pickle.HIGHEST_PROTOCOL)
+    timer.set_bytes('pickle', len(blob))
+    return analysis
+
+
+def benchmark_parallel(path, workers):
+    # Equivalencia numérica y aceleración del motor paralelo frente al análisis en serie
+    from analisis_paralelo import ParallelAnalysisEngine
+
+    engine = ParallelAnalysisEngine(workers)
+    try:
+        engine.analyze(path)  # Arranque de los procesos fuera de la medición
+        start = time.perf_counter()
+        parallel = engine.analyze(path)
+        parallel_seconds = time.perf_counter() - start
+    finally:
+        engine.shutdown()
+
+    start = time.perf_counter()
+    serial = serial_analysis(path)
+    serial_seconds = time.perf_counter() - start
+
+    mismatches = [name for name in COMPARED_FIELDS
+                  if not np.array_equal(getattr(serial, name), getattr(parallel, name), equal_nan=True)]
+    return {
+        'workers': workers,
+        'serial_seconds': serial_seconds,
+        'parallel_seconds': parallel_seconds,
+        'speedup': serial_seconds / parallel_seconds,
+        'identical': not mismatches,
+        'mismatched_fields': mismatches,
+    }
+
+
+def percentiles(values):
+    values = np.asarray(values)
+    return {'mean': float(np.mean(values)), 'p50': float(np.percentile(values, 50)),
+            'p95': float(np.percentile(values, 95)), 'max': float(np.max(values))}
+
+
+def benchmark_live(n_ticks=LIVE_TICKS):
+    """
+    Ticks en vivo con la fuente sintética: el del intervalo (update_graphs, figuras completas en JSON)
+    y el de streaming (stream_live_audio, frame binario con los datos nuevos).
+    """
+    import app
+    from fuentes_audio import SyntheticSource, SAMPLE_WIDTH
+    from sesiones import RecordingSession, new_session_id
+
+    session = RecordingSession(new_session_id(), max_samples=2 * n_ticks * app.CHUNK, live_samples=app.buffersize * app.CHUNK, rate=app.RATE)
+    session.source = SyntheticSource(app.RATE, FIXTURE_F0, FIXTURE_FORMANTS, realtime=False)
+    session.is_recording = True
+    # Cada tick también escribe su bloque en el .wav de la grabación, como en la aplicación
+    session.start_recording_file(SAMPLE_WIDTH)
+
+    interval_seconds, interval_bytes = [], []
+    for _ in range(n_ticks):
+        start = time.perf_counter()
+        app.read_live_chunk(session)
+        payload = sum(len(json.dumps(fig, cls=PlotlyJSONEncoder)) for fig in app.live_figures(session))
+        interval_seconds.append(time.perf_counter() - start)
+        interval_bytes.append(payload)
+
+    session.reset_buffers()
+    stream_seconds, stream_bytes = [], []
+    for _ in range(n_ticks):
+        start = time.perf_counter()
+        frame = app.live_frame(session, app.read_live_chunk(session))
+        stream_seconds.append(time.perf_counter() - start)
+        stream_bytes.append(len(frame))
+
+    session.close()
+    budget = app.CHUNK / app.RATE  # Tiempo real disponible por bloque
+    return {
+        'chunk_seconds': budget,
+        'interval_tick': {'seconds': percentiles(interval_seconds), 'bytes': percentiles(interval_bytes)},
+        'stream_tick': {'seconds': percentiles(stream_seconds), 'bytes': percentiles(stream_bytes)},
+    }
+
+
+# Se ejecuta en un proceso nuevo para medir el arranque en frío
+STARTUP_SCRIPT = """
+import json, time
+start = time.perf_counter()
+import app
+import_seconds = time.perf_counter() - start
+client = app.server.test_client()
+start = time.perf_counter()
+client.get('/')
+client.get('/_dash-layout')
+client.get('/_dash-dependencies')
+first_request_seconds = time.perf_counter() - start
+from graficas import warm_up
+start = time.perf_counter()
+warm_up()
+warm_up_seconds = time.perf_counter() - start
+start = time.perf_counter()
+warm_up()
+print(json.dumps({'import_app_seconds': import_seconds, 'first_request_seconds': first_request_seconds,
+                  'warm_up_seconds': warm_up_seconds, 'warm_analysis_seconds': time.perf_counter() - start}))
+"""
+
+
+def benchmark_startup():
+    """
+    Arranque en frío del servidor: importar app.py, primera petición de la página y precarga del
+    análisis (la primera llamada a Praat) frente a un análisis ya precargado.
+    """
+    result = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    # Etapas que tardan más que en la referencia (mismo audio y misma etapa)
+    reference = {(fixture['duration'], fixture['rate']): fixture['stages'] for fixture in baseline['fixtures']}
+    regressions = []
+    for fixture in results['fixtures']:
+        stages = reference.get((fixture['duration'], fixture['rate']), {})
+        for name, stage in fixture['stages'].items():
+            if name in stages and stages[name]['seconds'] > 0:
+                ratio = stage['seconds'] / stages[name]['seconds']
+                flag = ' REGRESIÓN' if ratio > threshold else ''
+                print(f"{fixture['duration']:>6g} s {fixture['rate']:>6} Hz  {name:<48} x{ratio:5.2f}{flag}")
+                if flag:
+                    regressions.append((fixture['duration'], fixture['rate'], name, ratio))
+    return regressions
+
+
+def print_fixture(fixture):
+    print(f"\n{fixture['duration']:g} s a {fixture['rate']} Hz")
+    for name, stage in fixture['stages'].items():
+        memory = f"{stage['peak_bytes'] / 2 ** 20:9.1f} MB" if 'peak_bytes' in stage else ''
+        size = f"{stage['bytes'] / 1024:10.1f} kB" if 'bytes' in stage else ''
+        print(f"  {name:<48} {stage['seconds']:9.4f} s {memory} {size}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark del análisis con señales sintéticas.")
+    parser.add_argument('--durations', type=float, nargs='+', default=DEFAULT_DURATIONS, help="Duraciones en segundos")
+    parser.add_argument('--rates', type=int, nargs='+', default=DEFAULT_RATES, help="Frecuencias de muestreo")
+    parser.add_argument('--parallel', type=int, default=0, help="Comparar también con el motor paralelo de N procesos")
+    parser.add_argument('--live-ticks', type=int, default=LIVE_TICKS, help="Ticks en vivo a medir (0 para omitirlos)")
+    parser.add_argument('--no-startup', action='store_true', help="No medir el arranque del servidor")
+    parser.add_argument('--no-memory', action='store_true', help="No medir la memoria (el muestreo de la RSS agrega algo de costo)")
+    parser.add_argument('--output', default=RESULTS_DIR, help="Directorio de resultados")
+    parser.add_argument('--baseline', help="Resultados anteriores con los que comparar")
+    args = parser.parse_args(argv)
+
+    results = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'versions': {'numpy': np.__version__, 'parselmouth': parselmouth.__version__,
+                     'praat': parselmouth.PRAAT_VERSION},
+        'fixtures': [],
+    }
+
+    if not args.no_startup:
+        results['startup'] = benchmark_startup()
+        print("Arranque: " + "  ".join(f"{name} {seconds:.3f} s" for name, seconds in results['startup'].items()))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for rate in args.rates:
+            for duration in args.durations:
+                path = os.path.join(tmp, f"vocal-{duration:g}s-{rate}.wav")
+                write_fixture(path, duration, rate)
+                timer = StageTimer(trace_memory=not args.no_memory)
+                analysis = benchmark_fixture(path, timer)
+                fixture = {'duration': duration, 'rate': rate, 'stages': timer.stages, 'accuracy': accuracy(analysis)}
+                del analysis
+                if args.parallel > 1:
+                    fixture['parallel'] = benchmark_parallel(path, args.parallel)
+                results['fixtures'].append(fixture)
+                print_fixture(fixture)
+                os.remove(path)
+
+    if args.live_ticks > 0:
+        results['live'] = benchmark_live(args.live_ticks)
+        print(f"\nTicks en vivo (bloque de {results['live']['chunk_seconds'] * 1000:.0f} ms):")
+        for name in ('interval_tick', 'stream_tick'):
+            tick = results['live'][name]
+            print(f"  {name:<14} p50 {tick['seconds']['p50'] * 1000:7.2f} ms  p95 {tick['seconds']['p95'] * 1000:7.2f} ms"
+                  f"  {tick['bytes']['mean'] / 1024:8.1f} kB")
+
+    os.makedirs(args.output, exist_ok=True)
+    results_path = os.path.join(args.output, f"benchmark-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(results_path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResultados: {results_path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f))
+        if regressions:
+            print(f"{len(regressions)} etapas más lentas que la referencia")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,171 @@
+# Caché de análisis direccionada por contenido (hash del audio + parámetros del análisis)
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Presupuestos configurables por variables de entorno
+CACHE_MAX_MEMORY_BYTES = int(os.environ.get('ANALYSIS_CACHE_MAX_MEMORY_BYTES', 256 * 1024 * 1024))
+# Directorio compartido por los workers de gunicorn; con ANALYSIS_CACHE_DIR='' la caché vive sólo en memoria
+CACHE_DIR = os.environ.get('ANALYSIS_CACHE_DIR', 'analisis_guardados')
+CACHE_MAX_DISK_BYTES = int(os.environ.get('ANALYSIS_CACHE_MAX_DISK_BYTES', 2 * 1024 * 1024 * 1024))
+
+
+def cache_key(audio_id, params):
+    """
+    Clave de la caché: hash SHA-256 del id del audio (el hash de sus bytes, ver almacen_audio.py)
+    más los parámetros del análisis.
+    """
+    digest = hashlib.sha256(audio_id.encode())
+    digest.update(json.dumps(params, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def entry_nbytes(value, seen=None):
+    """
+    Memoria de los arreglos numpy de una entrada. Los memmap no cuentan porque viven en el archivo,
+    y un arreglo referenciado dos veces (p. ej. el primer nivel de la pirámide del espectrograma)
+    se cuenta una sola vez.
+    """
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, np.memmap):
+        return 0
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(entry_nbytes(item, seen) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(entry_nbytes(item, seen) for item in value)
+    if hasattr(value, '__dict__'):
+        return entry_nbytes(vars(value), seen)
+    return 0
+
+
+class AnalysisCache:
+    """
+    Caché LRU con presupuesto de memoria y, opcionalmente, de disco.
+    En memoria se guardan los objetos tal cual (sin copiarlos en cada acierto, así que no se deben
+    modificar) y se cuentan por el tamaño de sus arreglos. Las entradas se escriben también en disco
+    al guardarse (si hay directorio), así otros procesos las encuentran allí y las que salen de
+    memoria se recuperan antes de considerarse un fallo.
+    """
+
+    def __init__(self, max_memory_bytes=CACHE_MAX_MEMORY_BYTES, cache_dir=CACHE_DIR, max_disk_bytes=CACHE_MAX_DISK_BYTES):
+        self.max_memory_bytes = max_memory_bytes
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._entries = OrderedDict()  # clave -> (entrada, tamaño)
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+
+        blob = self._read_disk(key)
+        if blob is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        entry = pickle.loads(blob)
+        with self._lock:
+            self.hits += 1
+            self._store_memory(key, entry)
+        return entry
+
+    def put(self, key, entry):
+        if self.cache_dir:
+            self._write_disk(key, pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL))
+        with self._lock:
+            self._store_memory(key, entry)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'memory_bytes': self._memory_bytes,
+                'disk_bytes': self._disk_usage(),
+            }
+
+    def _store_memory(self, key, entry):
+        if key in self._entries:
+            self._memory_bytes -= self._entries.pop(key)[1]
+        size = entry_nbytes(entry)
+        self._entries[key] = (entry, size)
+        self._memory_bytes += size
+
+        # Expulsar las entradas menos usadas hasta cumplir el presupuesto (ya están en disco desde put)
+        while self._memory_bytes > self.max_memory_bytes and len(self._entries) > 1:
+            _, (_, size) = self._entries.popitem(last=False)
+            self._memory_bytes -= size
+            self.evictions += 1
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def _read_disk(self, key):
+        if not self.cache_dir:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                blob = f.read()
+            os.utime(path)  # Marcar como usada recientemente
+        except FileNotFoundError:
+            return None  # No está, o el presupuesto de disco la borró (quizás otro proceso)
+        return blob
+
+    def _write_disk(self, key, blob):
+        if not self.cache_dir or len(blob) > self.max_disk_bytes:
+            return
+        path = self._path(key)
+        # Nombre temporal único: otro worker puede estar guardando la misma entrada
+        with tempfile.NamedTemporaryFile(dir=self.cache_dir, suffix='.tmp', delete=False) as f:
+            f.write(blob)
+        os.replace(f.name, path)
+
+        # Borrar los archivos usados hace más tiempo hasta cumplir el presupuesto de disco
+        files = sorted(
+            (os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir) if name.endswith('.pkl')),
+            key=os.path.getmtime
+        )
+        total = sum(os.path.getsize(name) for name in files)
+        for name in files:
+            if total <= self.max_disk_bytes:
+                break
+            total -= os.path.getsize(name)
+            try:
+                os.remove(name)
+            except FileNotFoundError:
+                pass
+
+    def _disk_usage(self):
+        if not self.cache_dir:
+            return 0
+        return sum(
+            os.path.getsize(os.path.join(self.cache_dir, name))
+            for name in os.listdir(self.cache_dir) if name.endswith('.pkl')
+        )
+
+
+# Caché compartida por los callbacks del proceso
+analysis_cache = AnalysisCache()
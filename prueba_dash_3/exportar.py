@@ -0,0 +1,166 @@
+# Exportación de las pistas del análisis (pitch, intensidad, formantes) en varios formatos.
+# Los formatos de texto se generan por bloques de filas, cada bloque con una sola operación de formato
+# de cadenas, y se entregan como un generador para que la ruta de descarga los envíe en streaming.
+import importlib.util
+import tempfile
+
+import numpy as np
+
+CHUNK_ROWS = 65536  # Filas por bloque de texto
+COPY_BLOCK_SIZE = 1024 * 1024
+
+# formato -> (tipo MIME, extensión del archivo)
+EXPORT_FORMATS = {
+    'txt': ('text/plain', 'txt'),
+    'csv': ('text/csv', 'csv'),
+    'tsv': ('text/tab-separated-values', 'tsv'),
+    'json': ('application/json', 'json'),
+    'npz': ('application/octet-stream', 'npz'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+def available_formats():
+    # Formatos que se pueden exportar en este servidor: Parquet sólo si pyarrow está instalado
+    return [fmt for fmt in EXPORT_FORMATS if fmt != 'parquet' or importlib.util.find_spec('pyarrow') is not None]
+
+
+def track_arrays(analysis):
+    """
+    Pistas por frame del análisis como columnas: {pista: {columna: arreglo}}.
+    """
+    formants = {'time': analysis.formant_times}
+    for i in range(analysis.formant_values.shape[1]):
+        formants[f'F{i + 1}'] = analysis.formant_values[:, i]
+        formants[f'B{i + 1}'] = analysis.formant_bandwidths[:, i]
+    return {
+        'pitch': {'time': analysis.pitch_times, 'frequency': analysis.pitch_values},
+        'intensity': {'time': analysis.intensity_times, 'intensity': analysis.intensity_values},
+        'formants': formants,
+    }
+
+
+def series(analysis):
+    # Cada columna de valores con sus tiempos: (nombre, tiempos, valores)
+    for track, columns in track_arrays(analysis).items():
+        for column, values in columns.items():
+            if column != 'time':
+                yield (column if track == 'formants' else track), columns['time'], values
+
+
+def format_rows(columns, formats, separator, prefix=''):
+    # Da formato a un bloque de filas numéricas con una plantilla repetida por fila y un solo operador %
+    # (sin un bucle de Python por frame); prefix es un texto fijo al inicio de cada fila
+    row = prefix + separator.join(formats) + '\n'
+    values = np.column_stack([np.asarray(column, dtype=np.float64) for column in columns])
+    return (row * len(values)) % tuple(values.ravel().tolist())
+
+
+def iter_rows(columns, formats, separator, prefix=''):
+    for start in range(0, len(columns[0]), CHUNK_ROWS):
+        yield format_rows([column[start:start + CHUNK_ROWS] for column in columns], formats, separator, prefix)
+
+
+def iter_text(analysis):
+    # Mismo contenido que el antiguo archivo .txt de la aplicación
+    yield "Pitch Data (Frequency vs Time):\n"
+    yield "Time [s]\tFrequency [Hz]\n"
+    yield from iter_rows([analysis.pitch_times, analysis.pitch_values], ['%.4f', '%.2f'], '\t')
+
+    yield "\nIntensity Data (dB vs Time):\n"
+    yield "Time [s]\tIntensity [dB]\n"
+    yield from iter_rows([analysis.intensity_times, analysis.intensity_values], ['%.4f', '%.2f'], '\t')
+
+    yield "\nFormants Data:\n"
+    for formant_number in range(1, analysis.formant_values.shape[1] + 1):
+        yield f"Formant {formant_number}:\n"
+        yield "Time [s]\tFormant Frequency [Hz]\n"
+        yield from iter_rows([analysis.formant_times, analysis.formant_values[:, formant_number - 1]], ['%.4f', '%.2f'], '\t')
+        yield "\n"
+
+
+def iter_table(analysis, separator):
+    # Tabla en formato largo (serie, tiempo, valor): todas las pistas en un solo archivo
+    yield separator.join(['series', 'time', 'value']) + '\n'
+    for name, times, values in series(analysis):
+        yield from iter_rows([times, values], ['%.4f', '%.2f'], separator, prefix=name + separator)
+
+
+def json_array(values, fmt):
+    # Arreglo JSON de números; NaN (formante inexistente) e infinitos se escriben como null
+    values = np.asarray(values, dtype=np.float64)
+    text = ','.join(format_rows([values[start:start + CHUNK_ROWS]], [fmt], '').replace('\n', ',').rstrip(',')
+                    for start in range(0, len(values), CHUNK_ROWS))
+    return '[' + text.replace('-inf', 'null').replace('inf', 'null').replace('nan', 'null') + ']'
+
+
+def iter_json(analysis):
+    # Los tiempos con decimales fijos (microsegundos), para que no se pierda resolución en audios largos
+    yield '{'
+    for i, (track, columns) in enumerate(track_arrays(analysis).items()):
+        yield ('' if i == 0 else ',') + f'"{track}":{{'
+        yield ','.join(f'"{column}":{json_array(values, "%.6f" if column == "time" else "%.6g")}'
+                       for column, values in columns.items())
+        yield '}'
+    yield '}\n'
+
+
+def write_npz(analysis, f):
+    arrays = {f"{track}_{column}": values for track, columns in track_arrays(analysis).items() for column, values in columns.items()}
+    np.savez_compressed(f, **arrays)
+
+
+def write_parquet(analysis, f):
+    import pyarrow as pa  # Opcional: sólo hace falta para exportar a Parquet
+    import pyarrow.parquet as pq
+
+    names, times, values = [], [], []
+    for name, series_times, series_values in series(analysis):
+        names.append(np.full(len(series_times), name))
+        times.append(series_times)
+        values.append(series_values)
+    table = pa.table({
+        'series': pa.array(np.concatenate(names)).dictionary_encode(),
+        'time': np.concatenate(times),
+        'value': np.concatenate(values),
+    })
+    pq.write_table(table, f)
+
+
+def binary_chunks(write, analysis):
+    # Los formatos binarios se escriben antes de responder (en memoria si son pequeños) y se envían por bloques
+    f = tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024)
+    try:
+        write(analysis, f)
+    except BaseException:
+        f.close()
+        raise
+    f.seek(0)
+    return read_blocks(f)
+
+
+def read_blocks(f):
+    with f:
+        yield from iter(lambda: f.read(COPY_BLOCK_SIZE), b'')
+
+
+def iter_export(analysis, fmt):
+    """
+    Genera el archivo exportado en formato fmt (ver EXPORT_FORMATS) como bloques de bytes.
+    """
+    if fmt == 'npz':
+        return binary_chunks(write_npz, analysis)
+    if fmt == 'parquet':
+        return binary_chunks(write_parquet, analysis)
+    if fmt == 'txt':
+        chunks = iter_text(analysis)
+    elif fmt == 'csv':
+        chunks = iter_table(analysis, ',')
+    elif fmt == 'tsv':
+        chunks = iter_table(analysis, '\t')
+    elif fmt == 'json':
+        chunks = iter_json(analysis)
+    else:
+        raise ValueError(f"Unsupported export format: {fmt!r}")
+    return (chunk.encode() for chunk in chunks)
+
@@ -0,0 +1,143 @@
+# Fuentes de audio para la grabación en vivo. Todas entregan bloques PCM de 16 bits con read(n_samples)
+import queue
+import threading
+import time
+
+import numpy as np
+
+SAMPLE_WIDTH = 2  # Bytes por muestra (PCM de 16 bits)
+READ_TIMEOUT = 2.0  # Segundos que read espera datos del navegador antes de avisar que no hay datos
+
+
+class NoAudioData(Exception):
+    """
+    No llegó audio del navegador en READ_TIMEOUT segundos (p. ej. un corte de red). No termina
+    la grabación: los datos ya recibidos se conservan y se puede volver a llamar a read.
+    """
+
+
+class PyAudioSource:
+    """
+    Micrófono de la tarjeta de sonido del servidor (sólo para uso local).
+    """
+
+    def __init__(self, rate, chunk, channels=1):
+        import pyaudio  # Opcional: en el despliegue no hay micrófono ni portaudio
+
+        self.audio = pyaudio.PyAudio()
+        self.stream = self.audio.open(format=pyaudio.paInt16, channels=channels,
+                                      rate=rate, input=True,
+                                      frames_per_buffer=chunk)
+
+    @property
+    def closed(self):
+        return self.stream is None
+
+    def read(self, n_samples):
+        # Un desborde del buffer de entrada (-9981) sólo pierde muestras: no termina la grabación
+        return self.stream.read(n_samples, exception_on_overflow=False)
+
+    def close(self):
+        if self.stream is None:
+            return
+        try:
+            self.stream.stop_stream()
+            self.stream.close()
+        finally:
+            self.audio.terminate()
+            self.stream = None
+
+
+class BrowserSource:
+    """
+    Audio capturado en el navegador (AudioWorklet) y enviado por SocketIO en bloques PCM de 16 bits.
+    push agrega los bytes recibidos y read los entrega en bloques del tamaño pedido.
+    """
+
+    def __init__(self, max_pending_chunks=50):
+        self.chunks = queue.Queue(maxsize=max_pending_chunks)
+        self.pending = b''
+        self.closed = False
+
+    def push(self, data):
+        if self.closed:
+            return
+        try:
+            self.chunks.put_nowait(bytes(data))
+        except queue.Full:
+            # Si el análisis se atrasa se descarta el bloque más antiguo
+            try:
+                self.chunks.get_nowait()
+            except queue.Empty:
+                pass
+            self.chunks.put_nowait(bytes(data))
+
+    def read(self, n_samples):
+        n_bytes = n_samples * SAMPLE_WIDTH
+        while len(self.pending) < n_bytes:
+            if self.closed:
+                raise IOError("Browser source closed")
+            try:
+                self.pending += self.chunks.get(timeout=READ_TIMEOUT)
+            except queue.Empty:
+                raise NoAudioData("No audio received from the browser")
+        data, self.pending = self.pending[:n_bytes], self.pending[n_bytes:]
+        return data
+
+    def close(self):
+        self.closed = True
+        # Despertar a read si está esperando datos
+        try:
+            self.chunks.put_nowait(b'')
+        except queue.Full:
+            pass
+
+
+class SyntheticSource:
+    """
+    Fuente sintética tipo vocal (armónicos de f0 con una envolvente de formantes) para pruebas
+    sin micrófono. Con realtime=True entrega los bloques al ritmo real del audio.
+    """
+
+    def __init__(self, rate, f0=120.0, formants=(700.0, 1200.0, 2600.0), amplitude=0.3, realtime=True):
+        self.rate = rate
+        self.f0 = f0
+        self.formants = formants
+        self.amplitude = amplitude
+        self.realtime = realtime
+        self.position = 0
+        self.started = time.time()
+        self.closed = False
+        self.lock = threading.Lock()
+
+    def read(self, n_samples):
+        if self.closed:
+            raise IOError("Synthetic source closed")
+        with self.lock:
+            start = self.position
+            self.position += n_samples
+        if self.realtime:
+            # Esperar hasta que el bloque "exista" en tiempo real
+            delay = self.started + self.position / self.rate - time.time()
+            if delay > 0:
+                time.sleep(delay)
+        samples = synthetic_vowel(start, n_samples, self.rate, self.f0, self.formants, self.amplitude)
+        return (samples * 32767).astype('<i2').tobytes()
+
+    def close(self):
+        self.closed = True
+
+
+def synthetic_vowel(start, n_samples, rate, f0, formants, amplitude=0.3, bandwidth=100.0):
+    """
+    Señal tipo vocal entre [start, start + n_samples): suma de armónicos de f0 ponderados por
+    resonancias en las frecuencias de los formantes.
+    """
+    t = (start + np.arange(n_samples)) / rate
+    harmonics = np.arange(1, int((rate / 2) // f0) + 1) * f0
+    weights = np.zeros(len(harmonics))
+    for formant in formants:
+        weights += 1 / (1 + ((harmonics - formant) / bandwidth) ** 2)
+    weights /= harmonics / f0  # Caída espectral de la fuente glotal
+    signal = np.sin(2 * np.pi * np.outer(t, harmonics)) @ weights
+    return amplitude * signal / np.sum(weights)
@@ -1,19 +1,319 @@
+import base64
+import os
+import struct
+
 import numpy as np
 import plotly.graph_objs as go
-from scipy.signal import savgol_filter
-import parselmouth
-from parselmouth.praat import call
 
-import io
+# parselmouth y scipy.signal se importan dentro de las funciones que los usan: el servidor web
+# arranca sin cargarlos y cada worker los precarga con warm_up (ver gunicorn.conf.py)
+from metricas import stage, timed
 
-def draw_spectrogram_3d(spectrogram):
-    X, Y = np.meshgrid(spectrogram.xs(), spectrogram.ys())
-    Z = 10 * np.log10(spectrogram.values)
- 
+N_FORMANTS = 3  # Número de formantes que se muestran y exportan
+SPECTROGRAM_WINDOW_LENGTH = 0.005
+MAXIMUM_FREQUENCY = 5000
+SPECTRUM_RESOLUTION = 5  # Hz: resolución mínima de los segmentos del espectro promediado (Welch)
+SPECTRUM_MIN_FREQUENCY = 50  # Hz: primera banda del espectro en escala logarítmica
+SPECTRUM_BINS = 200  # Bandas logarítmicas entre SPECTRUM_MIN_FREQUENCY y MAXIMUM_FREQUENCY
+
+WAVEFORM_BUCKETS = 2000  # Buckets min/max del oscilograma (aprox. un par por pixel)
+SPECTROGRAM_MAX_COLUMNS = 1000  # Columnas máximas del espectrograma 2D por vista
+SAVGOL_WINDOW = 11  # Frames de la ventana de suavizado de la frecuencia fundamental
+SPECTROGRAM_3D_MAX_COLUMNS = 200  # Columnas máximas de la superficie 3D
+COMPACT_MIN_POINTS = 64  # Los arreglos más pequeños se envían como listas de JSON
+
+# Parámetros que definen el resultado del análisis (forman parte de la clave de la caché)
+ANALYSIS_PARAMS = {
+    'n_formants': N_FORMANTS,
+    'spectrogram_window_length': SPECTROGRAM_WINDOW_LENGTH,
+    'maximum_frequency': MAXIMUM_FREQUENCY,
+    'spectrum_resolution': SPECTRUM_RESOLUTION,
+}
+
+
+def formant_tracks(formants, n_formants=N_FORMANTS, include_bandwidths=False):
+    """
+    Devuelve las frecuencias de los primeros n_formants formantes de todos los frames
+    como un arreglo (frames × formantes), sin llamar a get_value_at_time por frame.
+    Si include_bandwidths es True devuelve también los anchos de banda con la misma forma.
+    Los formantes que no existen en un frame quedan como NaN.
+    """
+    from parselmouth.praat import call
+
+    # Praat exporta todos los frames de una vez: F1, B1, F2, B2, ...
+    table = call(formants, "Down to Table", "no", "no", 6, "no", 3, "no", 3, "yes")
+    matrix = call(table, "Down to Matrix").values
+    n_frames = matrix.shape[0]
+    available = min(n_formants, matrix.shape[1] // 2)
+
+    frequencies = np.full((n_frames, n_formants), np.nan)
+    bandwidths = np.full((n_frames, n_formants), np.nan)
+    frequencies[:, :available] = matrix[:, 0:2 * available:2]
+    bandwidths[:, :available] = matrix[:, 1:2 * available:2]
+
+    if include_bandwidths:
+        return frequencies, bandwidths
+    return frequencies
+
+
+def build_spectrogram_pyramid(times, db, min_columns=SPECTROGRAM_3D_MAX_COLUMNS):
+    """
+    Niveles del espectrograma: el nivel 0 es el original y cada nivel siguiente
+    promedia (en potencia) pares de columnas, hasta llegar a min_columns o menos.
+    Devuelve una lista de tuplas (tiempos, matriz en dB).
+    """
+    levels = [(times, db)]
+    while len(times) > min_columns:
+        n_columns = len(times) // 2 * 2
+        power = 10 ** (db[:, :n_columns] / 10)
+        db = 10 * np.log10((power[:, 0::2] + power[:, 1::2]) / 2)
+        times = (times[0:n_columns:2] + times[1:n_columns:2]) / 2
+        levels.append((times, db))
+    return levels
+
+def time_slice(times, x_range=None, margin=1):
+    """
+    Slice de los frames dentro de x_range, con margin frames de más a cada lado
+    para que las curvas lleguen hasta el borde del gráfico. Sin rango, todos.
+    """
+    if x_range is None:
+        return slice(None)
+    start = max(np.searchsorted(times, x_range[0]) - margin, 0)
+    stop = np.searchsorted(times, x_range[1]) + margin
+    return slice(start, stop)
+
+def spectrogram_view(levels, x_range=None, max_columns=SPECTROGRAM_MAX_COLUMNS):
+    """
+    Tramo del espectrograma para un rango de tiempo: usa el nivel más detallado
+    cuyo número de columnas visibles no supere max_columns.
+    """
+    for times, db in levels:
+        visible = time_slice(times, x_range)
+        if len(times[visible]) <= max_columns:
+            return times[visible], db[:, visible]
+    # Ni el nivel más grueso cabe: se envía completo
+    return times, db
+
+
+def typed_array(values, dtype):
+    """
+    Arreglo codificado como typed array de plotly.js ({dtype, bdata[, shape]}): los bytes del
+    arreglo en base64 en lugar de una lista de números en texto. plotly.js los decodifica desde la
+    versión 2.28 (la que trae el paquete plotly 5.19; Dash sirve la del paquete instalado).
+    """
+    values = np.ascontiguousarray(values, dtype=dtype)
+    encoded = {'dtype': np.dtype(dtype).str[1:], 'bdata': base64.b64encode(values.tobytes()).decode('ascii')}
+    if values.ndim == 2:
+        encoded['shape'] = f"{values.shape[0]},{values.shape[1]}"
+    return encoded
+
+
+def compact_figure(fig, min_points=COMPACT_MIN_POINTS):
+    """
+    Figura como diccionario con los arreglos numéricos grandes de cada traza (x, y, z) como
+    typed arrays. Los tiempos (x) se mantienen en float64; los valores (dB, Hz, amplitud) van en
+    float32, que sobra para graficar, y los enteros de 16 bits (PCM en vivo) conservan su tipo.
+    """
+    fig_dict = fig.to_dict() if isinstance(fig, go.Figure) else fig
+    for trace in fig_dict.get('data', []):
+        for name in ('x', 'y', 'z'):
+            values = trace.get(name)
+            if values is None or isinstance(values, (dict, str)):
+                continue
+            values = np.asarray(values)
+            if values.size < min_points or values.dtype.kind not in 'iuf':
+                continue
+            if values.dtype == np.int16:
+                trace[name] = typed_array(values, '<i2')
+            elif name == 'x':
+                trace[name] = typed_array(values, '<f8')
+            else:
+                trace[name] = typed_array(values, '<f4')
+    return fig_dict
+
+
+def analyze_pitch(snd):
+    # Análisis de Pitch (frecuencia fundamental)
+    from parselmouth.praat import call
+
+    pitch = snd.to_pitch()
+    return {
+        'mean_pitch': call(pitch, "Get mean", 0, 0, "Hertz"),
+        'pitch_times': pitch.xs(),
+        'pitch_values': pitch.selected_array['frequency'],
+    }
+
+def analyze_formants(snd):
+    # Análisis de Formantes usando LPC (método Burg); matrices (frames × formantes)
+    formants = snd.to_formant_burg()
+    formant_values, formant_bandwidths = formant_tracks(formants, N_FORMANTS, include_bandwidths=True)
+    return {
+        'formant_times': formants.xs(),
+        'formant_values': formant_values,
+        'formant_bandwidths': formant_bandwidths,
+    }
+
+def analyze_intensity(snd):
+    # Análisis de Intensidad
+    intensity = snd.to_intensity()
+    return {
+        'intensity_times': intensity.xs(),
+        'intensity_values': intensity.values.T.flatten(),
+    }
+
+def analyze_spectrogram(snd):
+    # Espectrograma (compartido por las gráficas 2D y 3D)
+    spectrogram = snd.to_spectrogram(window_length=SPECTROGRAM_WINDOW_LENGTH, maximum_frequency=MAXIMUM_FREQUENCY)
+    return {
+        'spectrogram_times': spectrogram.xs(),
+        'spectrogram_frequencies': spectrogram.ys(),
+        'spectrogram_db': 10 * np.log10(spectrogram.values),
+    }
+
+def spectrum_segment_length(rate, resolution=SPECTRUM_RESOLUTION):
+    # Muestras por segmento de Welch: la potencia de 2 que da al menos la resolución pedida
+    return 1 << int(np.ceil(np.log2(rate / resolution)))
+
+def welch_spectrum(values, rate):
+    """
+    Espectro promediado (Welch/LTAS) de una señal hasta MAXIMUM_FREQUENCY: (frecuencias, densidad
+    de potencia lineal). Su tamaño depende sólo de la resolución, no de la duración de la señal.
+    """
+    from scipy.signal import welch
+
+    segment_length = spectrum_segment_length(rate)
+    if len(values) < segment_length:
+        # Señales cortas: un segmento con ceros para que las frecuencias no cambien
+        values = np.pad(values, (0, segment_length - len(values)))
+    frequencies, psd = welch(values, fs=rate, nperseg=segment_length)
+    keep = frequencies <= MAXIMUM_FREQUENCY
+    return frequencies[keep], psd[keep]
+
+def analyze_spectrum(snd):
+    # Espectro de potencia promediado (en dB), en lugar de una sola FFT de todo el archivo
+    frequencies, psd = welch_spectrum(np.mean(snd.values, axis=0), snd.sampling_frequency)
+    return {
+        'spectrum_frequencies': frequencies,
+        'spectrum_power': 10 * np.log10(np.maximum(psd, 1e-30)),
+    }
+
+def log_frequency_bins(frequencies, power_db, n_bins=SPECTRUM_BINS,
+                       min_frequency=SPECTRUM_MIN_FREQUENCY, max_frequency=MAXIMUM_FREQUENCY):
+    """
+    Promedia la potencia (en escala lineal) en bandas de ancho logarítmico y devuelve el centro
+    geométrico y la potencia en dB de cada banda con datos.
+    """
+    edges = np.geomspace(min_frequency, max_frequency, n_bins + 1)
+    band = np.searchsorted(edges, frequencies, side='right') - 1
+    keep = (band >= 0) & (band < n_bins) & np.isfinite(power_db)
+    band = band[keep]
+    power_sum = np.bincount(band, weights=10 ** (power_db[keep] / 10), minlength=n_bins)
+    counts = np.bincount(band, minlength=n_bins)
+    filled = counts > 0
+    centers = np.sqrt(edges[:-1] * edges[1:])
+    return centers[filled], 10 * np.log10(np.maximum(power_sum[filled] / counts[filled], 1e-30))
+
+# Análisis independientes entre sí: pueden correr en cualquier orden o en paralelo
+ANALYSIS_PASSES = (analyze_pitch, analyze_formants, analyze_intensity, analyze_spectrogram, analyze_spectrum)
+
+
+class AudioAnalysis:
+    """
+    Resultado de todos los análisis de Parselmouth sobre un audio.
+    Cada análisis (pitch, formantes, intensidad, espectrograma y espectro) se calcula
+    una sola vez; las gráficas y la exportación leen de este objeto.
+    Sin snd se crea vacío para que lo llene el análisis por bloques (analisis_por_bloques.py).
+    """
+
+    def __init__(self, snd=None, results=None):
+        # Con wav_path las muestras se leen bajo demanda (memmap) en lugar de guardarse en memoria
+        self.wav_path = None
+        self.sample_scale = 1.0  # Factor para llevar las muestras a amplitud [-1, 1]
+        self._samples = None
+        if snd is None:
+            return
+
+        self.sampling_frequency = snd.sampling_frequency
+        self.duration = snd.xmax - snd.xmin
+
+        # Señal (promedio de canales) para el oscilograma; los tiempos se calculan al vuelo
+        self.start_time = snd.x1
+        self.time_step = snd.dx
+        self._samples = np.mean(snd.values, axis=0)
+
+        # results permite recibir los análisis ya calculados en paralelo (analisis_paralelo.py)
+        if results is None:
+            results = []
+            for analysis_pass in ANALYSIS_PASSES:
+                with stage(analysis_pass.__name__):
+                    results.append(analysis_pass(snd))
+        for result in results:
+            self.__dict__.update(result)
+        self.spectrogram_levels = build_spectrogram_pyramid(self.spectrogram_times, self.spectrogram_db)
+
+    @property
+    def samples(self):
+        if self._samples is None and self.wav_path is not None:
+            from analisis_por_bloques import read_wav_memmap
+            self._samples = read_wav_memmap(self.wav_path)[0][:, 0]
+        return self._samples
+
+    def map_samples(self, path):
+        """
+        Deja de guardar las muestras en memoria y las lee bajo demanda del .wav path (memmap), como el
+        análisis por bloques. Sólo con audios mono en PCM, donde el memmap coincide con el promedio
+        de canales. Devuelve si se pudo.
+        """
+        from analisis_por_bloques import read_wav_memmap
+
+        try:
+            data, _, scale = read_wav_memmap(path)
+        except (ValueError, OSError, struct.error):
+            return False
+        if self._samples is None or data.shape[1] != 1 or len(data) != len(self._samples):
+            return False
+        self.wav_path = os.path.abspath(path)
+        self.sample_scale = scale
+        self._samples = None
+        return True
+
+    def __getstate__(self):
+        # El memmap no se serializa: se vuelve a abrir desde wav_path
+        state = self.__dict__.copy()
+        if self.wav_path is not None:
+            state['_samples'] = None
+        return state
+
+    def __setstate__(self, state):
+        # Entradas de la caché guardadas antes del análisis por bloques: tenían las muestras en
+        # 'samples' (ahora una propiedad) y no tenían wav_path ni sample_scale
+        if 'samples' in state:
+            state['_samples'] = state.pop('samples')
+        state.setdefault('_samples', None)
+        state.setdefault('wav_path', None)
+        state.setdefault('sample_scale', 1.0)
+        self.__dict__.update(state)
+
+    def sample_index(self, time):
+        # Índice de la muestra más cercana a un tiempo, limitado a la señal
+        index = int(round((time - self.start_time) / self.time_step))
+        return min(max(index, 0), len(self.samples))
+
+    def voiced_pitch(self):
+        # Copia del pitch con las partes no sonoras como NaN
+        pitch_values = self.pitch_values.copy()
+        pitch_values[pitch_values == 0] = np.nan
+        return pitch_values
+
+
+@timed('draw_spectrogram_3d')
+def draw_spectrogram_3d(analysis):
+    # La superficie 3D usa siempre un nivel de resolución limitada
+    times, db = spectrogram_view(analysis.spectrogram_levels, max_columns=SPECTROGRAM_3D_MAX_COLUMNS)
     trace_surface = go.Surface(
-        z=Z,
-        x=X[0],
-        y=Y[:, 0],
+        z=db,
+        x=times,
+        y=analysis.spectrogram_frequencies,
         colorscale='Inferno',  # Usar la misma escala de colores que en el espectrograma 2D
         colorbar=dict(title="Intensity [dB]", thickness=20)
     )
@@ -29,27 +329,34 @@ def draw_spectrogram_3d(spectrogram):
  
     return go.Figure(data=[trace_surface], layout=layout)
  
-def draw_spectrogram(spectrogram, pitch, formants):
-    X, Y = np.meshgrid(spectrogram.xs(), spectrogram.ys())
-    Z = 10 * np.log10(spectrogram.values)
-   
+@timed('draw_spectrogram')
+def draw_spectrogram(analysis, x_range=None):
+    # Primero se envía el nivel grueso; al hacer zoom se pide el tramo visible con más detalle
+    times, db = spectrogram_view(analysis.spectrogram_levels, x_range)
     trace_spectrogram = go.Heatmap(
-        z=Z,
-        x=X[0],
-        y=Y[:, 0],
+        z=db,
+        x=times,
+        y=analysis.spectrogram_frequencies,
         colorscale='Inferno',
         colorbar=dict(title="Intensity [dB]", thickness=20)
     )
  
-    # Suavizar la frecuencia fundamental
-    pitch_values = pitch.selected_array['frequency']
-    pitch_values[pitch_values == 0] = np.nan  # Reemplazar partes no sonoras con NaN
+    # Suavizar la frecuencia fundamental (partes no sonoras como NaN). Solo se
+    # suaviza y envía el tramo visible; el margen de media ventana deja los
+    # valores visibles iguales a los de suavizar la curva completa
+    pitch = time_slice(analysis.pitch_times, x_range, margin=SAVGOL_WINDOW // 2 + 1)
+    pitch_values = analysis.voiced_pitch()[pitch]
    
     # Aplicar suavizado a la curva de la frecuencia fundamental
-    smoothed_pitch_values = savgol_filter(pitch_values, window_length=11, polyorder=2)
+    from scipy.signal import savgol_filter
+    with stage('savgol_filter'):
+        if len(pitch_values) >= SAVGOL_WINDOW:
+            smoothed_pitch_values = savgol_filter(pitch_values, window_length=SAVGOL_WINDOW, polyorder=2)
+        else:
+            smoothed_pitch_values = pitch_values
    
     trace_pitch = go.Scatter(
-        x=pitch.xs(),
+        x=analysis.pitch_times[pitch],
         y=smoothed_pitch_values,
         mode='lines+markers',
         marker=dict(size=3, color='cyan'),
@@ -59,15 +366,15 @@ def draw_spectrogram(spectrogram, pitch, formants):
  
     traces = [trace_spectrogram, trace_pitch]
  
-    # Superponer las líneas de los formantes en 2D
-    for formant_number in range(1, 4):  # Los primeros 3 formantes
-        formant_values = [formants.get_value_at_time(formant_number, t) for t in formants.xs()]
-        formant_values = np.array(formant_values)
+    # Superponer las líneas de los formantes en 2D (solo el tramo visible)
+    formants = time_slice(analysis.formant_times, x_range)
+    for formant_number in range(1, N_FORMANTS + 1):
+        formant_values = analysis.formant_values[formants, formant_number - 1].copy()
         formant_values[formant_values < 300] = np.nan  # Filtrar valores por debajo de 300 Hz
         formant_values[formant_values > 5000] = np.nan  # Filtrar valores por encima de 5000 Hz
  
         trace_formant = go.Scatter(
-            x=formants.xs(),
+            x=analysis.formant_times[formants],
             y=formant_values,
             mode='lines+markers',
             marker=dict(size=2),
@@ -80,19 +387,20 @@ def draw_spectrogram(spectrogram, pitch, formants):
         title="Spectrogram with Fundamental Frequency and Formants",
         xaxis=dict(title="Time [s]"),
         yaxis=dict(title="Frequency [Hz]", range=[0, 5000]),
-        legend=dict(x=1.3, y=1)  # Mover la leyenda fuera del gráfico principal
+        legend=dict(x=1.3, y=1),  # Mover la leyenda fuera del gráfico principal
+        uirevision='spectrogram'  # Conservar el zoom al reemplazar los datos
     )
+    if x_range is not None:
+        layout.xaxis.range = list(x_range)
  
     return go.Figure(data=traces, layout=layout)
  
-def draw_combined_pitch_intensity_contour(pitch, intensity):
-    # Curva de pitch (frecuencia fundamental)
-    pitch_values = pitch.selected_array['frequency']
-    pitch_values[pitch_values == 0] = np.nan  # Reemplazar partes no sonoras con NaN
- 
+@timed('draw_combined_pitch_intensity_contour')
+def draw_combined_pitch_intensity_contour(analysis):
+    # Curva de pitch (frecuencia fundamental, partes no sonoras como NaN)
     trace_pitch = go.Scatter(
-        x=pitch.xs(),
-        y=pitch_values,
+        x=analysis.pitch_times,
+        y=analysis.voiced_pitch(),
         mode='lines+markers',
         marker=dict(size=3, color='red'),
         line=dict(color='red'),
@@ -101,8 +409,8 @@ def draw_combined_pitch_intensity_contour(pitch, intensity):
  
     # Curva de intensidad (dB)
     trace_intensity = go.Scatter(
-        x=intensity.xs(),
-        y=intensity.values.T.flatten(),
+        x=analysis.intensity_times,
+        y=analysis.intensity_values,
         mode='lines',
         line=dict(color='purple'),
         name="Intensity",
@@ -123,59 +431,85 @@ def draw_combined_pitch_intensity_contour(pitch, intensity):
  
     return go.Figure(data=[trace_pitch, trace_intensity], layout=layout)
  
-def draw_power_spectrum(frequencies, power, formants):
-    power = power.flatten()
-   
-    # Verificar que frequencies y power tengan la misma longitud
-    if len(frequencies) != len(power):
-        min_length = min(len(frequencies), len(power))
-        frequencies = frequencies[:min_length]
-        power = power[:min_length]
-   
-    valid_idx = np.isfinite(power)
-    frequencies = frequencies[valid_idx]
-    power = power[valid_idx]
- 
-    smoothed_power = savgol_filter(power, window_length=101, polyorder=2)
- 
-    trace_smoothed = go.Scatter(
+@timed('draw_power_spectrum')
+def draw_power_spectrum(analysis):
+    # Bandas logarítmicas del espectro promediado: el tamaño de la figura no depende de la duración
+    frequencies, power = log_frequency_bins(analysis.spectrum_frequencies, analysis.spectrum_power.ravel())
+
+    trace_spectrum = go.Scatter(
         x=frequencies,
-        y=smoothed_power,
+        y=power,
         mode='lines',
         line=dict(color='blue', width=3),
-        name="Smoothed Power Spectrum"
+        name="Long-Term Average Spectrum"
     )
- 
-    traces = [trace_smoothed]
- 
-    # Añadir líneas verticales para las resonancias de los formantes
-    for formant_number in range(1, 4):  # Visualizar las resonancias de los primeros 3 formantes
-        formant_values = [formants.get_value_at_time(formant_number, t) for t in formants.xs()]
-        formant_values = np.array(formant_values)
+
+    traces = [trace_spectrum]
+    y_range = [np.min(power), np.max(power)] if len(power) else [0, 1]
+
+    # Añadir líneas verticales para las resonancias de los formantes (mediana de cada pista)
+    for formant_number in range(1, N_FORMANTS + 1):
+        formant_values = analysis.formant_values[:, formant_number - 1]
         formant_values = formant_values[np.isfinite(formant_values)]  # Filtrar NaNs
-        mean_formant = np.mean(formant_values)
- 
+        if len(formant_values) == 0:
+            continue
+        formant_frequency = float(np.median(formant_values))
+
         trace_formant_line = go.Scatter(
-            x=[mean_formant, mean_formant],
-            y=[np.min(smoothed_power), np.max(smoothed_power)],
+            x=[formant_frequency, formant_frequency],
+            y=y_range,
             mode='lines',
             line=dict(color='red', dash='dot'),
-            name=f"Formant {formant_number} Resonance"
+            name=f"Formant {formant_number} Resonance ({formant_frequency:.0f} Hz)"
         )
         traces.append(trace_formant_line)
- 
+
     layout = go.Layout(
-        title="Power Spectrum with Smoothed Envelope and Formant Resonances",
-        xaxis=dict(title="Frequency [Hz]", range=[0, 5000]),
+        title="Long-Term Average Spectrum with Formant Resonances",
+        xaxis=dict(title="Frequency [Hz]", type='log',
+                   range=[np.log10(SPECTRUM_MIN_FREQUENCY), np.log10(MAXIMUM_FREQUENCY)]),
         yaxis=dict(title="Power [dB]")
     )
- 
+
     return go.Figure(data=traces, layout=layout)
- 
-def draw_waveform(xs, values):
+
+
+def minmax_envelope(values, n_buckets=WAVEFORM_BUCKETS):
+    """
+    Reduce una señal a su envolvente mínimo/máximo en n_buckets intervalos.
+    Devuelve los índices del inicio de cada bucket y los valores, dos puntos por bucket
+    (mínimo y máximo) para que la forma de onda se vea igual que con todas las muestras.
+    """
+    n_samples = len(values)
+    if n_samples <= 2 * n_buckets:
+        return np.arange(n_samples), np.asarray(values)
+
+    starts = np.linspace(0, n_samples, n_buckets, endpoint=False).astype(int)
+    mins = np.minimum.reduceat(values, starts)
+    maxs = np.maximum.reduceat(values, starts)
+
+    return np.repeat(starts, 2), np.column_stack((mins, maxs)).ravel()
+
+def decimate_minmax(times, values, n_buckets=WAVEFORM_BUCKETS):
+    # Envolvente mínimo/máximo con los tiempos de cada punto (ver minmax_envelope)
+    indices, envelope = minmax_envelope(values, n_buckets)
+    return np.asarray(times)[indices], envelope
+
+@timed('draw_waveform')
+def draw_waveform(analysis, x_range=None):
+    # Sólo se envía la envolvente del tramo visible; al hacer zoom se pide un tramo más detallado
+    if x_range is None:
+        start, stop = 0, len(analysis.samples)
+    else:
+        start, stop = analysis.sample_index(x_range[0]), analysis.sample_index(x_range[1]) + 1
+    # Los tiempos se calculan sólo para los puntos de la envolvente, no para todas las muestras
+    indices, ys = minmax_envelope(analysis.samples[start:stop])
+    xs = analysis.start_time + (start + indices) * analysis.time_step
+    ys = ys * analysis.sample_scale
+
     trace_waveform = go.Scatter(
         x=xs,
-        y=values.flatten(),
+        y=ys,
         mode='lines',
         line=dict(color='black'),
         name="Waveform"
@@ -184,85 +518,44 @@ def draw_waveform(xs, values):
     layout = go.Layout(
         title="Waveform (Oscillogram)",
         xaxis=dict(title="Time [s]"),
-        yaxis=dict(title="Amplitude")
+        yaxis=dict(title="Amplitude"),
+        uirevision='waveform'  # Conservar el zoom al reemplazar los datos
     )
+    if x_range is not None:
+        layout.xaxis.range = list(x_range)
  
     return go.Figure(data=[trace_waveform], layout=layout)
  
-def generate_text_file(pitch, intensity, formants):
+@timed('compute_analysis')
+def compute_analysis(path):
     """
-    Genera un archivo de texto con los datos de pitch, intensidad y formantes.
+    Calcula el AudioAnalysis de un archivo sin generar figuras (lo usan trabajos.py y analizar_corpus.py).
     """
-    output = io.StringIO()
-   
-    output.write("Pitch Data (Frequency vs Time):\n")
-    output.write("Time [s]\tFrequency [Hz]\n")
-    for time, frequency in zip(pitch.xs(), pitch.selected_array['frequency']):
-        output.write(f"{time:.4f}\t{frequency:.2f}\n")
-   
-    output.write("\nIntensity Data (dB vs Time):\n")
-    output.write("Time [s]\tIntensity [dB]\n")
-    for time, intensity_value in zip(intensity.xs(), intensity.values.T.flatten()):
-        output.write(f"{time:.4f}\t{intensity_value:.2f}\n")
-   
-    output.write("\nFormants Data:\n")
-    for formant_number in range(1, 4):
-        output.write(f"Formant {formant_number}:\n")
-        output.write("Time [s]\tFormant Frequency [Hz]\n")
-        for time in formants.xs():
-            formant_value = formants.get_value_at_time(formant_number, time)
-            output.write(f"{time:.4f}\t{formant_value:.2f}\n")
-        output.write("\n")
-   
-    text_content = output.getvalue()
-    output.close()
-   
-    return text_content
+    import parselmouth
+    from analisis_por_bloques import use_block_analysis, analyze_audio_in_blocks
+    from analisis_paralelo import get_engine, PARALLEL_WORKERS
 
-def analyze_audio(signal, live):
-    global RATE
-    if live:
-        snd = parselmouth.Sound(signal, sampling_frequency=RATE)
-    else:
-        try:
-            snd = parselmouth.Sound(signal)
-
-        except Exception as e:
-            print(f"Error al analizar el archivo: {e}")
-            return None, None, None, None, None, None, None
-       
-        # Cargar el archivo usando parselmouth
-       
-        # Análisis de Pitch (frecuencia fundamental)
-        pitch = snd.to_pitch()
-        mean_pitch = call(pitch, "Get mean", 0, 0, "Hertz")
- 
-        # Análisis de Formantes usando LPC (método Burg)
-        formants = snd.to_formant_burg()
- 
-        # Análisis de Intensidad
-        intensity = snd.to_intensity()
- 
-        # Generar el espectrograma 3D con Plotly
-        spectrogram_3d_fig = draw_spectrogram_3d(snd.to_spectrogram(window_length=0.005, maximum_frequency=5000))
- 
-        # Generar el espectrograma 2D con Plotly
-        spectrogram_fig = draw_spectrogram(snd.to_spectrogram(window_length=0.005, maximum_frequency=5000), pitch, formants)
- 
-        # Generar el espectro de potencia con Plotly
-        spectrum = snd.to_spectrum()
-        frequencies = spectrum.xs()
-        power = np.where(spectrum.values.T > 0, 10 * np.log10(spectrum.values.T), np.nan)
-        spectrum_fig = draw_power_spectrum(frequencies, power, formants)
- 
-        # Generar el oscilograma con Plotly
-        waveform_fig = draw_waveform(snd.xs(), snd.values)
- 
-        # Generar la gráfica combinada de pitch e intensidad
-        combined_pitch_intensity_fig = draw_combined_pitch_intensity_contour(pitch, intensity)
- 
-        # Generar el archivo de texto con los datos
-        text_content = generate_text_file(pitch, intensity, formants)
- 
-        return mean_pitch, spectrogram_3d_fig, spectrogram_fig, spectrum_fig, waveform_fig, combined_pitch_intensity_fig, text_content
+    if PARALLEL_WORKERS > 1:
+        # Análisis independientes (o bloques) repartidos en varios procesos
+        return get_engine().analyze(path)
+    if use_block_analysis(path):
+        # Archivos largos: análisis por bloques con memoria acotada
+        return analyze_audio_in_blocks(path)
+    # Calcular cada análisis una sola vez
+    with stage('load_sound'):
+        snd = parselmouth.Sound(path)
+    return AudioAnalysis(snd)
+
+def warm_up():
+    """
+    Análisis sintético de medio segundo: carga Parselmouth, scipy y los validadores de plotly y paga
+    la primera llamada a Praat antes de la primera petición (ver gunicorn.conf.py y trabajos.py).
+    """
+    import parselmouth
+    from fuentes_audio import synthetic_vowel
 
+    rate = 16000
+    snd = parselmouth.Sound(synthetic_vowel(0, rate // 2, rate, 120.0, (700.0, 1200.0, 2600.0)), sampling_frequency=rate)
+    analysis = AudioAnalysis(snd)
+    for draw in (draw_spectrogram, draw_waveform, draw_combined_pitch_intensity_contour, draw_power_spectrum):
+        compact_figure(draw(analysis))
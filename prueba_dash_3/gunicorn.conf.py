@@ -0,0 +1,25 @@
+# Configuración de gunicorn (se lee automáticamente al ejecutar "gunicorn app:server" en este directorio)
+import os
+import threading
+
+# Flask-SocketIO corre en modo threading: con el worker gthread cada websocket o long-poll de engine.io
+# ocupa un hilo y no el worker entero (con el worker sync por defecto los websockets no funcionan)
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 32))
+# Los workers se configuran con WEB_CONCURRENCY (1 por defecto). Con más de uno, socket.io necesita
+# sesiones "sticky" en el balanceador para que cada cliente llegue siempre al mismo worker.
+
+
+def post_fork(server, worker):
+    # Precarga en segundo plano: el worker atiende peticiones mientras se cargan Parselmouth y scipy
+    # y arrancan los procesos del pool de análisis
+    def warm_up():
+        try:
+            from graficas import warm_up as warm_up_analysis
+            from trabajos import start_workers
+            start_workers()
+            warm_up_analysis()
+        except Exception as e:
+            worker.log.warning(f"Warm-up failed: {e}")
+
+    threading.Thread(target=warm_up, daemon=True).start()
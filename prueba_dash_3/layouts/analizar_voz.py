@@ -1,35 +1,62 @@
 # Función de layout para "Analizar mi voz"
 from dash import html, dcc
+from exportar import available_formats
 def layout_analizar_voz():
     return html.Div(children=[
         html.H2('Analizar mi voz'),
         html.Button('Iniciar Grabación', id='start-button', n_clicks=0),
         html.Button('Detener Grabación', id='stop-button', n_clicks=0),
         html.Div(id='indicator', style={'color': 'red', 'fontSize': 30}, children='●'),
+        html.Div(id='live-status'),  # Avisos de la grabación en vivo (ver assets/script.js)
         html.Div(id='container-analize-button',style={'display': 'none'}, children=[
             html.Button('Guardar y Cargar', id='analizar-boton')
         ]),
         html.Div(id='output-analizar-mi-voz', style={'display': 'none'},children=[
             dcc.Graph(id='oscillogram_live'),
-            dcc.Graph(id='spectrogram_live')
+            dcc.Graph(id='spectrogram_live'),
+            dcc.Graph(id='pitch_live')
         ]),
         dcc.Interval(id='interval', interval=200, n_intervals=0, disabled=True),  
         html.H3(id='resultado'),
+        dcc.Store(id='job-id'),
+        dcc.Store(id='uploaded-audio-id'),  # Sin uso aquí: la grabación queda en la sesión
+        dcc.Interval(id='job-interval', interval=500, n_intervals=0, disabled=True),
         html.Div(id='output-audio-analysis', style={'display': 'none'}, children=[
             html.Audio(id='audio-player', controls=True, style={'width': '100%'}, src=''),
-            html.A('Descargar Datos en .txt', id='download-link', download="audio_analysis.txt", href="", target="_blank", style={'display': 'block', 'marginTop': '20px'}),
+            html.Div(style={'marginTop': '20px'}, children=[
+                html.A('Descargar datos', id='download-link', download="audio_analysis.txt", href="", target="_blank"),
+                dcc.Dropdown(id='export-format', value='txt', clearable=False, style={'display': 'inline-block', 'width': '120px', 'marginLeft': '10px', 'verticalAlign': 'middle'},
+                             options=[{'label': f'.{fmt}', 'value': fmt} for fmt in available_formats()]),
+            ]),
             html.H3(id='pitch'),
-            dcc.Graph(id='spectrogram', className='cursor2d', style={'display': 'inline-block', 'width': '60%'}),
-            dcc.Graph(id='spectrogram-3d', className='cursor3d', style={'display': 'inline-block', 'width': '38%'}),
-            dcc.Graph(id='waveform', className='cursor2d', style={'display': 'inline-block', 'width': '48%'}),
-            dcc.Graph(id='combined-pitch-intensity', className='cursor2d', style={'display': 'inline-block', 'width': '48%'}),
-            dcc.Graph(id='spectrum')
+            dcc.Store(id='audio-id'),  # Audio analizado; el servidor deriva de él la clave de la caché
+            # Cada gráfica se pide al servidor cuando se abre su pestaña (ver fill_figure en app.py)
+            dcc.Tabs(id='analysis-tabs', value='spectrogram', children=[
+                dcc.Tab(label='Espectrograma', value='spectrogram', children=[
+                    dcc.Graph(id='spectrogram', className='cursor2d')
+                ]),
+                dcc.Tab(label='Oscilograma', value='waveform', children=[
+                    dcc.Graph(id='waveform', className='cursor2d')
+                ]),
+                dcc.Tab(label='Pitch e intensidad', value='combined-pitch-intensity', children=[
+                    dcc.Graph(id='combined-pitch-intensity', className='cursor2d')
+                ]),
+                dcc.Tab(label='Espectro', value='spectrum', children=[
+                    dcc.Graph(id='spectrum')
+                ]),
+                dcc.Tab(label='Espectrograma 3D', value='spectrogram-3d', children=[
+                    html.Button('Generar espectrograma 3D', id='show-3d', n_clicks=0),
+                    dcc.Graph(id='spectrogram-3d', className='cursor3d')
+                ]),
+            ]),
+            # Audio que muestra cada gráfica, para no volver a generarla
+            *[dcc.Store(id=f'{graph_id}-figure-key') for graph_id in
+              ('spectrogram', 'waveform', 'combined-pitch-intensity', 'spectrum', 'spectrogram-3d')],
         ]),       
         
         html.Button('Regresar', id='btn-regresar', n_clicks=0),  
         html.Div (style={'display': 'none'},children=[
             html.Button('Analizar mi voz', id='btn-analizar-voz', n_clicks=0),
-            html.Button('Analizar un archivo .wav', id='btn-analizar-wav', n_clicks=0),
-            dcc.Upload(id='upload-wav', children=html.Button('Seleccionar archivo .wav'),accept='.wav',contents=None)
+            html.Button('Analizar un archivo .wav', id='btn-analizar-wav', n_clicks=0)
         ])
     ])
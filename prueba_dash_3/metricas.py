@@ -0,0 +1,223 @@
+# Métricas de rendimiento (latencia por etapa, bytes y ticks en vivo) en el formato de texto de Prometheus
+import cProfile
+import functools
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+# Límites superiores (segundos) de los buckets de los histogramas de latencia
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+# Con PROFILE_DIR se guarda un perfil de cProfile de las peticiones marcadas (?profile=1 o cabecera X-Profile)
+PROFILE_DIR = os.environ.get('PROFILE_DIR')
+PROFILE_ALL_REQUESTS = os.environ.get('PROFILE_ALL_REQUESTS') == '1'
+
+HELP = {
+    'tg_stage_seconds': 'Duración de cada etapa del análisis y de las gráficas',
+    'tg_request_seconds': 'Duración de las peticiones HTTP por ruta',
+    'tg_bytes_total': 'Bytes recibidos (in) y enviados (out) por tipo de dato',
+    'tg_live_tick_seconds': 'Tiempo de procesamiento de cada tick en vivo',
+    'tg_live_tick_jitter_seconds': 'Desviación entre ticks en vivo consecutivos respecto del periodo de un bloque',
+    'tg_live_tick_overruns_total': 'Ticks en vivo que tardaron más que la duración de un bloque',
+    'tg_process_resident_bytes': 'Memoria residente del proceso del servidor',
+    'tg_analysis_jobs_lost_total': 'Trabajos de análisis que no terminaron a tiempo o cuyo proceso o pool desapareció',
+}
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+def format_labels(labels, **extra):
+    items = list(labels) + list(extra.items())
+    if not items:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in items) + '}'
+
+
+class MetricsRegistry:
+    """
+    Histogramas, contadores y valores instantáneos del proceso, con etiquetas.
+    Cada métrica se identifica por su nombre y sus etiquetas ordenadas.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+        self._local = threading.local()
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+        # Etapas recogidas por collect_stages (p. ej. en un proceso del pool de trabajos)
+        collected = getattr(self._local, 'collected', None)
+        if collected is not None and name == 'tg_stage_seconds':
+            collected.append((labels['stage'], value))
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def observe_stages(self, stages):
+        # Etapas medidas en otro proceso: [(etapa, segundos)]
+        for stage_name, seconds in stages:
+            self.observe('tg_stage_seconds', seconds, stage=stage_name)
+
+    @contextmanager
+    def collect_stages(self):
+        # Lista con las etapas medidas por este hilo dentro del bloque
+        self._local.collected = []
+        try:
+            yield self._local.collected
+        finally:
+            self._local.collected = None
+
+    def render(self):
+        """
+        Todas las métricas en el formato de texto de Prometheus.
+        """
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+
+        lines = []
+        described = set()
+
+        def describe(name, metric_type):
+            if name not in described:
+                described.add(name)
+                if name in HELP:
+                    lines.append(f"# HELP {name} {HELP[name]}")
+                lines.append(f"# TYPE {name} {metric_type}")
+
+        for (name, labels), histogram in histograms:
+            describe(name, 'histogram')
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{format_labels(labels, le=bound)} {cumulative}")
+            lines.append(f"{name}_bucket{format_labels(labels, le='+Inf')} {histogram.count}")
+            lines.append(f"{name}_sum{format_labels(labels)} {histogram.sum}")
+            lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+        for (name, labels), value in counters:
+            describe(name, 'counter')
+            lines.append(f"{name}{format_labels(labels)} {value}")
+        for (name, labels), value in gauges:
+            describe(name, 'gauge')
+            lines.append(f"{name}{format_labels(labels)} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+metrics = MetricsRegistry()
+
+
+@contextmanager
+def stage(name):
+    # Mide la duración de un bloque de código como etapa
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.observe('tg_stage_seconds', time.perf_counter() - start, stage=name)
+
+
+def timed(name):
+    # Decorador equivalente a stage para una función completa
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count_bytes(kind, direction, n_bytes):
+    metrics.inc('tg_bytes_total', n_bytes, kind=kind, direction=direction)
+
+
+def counted_chunks(chunks, kind):
+    # Cuenta los bytes de una respuesta en streaming a medida que se envían
+    for chunk in chunks:
+        count_bytes(kind, 'out', len(chunk))
+        yield chunk
+
+
+class TickMonitor:
+    """
+    Mide los ticks en vivo de una sesión: duración del procesamiento, jitter del intervalo entre
+    ticks respecto de period (la duración de un bloque) y ticks que tardan más que period.
+    """
+
+    def __init__(self, mode, period):
+        self.mode = mode
+        self.period = period
+        self.last_start = None
+
+    def record(self, start, stop):
+        if self.last_start is not None:
+            metrics.observe('tg_live_tick_jitter_seconds', abs(start - self.last_start - self.period), mode=self.mode)
+        self.last_start = start
+        metrics.observe('tg_live_tick_seconds', stop - start, mode=self.mode)
+        if stop - start > self.period:
+            metrics.inc('tg_live_tick_overruns_total', mode=self.mode)
+
+    def reset(self):
+        # Tras una pausa (p. ej. una nueva grabación) el primer tick no cuenta como jitter
+        self.last_start = None
+
+
+def resident_memory_bytes(pid='self'):
+    # Memoria residente (RSS) de un proceso según /proc; None donde no existe /proc (fuera de Linux)
+    try:
+        with open(f'/proc/{pid}/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def profiling_requested(request):
+    if PROFILE_DIR is None:
+        return False
+    return PROFILE_ALL_REQUESTS or request.args.get('profile') == '1' or 'X-Profile' in request.headers
+
+
+def start_profile():
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def dump_profile(profiler, path):
+    # Un archivo .prof por petición, legible con pstats o snakeviz
+    profiler.disable()
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    name = re.sub(r'[^A-Za-z0-9_-]+', '_', path).strip('_') or 'index'
+    profile_path = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{time.perf_counter_ns()}-{name}.prof")
+    profiler.dump_stats(profile_path)
+    return profile_path
@@ -0,0 +1,424 @@
+# Prueba de carga del servidor con sesiones concurrentes (subidas de .wav y grabaciones en vivo sintéticas).
+#
+#   python prueba_carga.py --concurrency 1 2 4 8 16 --duration 60
+#   python prueba_carga.py --url http://127.0.0.1:8000 --scenario live
+#
+# Cada usuario virtual tiene su propia cookie de sesión y repite su escenario contra las rutas reales:
+# 'upload' sube un .wav sintético a /upload, lo analiza con el callback update_output y consulta
+# poll_analysis_job hasta que termina; 'live' abre /start-recording, consulta update_graphs al ritmo de
+# un bloque, cierra con /stop-recording y analiza la grabación. Para cada nivel de concurrencia se
+# informan el throughput, las latencias p50/p95/p99 por petición, la tasa de errores y la memoria del
+# servidor. Sin --url se arranca "gunicorn app:server" con gunicorn.conf.py (como en el despliegue) y un
+# worker, AUDIO_SOURCE=synthetic (sin PyAudio) y LIVE_STREAMING=0; un servidor externo debe usar esa
+# misma configuración.
+import argparse
+import http.cookiejar
+import io
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import wave
+
+from fuentes_audio import synthetic_vowel
+from metricas import resident_memory_bytes
+
+DEFAULT_CONCURRENCY = (1, 2, 4, 8)
+DEFAULT_DURATION = 60  # Segundos por nivel de concurrencia
+RESULTS_DIR = 'benchmarks'
+UPLOAD_SECONDS = 5  # Duración de los .wav subidos
+UPLOAD_RATE = 16000
+LIVE_TICKS = 25  # Ticks de update_graphs por grabación (5 s con bloques de 200 ms)
+TICK_PERIOD = 0.2  # CHUNK / RATE en app.py
+POLL_PERIOD = 0.5  # Intervalo de job-interval en layouts/analizar_wav.py
+ANALYSIS_TIMEOUT = 300
+REQUEST_TIMEOUT = 120
+MEMORY_PERIOD = 0.5
+SERVER_START_TIMEOUT = 120
+
+
+def synthetic_wav(seconds, rate, f0):
+    # .wav PCM de 16 bits en memoria; cada f0 distinto da un audio nuevo (sin aciertos de caché)
+    samples = synthetic_vowel(0, int(seconds * rate), rate, f0, (700.0, 1200.0, 2600.0))
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes((samples * 32767).astype('<i2').tobytes())
+    return buffer.getvalue()
+
+
+def percentile(values, q):
+    # Percentil por rango más cercano
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(round(q / 100 * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+class RequestFailed(Exception):
+    pass
+
+
+class Recorder:
+    """
+    Latencias y errores de todas las peticiones de un nivel de concurrencia, por nombre.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+
+    def add(self, name, seconds, ok):
+        with self.lock:
+            if ok:
+                self.latencies.setdefault(name, []).append(seconds)
+            else:
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+    def summary(self, elapsed):
+        names = sorted(set(self.latencies) | set(self.errors))
+        summary = {}
+        for name in names:
+            values = self.latencies.get(name, [])
+            errors = self.errors.get(name, 0)
+            summary[name] = {
+                'count': len(values),
+                'errors': errors,
+                'error_rate': errors / (len(values) + errors),
+                'throughput': len(values) / elapsed,
+                'p50': percentile(values, 50),
+                'p95': percentile(values, 95),
+                'p99': percentile(values, 99),
+            }
+        return summary
+
+
+class DashClient:
+    """
+    Un navegador simulado: cookie de sesión propia y llamadas a los callbacks de Dash con el mismo
+    cuerpo que envía el renderer a /_dash-update-component.
+    """
+
+    def __init__(self, url, callbacks, recorder):
+        self.url = url.rstrip('/')
+        self.callbacks = callbacks
+        self.recorder = recorder
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def request(self, name, path, data=None, content_type=None):
+        headers = {'Content-Type': content_type} if content_type else {}
+        request = urllib.request.Request(self.url + path, data=data, headers=headers,
+                                         method='GET' if data is None else 'POST')
+        start = time.perf_counter()
+        try:
+            with self.opener.open(request, timeout=REQUEST_TIMEOUT) as response:
+                body = response.read()
+                status = response.status
+        except (urllib.error.URLError, OSError) as e:
+            self.recorder.add(name, time.perf_counter() - start, False)
+            raise RequestFailed(f"{name}: {e}")
+        self.recorder.add(name, time.perf_counter() - start, True)
+        return status, body
+
+    def callback(self, name, inputs, state=(), changed=None):
+        """
+        Llama al callback name con inputs y state [(id, propiedad, valor)] y devuelve
+        {id: {propiedad: valor}} (vacío si el callback no actualiza nada).
+        """
+        callback = self.callbacks[name]
+        payload = {
+            'output': callback['output'],
+            'outputs': callback['outputs'],
+            'inputs': [{'id': i, 'property': p, 'value': v} for i, p, v in inputs],
+            'changedPropIds': [changed or f"{inputs[0][0]}.{inputs[0][1]}"],
+            'state': [{'id': i, 'property': p, 'value': v} for i, p, v in state],
+        }
+        status, body = self.request(name, '/_dash-update-component', json.dumps(payload).encode(), 'application/json')
+        if status == 204:
+            return {}  # PreventUpdate
+        return json.loads(body).get('response', {})
+
+    def open_page(self, button):
+        # Cargar la página (y la cookie) y entrar a "Analizar mi voz" o "Analizar un archivo .wav"
+        self.request('GET /', '/')
+        self.callback('display_page', [('btn-analizar-voz', 'n_clicks', int(button == 'btn-analizar-voz')),
+                                       ('btn-analizar-wav', 'n_clicks', int(button == 'btn-analizar-wav')),
+                                       ('btn-regresar', 'n_clicks', 0)], changed=f'{button}.n_clicks')
+
+    def analyze(self, uploaded_audio_id=None):
+        # Clic en "Analizar" y consulta del trabajo hasta que entrega el resultado
+        start = time.perf_counter()
+        response = self.callback('update_output', [('analizar-boton', 'n_clicks', 1)],
+                                 state=[('uploaded-audio-id', 'data', uploaded_audio_id)])
+        job_id = response.get('job-id', {}).get('data')
+        n_intervals = 0
+        while job_id is not None:
+            if time.perf_counter() - start > ANALYSIS_TIMEOUT:
+                raise RequestFailed("analysis timed out")
+            time.sleep(POLL_PERIOD)
+            n_intervals += 1
+            response = self.callback('poll_analysis_job', [('job-interval', 'n_intervals', n_intervals)],
+                                     state=[('job-id', 'data', job_id)])
+            if response.get('job-interval', {}).get('disabled'):
+                break
+        if 'audio-id' not in response or response['audio-id'].get('data') is None:
+            raise RequestFailed(f"analysis failed: {response.get('resultado')}")
+        self.recorder.add('analysis', time.perf_counter() - start, True)
+
+
+def upload_scenario(client, wav):
+    client.open_page('btn-analizar-wav')
+    _, body = client.request('upload', '/upload', wav, 'audio/wav')
+    # Como assets/script.js: el id devuelto va al dcc.Store de la página
+    client.analyze(json.loads(body)['id'])
+
+
+def live_scenario(client, ticks=LIVE_TICKS):
+    client.open_page('btn-analizar-voz')
+    client.request('start-recording', '/start-recording', b'{"start": true}', 'application/json')
+    try:
+        for n_intervals in range(1, ticks + 1):
+            tick_start = time.perf_counter()
+            client.callback('update_graphs', [('interval', 'n_intervals', n_intervals),
+                                              ('analizar-boton', 'n_clicks', None)])
+            # Como el dcc.Interval: un tick por bloque aunque la respuesta llegue antes
+            time.sleep(max(TICK_PERIOD - (time.perf_counter() - tick_start), 0))
+    finally:
+        client.request('stop-recording', '/stop-recording', b'{"stop": true}', 'application/json')
+    client.analyze()
+
+
+def run_user(url, callbacks, recorder, scenario, deadline, unique_audio, index):
+    rng = random.Random(index)
+    cached_wav = synthetic_wav(UPLOAD_SECONDS, UPLOAD_RATE, 120.0)
+    while time.time() < deadline:
+        client = DashClient(url, callbacks, recorder)
+        name = scenario if scenario != 'mixed' else rng.choice(('upload', 'live'))
+        start = time.perf_counter()
+        try:
+            if name == 'upload':
+                wav = synthetic_wav(UPLOAD_SECONDS, UPLOAD_RATE, rng.uniform(90, 250)) if unique_audio else cached_wav
+                upload_scenario(client, wav)
+            else:
+                live_scenario(client)
+        except (RequestFailed, ValueError, KeyError) as e:
+            recorder.add(f'{name}_flow', time.perf_counter() - start, False)
+            print(f"  usuario {index}: {e}", file=sys.stderr)
+            continue
+        recorder.add(f'{name}_flow', time.perf_counter() - start, True)
+
+
+def load_callbacks(url):
+    """
+    Busca en /_dash-dependencies los callbacks que usa la prueba, por su primera salida y sus entradas,
+    para enviar exactamente el 'output' que espera el servidor (incluido el sufijo de allow_duplicate).
+    """
+    with urllib.request.urlopen(url.rstrip('/') + '/_dash-dependencies', timeout=REQUEST_TIMEOUT) as response:
+        dependencies = json.loads(response.read())
+    wanted = {
+        'display_page': ('main-contetn.children', {'btn-analizar-voz.n_clicks', 'btn-analizar-wav.n_clicks', 'btn-regresar.n_clicks'}),
+        'update_output': ('resultado.children', {'analizar-boton.n_clicks'}),
+        'poll_analysis_job': ('resultado.children', {'job-interval.n_intervals'}),
+        'update_graphs': ('output-analizar-mi-voz.style', {'interval.n_intervals', 'analizar-boton.n_clicks'}),
+    }
+    callbacks = {}
+    for dependency in dependencies:
+        specs = dependency['output'].strip('.').split('...') if dependency['output'].startswith('..') else [dependency['output']]
+        outputs = [dict(zip(('id', 'property'), spec.rsplit('.', 1))) for spec in specs]
+        first_output = f"{outputs[0]['id']}.{outputs[0]['property'].split('@')[0]}"
+        inputs = {f"{i['id']}.{i['property']}" for i in dependency['inputs']}
+        for name, (output, input_ids) in wanted.items():
+            if first_output == output and inputs == input_ids:
+                callbacks[name] = {'output': dependency['output'],
+                                   'outputs': outputs if dependency['output'].startswith('..') else outputs[0]}
+    missing = set(wanted) - set(callbacks)
+    if missing:
+        raise RuntimeError(f"Callbacks not found in /_dash-dependencies: {sorted(missing)}")
+    return callbacks
+
+
+def process_tree(pid):
+    # pid y todos sus descendientes (workers de gunicorn y procesos del pool de análisis)
+    children = {}
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    parent = int(f.read().rsplit(')', 1)[1].split()[1])
+            except (OSError, ValueError, IndexError):
+                continue
+            children.setdefault(parent, []).append(int(entry))
+    tree, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        tree.append(current)
+        pending.extend(children.get(current, []))
+    return tree
+
+
+class MemorySampler:
+    """
+    Muestrea la memoria del servidor: la suma del RSS de su árbol de procesos si lo arrancó esta
+    prueba, o el valor tg_process_resident_bytes de /metrics para un servidor externo.
+    """
+
+    def __init__(self, url, pid=None):
+        self.url = url.rstrip('/')
+        self.pid = pid
+        self.samples = []
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def read(self):
+        if self.pid is not None:
+            sizes = [resident_memory_bytes(pid) for pid in process_tree(self.pid)]
+            return sum(size for size in sizes if size is not None)
+        try:
+            with urllib.request.urlopen(self.url + '/metrics', timeout=REQUEST_TIMEOUT) as response:
+                for line in response.read().decode().splitlines():
+                    if line.startswith('tg_process_resident_bytes'):
+                        return float(line.split()[-1])
+        except (urllib.error.URLError, OSError):
+            pass
+        return None
+
+    def run(self):
+        while not self.stopped.wait(MEMORY_PERIOD):
+            value = self.read()
+            if value is not None:
+                self.samples.append(value)
+
+    def __enter__(self):
+        self.start_bytes = self.read()
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.thread.join()
+        self.end_bytes = self.read()
+
+    def summary(self):
+        values = [v for v in [self.start_bytes, *self.samples, self.end_bytes] if v is not None]
+        if not values:
+            return None
+        return {'start_bytes': self.start_bytes, 'end_bytes': self.end_bytes, 'peak_bytes': max(values),
+                'growth_bytes': (self.end_bytes - self.start_bytes) if None not in (self.start_bytes, self.end_bytes) else None}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(threads, data_dir):
+    # Un worker de gunicorn con la fuente sintética; audios, grabaciones y trabajos van a un directorio temporal
+    port = free_port()
+    env = dict(os.environ, AUDIO_SOURCE='synthetic', LIVE_STREAMING='0',
+               AUDIO_STORE_DIR=os.path.join(data_dir, 'audios'), RECORDINGS_DIR=os.path.join(data_dir, 'grabaciones'),
+               ANALYSIS_JOBS_DIR=os.path.join(data_dir, 'trabajos'), ANALYSIS_CACHE_DIR=os.path.join(data_dir, 'cache'))
+    if threads is not None:
+        env['GUNICORN_THREADS'] = str(threads)
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn', '--workers', '1',
+                                '--bind', f'127.0.0.1:{port}', 'app:server'],
+                               cwd=os.path.dirname(os.path.abspath(__file__)), env=env)
+    url = f'http://127.0.0.1:{port}'
+    start = time.time()
+    while time.time() - start < SERVER_START_TIMEOUT:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with code {process.returncode}")
+        try:
+            urllib.request.urlopen(url + '/', timeout=5).close()
+            return process, url
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError("gunicorn did not start in time")
+
+
+def run_level(url, callbacks, concurrency, duration, scenario, unique_audio, server_pid):
+    recorder = Recorder()
+    deadline = time.time() + duration
+    users = [threading.Thread(target=run_user, args=(url, callbacks, recorder, scenario, deadline, unique_audio, i))
+             for i in range(concurrency)]
+    with MemorySampler(url, server_pid) as memory:
+        start = time.perf_counter()
+        for user in users:
+            user.start()
+        for user in users:
+            user.join()
+        # Los escenarios en curso al vencer el plazo terminan, así que el tiempo real puede ser mayor
+        elapsed = time.perf_counter() - start
+    return {'concurrency': concurrency, 'elapsed_seconds': elapsed,
+            'requests': recorder.summary(elapsed), 'memory': memory.summary()}
+
+
+def print_level(level):
+    print(f"\nConcurrencia {level['concurrency']} ({level['elapsed_seconds']:.0f} s):")
+    for name, stats in level['requests'].items():
+        latencies = '  '.join(f"{q} {stats[q] * 1000:8.1f} ms" if stats[q] is not None else f"{q}        -   "
+                              for q in ('p50', 'p95', 'p99'))
+        print(f"  {name:<20} {stats['throughput']:7.2f}/s  {latencies}  errores {stats['error_rate'] * 100:5.1f} %")
+    memory = level['memory']
+    if memory is not None:
+        growth = f"{memory['growth_bytes'] / 2 ** 20:+.1f} MB" if memory['growth_bytes'] is not None else '-'
+        print(f"  memoria: pico {memory['peak_bytes'] / 2 ** 20:.1f} MB, variación {growth}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prueba de carga con sesiones concurrentes.")
+    parser.add_argument('--url', help="Servidor ya en marcha (con AUDIO_SOURCE=synthetic y LIVE_STREAMING=0)")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=DEFAULT_CONCURRENCY, help="Usuarios simultáneos por nivel")
+    parser.add_argument('--duration', type=float, default=DEFAULT_DURATION, help="Segundos por nivel")
+    parser.add_argument('--scenario', choices=('upload', 'live', 'mixed'), default='mixed')
+    parser.add_argument('--threads', type=int, help="Hilos del worker de gunicorn (sin --url; por defecto los de gunicorn.conf.py)")
+    parser.add_argument('--repeat-audio', action='store_true', help="Subir siempre el mismo .wav (mide la caché)")
+    parser.add_argument('--output', default=RESULTS_DIR, help="Directorio de resultados")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        process = None
+        url = args.url
+        if url is None:
+            process, url = start_server(args.threads, data_dir)
+        try:
+            callbacks = load_callbacks(url)
+            results = {
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'url': url,
+                'scenario': args.scenario,
+                'threads': None if args.url else args.threads,
+                'unique_audio': not args.repeat_audio,
+                'levels': [],
+            }
+            for concurrency in args.concurrency:
+                level = run_level(url, callbacks, concurrency, args.duration, args.scenario,
+                                  not args.repeat_audio, process.pid if process else None)
+                results['levels'].append(level)
+                print_level(level)
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+
+    os.makedirs(args.output, exist_ok=True)
+    results_path = os.path.join(args.output, f"carga-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(results_path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResultados: {results_path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,180 @@
+# Estado de grabación por sesión, en lugar de variables globales del proceso
+import os
+import re
+import threading
+import time
+import uuid
+import wave
+
+import numpy as np
+import plotly.graph_objs as go
+
+from tiempo_real import RingBuffer, IncrementalSpectrogram, IncrementalPitchTracker
+
+SESSION_COOKIE = 'tg_session'
+SESSION_IDLE_TIMEOUT = int(os.environ.get('SESSION_IDLE_TIMEOUT', 15 * 60))  # Segundos sin actividad antes de expulsar
+MAX_SESSIONS = int(os.environ.get('MAX_SESSIONS', 100))
+RECORDINGS_DIR = os.environ.get('RECORDINGS_DIR', 'grabaciones')
+LIVE_PITCH_SECONDS = 10  # Historial del pitch y la intensidad en vivo
+
+
+def new_session_id():
+    return uuid.uuid4().hex
+
+
+def is_valid_session_id(session_id):
+    # El id se usa en nombres de archivo: sólo se aceptan los generados por new_session_id
+    return session_id is not None and re.fullmatch(r'[0-9a-f]{32}', session_id) is not None
+
+
+class RecordingWriter:
+    """
+    Escribe una grabación en un .wav a medida que llegan los bloques, sin guardarla en memoria.
+    Mientras se graba el archivo se llama path + '.part'; close completa la cabecera y lo renombra
+    a path, así nunca se lee una grabación a medias. Las muestras que superan max_samples se descartan.
+    """
+
+    def __init__(self, path, rate, max_samples, channels=1, sample_width=2):
+        self.path = path
+        self.max_bytes = max_samples * channels * sample_width
+        self.written = 0
+        self.wave_file = wave.open(path + '.part', 'wb')
+        self.wave_file.setnchannels(channels)
+        self.wave_file.setsampwidth(sample_width)
+        self.wave_file.setframerate(rate)
+
+    def write(self, data):
+        data = data[:self.max_bytes - self.written]
+        if data:
+            self.wave_file.writeframes(data)
+            self.written += len(data)
+
+    def close(self):
+        # Cerrar el archivo actualiza el tamaño de los datos en la cabecera
+        self.wave_file.close()
+        os.replace(self.path + '.part', self.path)
+
+    def abort(self):
+        self.wave_file.close()
+        os.remove(self.path + '.part')
+
+
+class RecordingSession:
+    """
+    Estado de la grabación en vivo de un usuario: fuente de audio, archivo de la grabación,
+    ventana de datos para las gráficas en vivo y últimas figuras.
+    """
+
+    def __init__(self, session_id, max_samples, live_samples, rate):
+        self.session_id = session_id
+        self.rate = rate
+        self.lock = threading.Lock()
+        # Las lecturas de la fuente pueden esperar datos: tienen su propio lock para no bloquear self.lock
+        self.read_lock = threading.Lock()
+        self.source = None  # Fuente de audio (ver fuentes_audio.py)
+        self.is_recording = False
+        self.live_error = None  # Error de la fuente que terminó la grabación en vivo
+        self.max_samples = max_samples  # Duración máxima de la grabación
+        self.recording = None  # RecordingWriter de la grabación en curso
+        # Ventana de las gráficas en vivo: buffer circular de muestras y espectrograma incremental
+        self.live_buffer = RingBuffer(live_samples, dtype=np.int16)
+        self.live_spectrogram = IncrementalSpectrogram(rate, live_samples / rate)
+        self.live_pitch = IncrementalPitchTracker(rate, LIVE_PITCH_SECONDS)
+        self.last_oscillogram_fig = go.Figure()
+        self.last_spectrogram_fig = go.Figure()
+        self.last_pitch_fig = go.Figure()
+        self.real_time_analize = False
+        self.audio_id = None  # Último audio subido o grabado (id en almacen_audio)
+        self.tick_monitor = None  # Medición de los ticks del intervalo en vivo (ver metricas.TickMonitor)
+        self.last_seen = time.time()
+
+    @property
+    def output_path(self):
+        # Cada sesión guarda su grabación en su propio archivo
+        return os.path.abspath(os.path.join(RECORDINGS_DIR, f"{self.session_id}.wav"))
+
+    def start_recording_file(self, sample_width):
+        # Empezar una grabación nueva en el archivo de la sesión, borrando la anterior
+        self.discard_recording()
+        if os.path.exists(self.output_path):
+            os.remove(self.output_path)
+        self.recording = RecordingWriter(self.output_path, self.rate, self.max_samples, sample_width=sample_width)
+
+    def finish_recording(self):
+        # Completar el .wav de la grabación en curso; sin grabación en curso no hace nada
+        if self.recording is not None:
+            self.recording.close()
+            self.recording = None
+
+    def discard_recording(self):
+        if self.recording is not None:
+            self.recording.abort()
+            self.recording = None
+
+    def reset_buffers(self):
+        self.live_buffer.clear()
+        self.live_spectrogram.clear()
+        self.live_pitch.clear()
+
+    def close_source(self):
+        # Detener y cerrar la fuente de audio
+        if self.source is not None:
+            try:
+                self.source.close()
+            except Exception as e:
+                print(f"Error stopping recording: {e}")
+        self.source = None
+        self.is_recording = False
+        self.finish_recording()
+
+    def close(self):
+        # Liberar el audio y borrar la grabación de la sesión
+        self.discard_recording()
+        self.close_source()
+        self.reset_buffers()
+        if os.path.exists(self.output_path):
+            os.remove(self.output_path)
+
+
+class SessionManager:
+    """
+    Sesiones de grabación indexadas por id, con expulsión de las sesiones inactivas.
+    """
+
+    def __init__(self, max_samples, live_samples, rate, idle_timeout=SESSION_IDLE_TIMEOUT, max_sessions=MAX_SESSIONS):
+        self.max_samples = max_samples
+        self.live_samples = live_samples
+        self.rate = rate
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self._sessions = {}
+        self._lock = threading.Lock()
+        os.makedirs(RECORDINGS_DIR, exist_ok=True)
+
+    def get(self, session_id):
+        with self._lock:
+            expired = self._evict_idle()
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = RecordingSession(session_id, self.max_samples, self.live_samples, self.rate)
+                self._sessions[session_id] = session
+                # Si se supera el máximo se expulsa la sesión con más tiempo inactiva
+                if len(self._sessions) > self.max_sessions:
+                    oldest = min(self._sessions.values(), key=lambda s: s.last_seen)
+                    expired.append(self._sessions.pop(oldest.session_id))
+            session.last_seen = time.time()
+
+        for old_session in expired:
+            with old_session.lock:
+                old_session.close()
+        return session
+
+    def _evict_idle(self):
+        now = time.time()
+        expired = [s for s in self._sessions.values() if now - s.last_seen > self.idle_timeout]
+        for session in expired:
+            del self._sessions[session.session_id]
+        return expired
+
+    def __len__(self):
+        return len(self._sessions)
@@ -0,0 +1,92 @@
+// AudioWorklet que convierte el micrófono a PCM de 16 bits y lo entrega en bloques de tamaño fijo.
+// Está fuera de assets/ porque Dash carga esos archivos como scripts normales de la página.
+// Frecuencia de corte del filtro anti-aliasing, como fracción de la frecuencia de salida
+const LOW_PASS_CUTOFF = 0.45;
+// Biquads paso bajo en cascada (cada uno de 2º orden)
+const LOW_PASS_STAGES = 2;
+
+// Coeficientes de un biquad paso bajo de Butterworth (Q = 1/√2), normalizados por a0
+function lowPassCoefficients(cutoff, rate) {
+    let w0 = 2 * Math.PI * cutoff / rate;
+    let cos = Math.cos(w0);
+    let alpha = Math.sin(w0) * Math.SQRT1_2;
+    let a0 = 1 + alpha;
+    return {
+        b0: (1 - cos) / 2 / a0,
+        b1: (1 - cos) / a0,
+        b2: (1 - cos) / 2 / a0,
+        a1: -2 * cos / a0,
+        a2: (1 - alpha) / a0,
+    };
+}
+
+class PcmCaptureProcessor extends AudioWorkletProcessor {
+    constructor(options) {
+        super();
+        let processorOptions = options.processorOptions || {};
+        this.targetRate = processorOptions.targetRate || sampleRate;
+        this.chunkSize = processorOptions.chunkSize || 3200;
+        this.ratio = sampleRate / this.targetRate;
+        this.position = 0; // Posición de la próxima muestra de salida, en muestras de entrada
+        this.buffer = new Int16Array(this.chunkSize);
+        this.filled = 0;
+        // Al reducir la frecuencia, filtrar antes de interpolar para no plegar lo que
+        // queda por encima de la nueva frecuencia de Nyquist. El estado pasa de un bloque al siguiente
+        this.filter = this.ratio > 1 ? lowPassCoefficients(LOW_PASS_CUTOFF * this.targetRate, sampleRate) : null;
+        this.stages = [];
+        for (let i = 0; i < LOW_PASS_STAGES; i++) {
+            this.stages.push({ x1: 0, x2: 0, y1: 0, y2: 0 });
+        }
+        this.filtered = new Float32Array(128);
+    }
+
+    lowPass(channel) {
+        if (this.filtered.length < channel.length) {
+            this.filtered = new Float32Array(channel.length);
+        }
+        let f = this.filter;
+        let output = this.filtered.subarray(0, channel.length);
+        output.set(channel);
+        for (let state of this.stages) {
+            for (let i = 0; i < output.length; i++) {
+                let x = output[i];
+                let y = f.b0 * x + f.b1 * state.x1 + f.b2 * state.x2 - f.a1 * state.y1 - f.a2 * state.y2;
+                state.x2 = state.x1;
+                state.x1 = x;
+                state.y2 = state.y1;
+                state.y1 = y;
+                output[i] = y;
+            }
+        }
+        return output;
+    }
+
+    process(inputs) {
+        let input = inputs[0];
+        if (!input || input.length === 0) {
+            return true;
+        }
+        let channel = this.filter ? this.lowPass(input[0]) : input[0];
+
+        // Remuestrear (interpolación lineal) si el contexto no corre a la frecuencia pedida
+        while (this.position < channel.length) {
+            let index = Math.floor(this.position);
+            let fraction = this.position - index;
+            let next = index + 1 < channel.length ? channel[index + 1] : channel[index];
+            let value = channel[index] + (next - channel[index]) * fraction;
+            value = Math.max(-1, Math.min(1, value));
+            this.buffer[this.filled++] = value < 0 ? value * 0x8000 : value * 0x7fff;
+
+            if (this.filled === this.chunkSize) {
+                this.port.postMessage(this.buffer.buffer, [this.buffer.buffer]);
+                this.buffer = new Int16Array(this.chunkSize);
+                this.filled = 0;
+            }
+            this.position += this.ratio;
+        }
+        this.position -= channel.length;
+        return true;
+    }
+}
+
+registerProcessor("pcm-capture", PcmCaptureProcessor);
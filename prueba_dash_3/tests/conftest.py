@@ -0,0 +1,15 @@
+# Configuración común de las pruebas (python -m pytest desde prueba_dash_3/)
+import os
+import sys
+import tempfile
+
+# Los módulos de la aplicación están en prueba_dash_3/, junto a esta carpeta
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Audios, grabaciones, trabajos y caché en un directorio temporal: app.py y sesiones.py los leen al importarse
+DATA_DIR = tempfile.mkdtemp(prefix='tg-pruebas-')
+os.environ.setdefault('AUDIO_STORE_DIR', os.path.join(DATA_DIR, 'audios'))
+os.environ.setdefault('RECORDINGS_DIR', os.path.join(DATA_DIR, 'grabaciones'))
+os.environ.setdefault('ANALYSIS_JOBS_DIR', os.path.join(DATA_DIR, 'trabajos'))
+os.environ.setdefault('ANALYSIS_CACHE_DIR', os.path.join(DATA_DIR, 'cache'))
+os.environ.setdefault('AUDIO_SOURCE', 'synthetic')
@@ -0,0 +1,51 @@
+# El almacén de audios expulsa los menos usados cuando supera su presupuesto de disco
+import io
+import os
+import time
+
+import pytest
+
+import almacen_audio
+from almacen_audio import store_stream, store_file, touch_audio, audio_path
+
+AUDIO_BYTES = 1000
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(almacen_audio, 'AUDIO_STORE_DIR', str(tmp_path))
+    monkeypatch.setattr(almacen_audio, 'AUDIO_STORE_MAX_BYTES', 2 * AUDIO_BYTES)
+    return tmp_path
+
+
+def store_audio(n):
+    audio_id = store_stream(io.BytesIO(bytes([n]) * AUDIO_BYTES))
+    # Separar los tiempos de uso aunque el sistema de archivos tenga poca resolución
+    os.utime(audio_path(audio_id), (time.time() + n, time.time() + n))
+    return audio_id
+
+
+def test_evicts_least_recently_used(store):
+    first, second = store_audio(1), store_audio(2)
+    os.utime(audio_path(first), (time.time() + 10, time.time() + 10))
+    third = store_audio(3)
+
+    assert os.path.exists(audio_path(first))
+    assert not os.path.exists(audio_path(second))
+    assert os.path.exists(audio_path(third))
+
+
+def test_keeps_new_audio_larger_than_budget(store):
+    old = store_audio(1)
+    path = store / 'big.wav.tmp'
+    path.write_bytes(b'x' * 3 * AUDIO_BYTES)
+    big = store_file(str(path), move=True)
+
+    assert os.path.exists(audio_path(big))
+    assert not os.path.exists(audio_path(old))
+
+
+def test_touch_missing_audio_is_ignored(store):
+    audio_id = store_audio(1)
+    os.remove(audio_path(audio_id))
+    touch_audio(audio_id)
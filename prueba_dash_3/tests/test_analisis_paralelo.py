@@ -0,0 +1,45 @@
+# El motor paralelo debe dar exactamente el mismo resultado que el análisis en serie
+import numpy as np
+import parselmouth
+import pytest
+
+import graficas
+from analisis_paralelo import ParallelAnalysisEngine
+from analisis_por_bloques import analyze_audio_in_blocks
+from benchmark_analisis import write_fixture, COMPARED_FIELDS
+
+FIXTURE_SECONDS = 2
+BLOCK_SECONDS = 0.5  # Bloques cortos para que el archivo de prueba se divida en varios
+
+
+@pytest.fixture(scope='module')
+def fixture_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('audio') / 'vocal.wav')
+    write_fixture(path, FIXTURE_SECONDS, 16000)
+    return path
+
+
+@pytest.fixture(scope='module')
+def engine():
+    engine = ParallelAnalysisEngine(max_workers=2)
+    yield engine
+    engine.shutdown()
+
+
+def assert_identical(serial, parallel):
+    for name in COMPARED_FIELDS + ('samples',):
+        np.testing.assert_array_equal(getattr(serial, name), getattr(parallel, name), err_msg=name)
+    assert serial.mean_pitch == parallel.mean_pitch
+
+
+def test_pass_split_matches_serial(fixture_path, engine):
+    serial = graficas.AudioAnalysis(parselmouth.Sound(fixture_path))
+    parallel = engine.analyze_passes(fixture_path)
+    assert_identical(serial, parallel)
+
+
+def test_block_split_matches_serial(fixture_path, engine):
+    serial = analyze_audio_in_blocks(fixture_path, block_seconds=BLOCK_SECONDS)
+    parallel = engine.analyze_blocks(fixture_path, block_seconds=BLOCK_SECONDS)
+    assert len(serial.pitch_times) > 0
+    assert_identical(serial, parallel)
@@ -0,0 +1,47 @@
+# Caché de análisis: objetos vivos en memoria, presupuesto por bytes de arreglos y disco compartido
+import numpy as np
+
+from cache_analisis import AnalysisCache, entry_nbytes
+
+ENTRY_BYTES = 8000
+
+
+def entry(value):
+    return {'analysis': np.full(ENTRY_BYTES // 8, value, dtype=np.float64), 'mean_pitch': float(value)}
+
+
+def test_memory_hits_return_the_same_object():
+    cache = AnalysisCache(max_memory_bytes=10 * ENTRY_BYTES, cache_dir=None)
+    stored = entry(1)
+    cache.put('a', stored)
+    assert cache.get('a') is stored
+    assert cache.stats()['memory_bytes'] == ENTRY_BYTES
+
+
+def test_budget_counts_array_bytes():
+    cache = AnalysisCache(max_memory_bytes=2 * ENTRY_BYTES, cache_dir=None)
+    for key in 'abc':
+        cache.put(key, entry(1))
+    assert cache.get('a') is None
+    assert cache.get('c') is not None
+    assert cache.stats()['evictions'] == 1
+
+
+def test_other_process_loads_from_disk(tmp_path):
+    writer = AnalysisCache(cache_dir=str(tmp_path))
+    writer.put('a', entry(3))
+    # Otro worker con la memoria vacía encuentra la entrada en el disco compartido
+    reader = AnalysisCache(cache_dir=str(tmp_path))
+    np.testing.assert_array_equal(reader.get('a')['analysis'], entry(3)['analysis'])
+
+
+def test_memmaps_do_not_count(tmp_path):
+    path = tmp_path / 'samples.bin'
+    np.zeros(1000, dtype=np.int16).tofile(path)
+    samples = np.memmap(path, dtype=np.int16, mode='r')
+    assert entry_nbytes({'samples': samples[:500], 'values': [np.zeros(10)]}) == 80
+
+
+def test_shared_arrays_count_once():
+    values = np.zeros(100)
+    assert entry_nbytes({'values': values, 'levels': [(None, values), (None, values[::2].copy())]}) == 1200
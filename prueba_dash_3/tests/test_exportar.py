@@ -0,0 +1,48 @@
+# Formatos de texto de la exportación: contenido de las filas y precisión de los tiempos
+import csv
+import io
+import json
+import types
+
+import numpy as np
+
+from exportar import iter_export
+
+N_FRAMES = 5
+
+
+def analysis(start=0.0):
+    times = start + np.arange(N_FRAMES) * 0.00625
+    formants = np.full((N_FRAMES, 3), 1000.0)
+    formants[1, 2] = np.nan
+    return types.SimpleNamespace(pitch_times=times, pitch_values=np.full(N_FRAMES, 120.0),
+                                 intensity_times=times, intensity_values=np.full(N_FRAMES, 60.0),
+                                 formant_times=times, formant_values=formants, formant_bandwidths=formants / 10)
+
+
+def export(data, fmt):
+    return b''.join(iter_export(data, fmt)).decode()
+
+
+def test_csv_rows():
+    rows = list(csv.reader(io.StringIO(export(analysis(), 'csv'))))
+    assert rows[0] == ['series', 'time', 'value']
+    assert rows[1] == ['pitch', '0.0000', '120.00']
+    assert ['F3', '0.0063', 'nan'] in rows
+    # pitch, intensity y F1..F3 con B1..B3
+    assert len(rows) == 1 + 8 * N_FRAMES
+
+
+def test_txt_sections():
+    text = export(analysis(), 'txt')
+    assert text.startswith("Pitch Data (Frequency vs Time):\nTime [s]\tFrequency [Hz]\n0.0000\t120.00\n")
+    assert text.count('Formant Frequency [Hz]') == 3
+
+
+def test_json_keeps_time_resolution_in_long_audio():
+    data = analysis(start=3600.0)
+    exported = json.loads(export(data, 'json'))
+    times = np.array(exported['formants']['time'])
+    np.testing.assert_allclose(times, data.formant_times, atol=1e-6, rtol=0)
+    assert len(np.unique(times)) == N_FRAMES
+    assert exported['formants']['F3'][1] is None
@@ -0,0 +1,192 @@
+# Fuentes de audio sintéticas y del navegador a través de read_live_chunk, sin micrófono ni SocketIO
+import threading
+import time
+import wave
+
+import numpy as np
+import pytest
+
+import app
+import fuentes_audio
+from fuentes_audio import BrowserSource, SyntheticSource, NoAudioData, SAMPLE_WIDTH, synthetic_vowel
+from sesiones import RecordingSession, new_session_id
+
+
+def pcm_block(start, n_samples=app.CHUNK):
+    samples = synthetic_vowel(start, n_samples, app.RATE, 120.0, (700.0, 1200.0, 2600.0))
+    return (samples * 32767).astype('<i2').tobytes()
+
+
+def recording_session(source):
+    session = RecordingSession(new_session_id(), max_samples=60 * app.RATE,
+                               live_samples=app.buffersize * app.CHUNK, rate=app.RATE)
+    session.source = source
+    session.start_recording_file(SAMPLE_WIDTH)
+    session.is_recording = True
+    return session
+
+
+@pytest.fixture
+def short_timeout(monkeypatch):
+    monkeypatch.setattr(fuentes_audio, 'READ_TIMEOUT', 0.05)
+
+
+def test_browser_source_joins_pushed_pieces():
+    source = BrowserSource()
+    data = pcm_block(0)
+    # El worklet puede enviar bloques de otro tamaño que CHUNK
+    source.push(data[:1000])
+    source.push(data[1000:])
+    assert source.read(app.CHUNK) == data
+
+
+def test_browser_source_timeout_keeps_pending_data(short_timeout):
+    source = BrowserSource()
+    data = pcm_block(0)
+    source.push(data[:1000])
+    with pytest.raises(NoAudioData):
+        source.read(app.CHUNK)
+    source.push(data[1000:])
+    assert source.read(app.CHUNK) == data
+
+
+def test_browser_source_close_ends_read():
+    source = BrowserSource()
+    source.close()
+    with pytest.raises(IOError):
+        source.read(app.CHUNK)
+
+
+def test_read_live_chunk_with_browser_source():
+    session = recording_session(BrowserSource())
+    data = pcm_block(0)
+    session.source.push(data)
+
+    np_data, column_times, columns, (pitch_times, pitch_values, intensity_values) = app.read_live_chunk(session)
+
+    np.testing.assert_array_equal(np_data, np.frombuffer(data, dtype=np.int16))
+    assert session.live_buffer.total == app.CHUNK
+    assert len(column_times) == len(columns) > 0
+    assert len(pitch_times) == len(pitch_values) == len(intensity_values) > 0
+    # El bloque también se escribe en la grabación
+    assert session.recording.written == len(data)
+    session.close()
+
+
+def test_read_live_chunk_survives_a_stall(short_timeout):
+    session = recording_session(BrowserSource())
+    with pytest.raises(NoAudioData):
+        app.read_live_chunk(session)
+    # Un corte de red no termina la grabación
+    assert session.is_recording
+    assert session.live_error is None
+
+    session.source.push(pcm_block(0))
+    assert app.read_live_chunk(session) is not None
+    session.close()
+
+
+def test_stop_finishes_recording_without_error():
+    session = recording_session(BrowserSource())
+    session.source.push(pcm_block(0))
+    app.read_live_chunk(session)
+    session.source.close()
+
+    assert app.read_live_chunk(session) is None
+    assert not session.is_recording
+    assert session.live_error is None
+    with wave.open(session.output_path) as f:
+        assert f.getnframes() == app.CHUNK
+    session.close()
+
+
+def test_read_live_chunk_with_synthetic_source():
+    session = recording_session(SyntheticSource(app.RATE, realtime=False))
+    n_ticks = 10
+    for _ in range(n_ticks):
+        assert app.read_live_chunk(session) is not None
+    session.close_source()
+
+    # Al detener, el .wav está completo y se puede leer de inmediato
+    with wave.open(session.output_path) as f:
+        assert f.getframerate() == app.RATE
+        assert f.getnframes() == n_ticks * app.CHUNK
+        samples = np.frombuffer(f.readframes(f.getnframes()), dtype='<i2')
+    np.testing.assert_array_equal(samples, np.frombuffer(pcm_block(0, n_ticks * app.CHUNK), dtype='<i2'))
+    session.close()
+
+
+def test_stream_continues_after_a_stall(monkeypatch, short_timeout):
+    frames = []
+    monkeypatch.setattr(app.socketio, 'emit', lambda event, data, to=None: frames.append((event, data)))
+    session = recording_session(BrowserSource())
+    task = threading.Thread(target=app.stream_live_audio, args=(session,))
+    task.start()
+
+    session.source.push(pcm_block(0))
+    time.sleep(0.3)  # Varias veces READ_TIMEOUT sin datos
+    session.source.push(pcm_block(app.CHUNK))
+    deadline = time.time() + 5
+    while len(frames) < 2 and time.time() < deadline:
+        time.sleep(0.01)
+    session.source.close()
+    task.join(timeout=5)
+
+    assert not task.is_alive()
+    assert [event for event, _ in frames] == ['live-frame', 'live-frame']
+    session.close()
+
+
+def test_stream_reports_source_errors(monkeypatch):
+    class FailingSource(SyntheticSource):
+        def read(self, n_samples):
+            raise IOError("device unplugged")
+
+    events = []
+    monkeypatch.setattr(app.socketio, 'emit', lambda event, data, to=None: events.append((event, data)))
+    session = recording_session(FailingSource(app.RATE, realtime=False))
+    app.stream_live_audio(session)
+
+    assert not session.is_recording
+    assert events == [('live-stopped', {'error': 'device unplugged'})]
+    session.close()
+
+
+def test_read_does_not_hold_the_session_lock(monkeypatch):
+    monkeypatch.setattr(fuentes_audio, 'READ_TIMEOUT', 1.0)
+    session = recording_session(BrowserSource())
+    reader = threading.Thread(target=app.read_live_chunk, args=(session,))
+    reader.start()
+    time.sleep(0.1)
+    # Mientras la lectura espera al navegador, los demás callbacks de la sesión pueden tomar el lock
+    assert session.lock.acquire(timeout=0.1)
+    session.lock.release()
+    session.source.push(pcm_block(0))
+    reader.join()
+    assert session.live_buffer.total == app.CHUNK
+    session.close()
+
+
+def test_stream_stops_after_a_long_stall(monkeypatch, short_timeout):
+    events = []
+    monkeypatch.setattr(app, 'MAX_STALL_SECONDS', 0.2)
+    monkeypatch.setattr(app.socketio, 'emit', lambda event, data, to=None: events.append((event, data)))
+    session = recording_session(BrowserSource())
+    app.stream_live_audio(session)
+
+    assert not session.is_recording
+    assert [event for event, _ in events] == ['live-stopped']
+    session.close()
+
+
+def test_disconnect_stops_the_recording():
+    session = app.sessions.get(new_session_id())
+    session.source = BrowserSource()
+    session.start_recording_file(SAMPLE_WIDTH)
+    session.is_recording = True
+    with app.server.test_request_context(headers={'Cookie': f'{app.SESSION_COOKIE}={session.session_id}'}):
+        app.stop_recording_on_disconnect()
+
+    assert not session.is_recording
+    assert session.source is None
+    session.close()
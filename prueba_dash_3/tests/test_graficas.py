@@ -0,0 +1,46 @@
+# Al hacer zoom en el espectrograma solo se envía el tramo visible de las curvas
+import numpy as np
+import parselmouth
+import pytest
+
+import graficas
+from benchmark_analisis import write_fixture
+
+X_RANGE = (0.5, 1.0)
+
+
+@pytest.fixture(scope='module')
+def analysis(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('audio') / 'vocal.wav')
+    write_fixture(path, 2, 16000)
+    return graficas.AudioAnalysis(parselmouth.Sound(path))
+
+
+def trace_times(figure, name):
+    return np.asarray(next(trace for trace in figure.data if trace.name == name).x)
+
+
+def test_zoom_slices_pitch_and_formants(analysis):
+    full = graficas.draw_spectrogram(analysis)
+    zoomed = graficas.draw_spectrogram(analysis, X_RANGE)
+
+    for name in ("Fundamental Frequency", "Formant 1"):
+        times = trace_times(zoomed, name)
+        assert len(times) < len(trace_times(full, name))
+        # Solo unos pocos frames de margen fuera del rango visible
+        assert (times < X_RANGE[0]).sum() <= graficas.SAVGOL_WINDOW // 2 + 1
+        assert (times > X_RANGE[1]).sum() <= graficas.SAVGOL_WINDOW // 2 + 1
+        assert times[0] <= X_RANGE[0] and times[-1] >= X_RANGE[1]
+
+
+def test_zoomed_pitch_matches_full_smoothing(analysis):
+    def visible_pitch(figure):
+        trace = next(trace for trace in figure.data if trace.name == "Fundamental Frequency")
+        times = np.asarray(trace.x)
+        inside = (times >= X_RANGE[0]) & (times <= X_RANGE[1])
+        return np.asarray(trace.y, dtype=float)[inside]
+
+    np.testing.assert_allclose(
+        visible_pitch(graficas.draw_spectrogram(analysis, X_RANGE)),
+        visible_pitch(graficas.draw_spectrogram(analysis)),
+    )
@@ -0,0 +1,25 @@
+# El perfil de una petición se guarda aunque la petición lance una excepción
+import sys
+
+import pytest
+
+import app
+import metricas
+
+
+def test_profile_is_saved_when_the_request_fails(tmp_path, monkeypatch):
+    monkeypatch.setattr(metricas, 'PROFILE_DIR', str(tmp_path))
+    monkeypatch.setitem(app.server.config, 'PROPAGATE_EXCEPTIONS', True)
+
+    def failing_store(stream):
+        raise RuntimeError('fallo de prueba')
+
+    monkeypatch.setattr(app, 'store_stream', failing_store)
+
+    # Con la excepción propagada no se ejecutan los after_request
+    with pytest.raises(RuntimeError):
+        app.server.test_client().post('/upload?profile=1', data=b'RIFF')
+
+    assert len(list(tmp_path.glob('*upload.prof'))) == 1
+    # El perfilador quedó desactivado
+    assert sys.getprofile() is None
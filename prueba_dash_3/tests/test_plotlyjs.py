@@ -0,0 +1,15 @@
+# Las figuras compactas usan typed arrays ({dtype, bdata}), que plotly.js decodifica desde la 2.28
+import re
+
+import app
+
+TYPED_ARRAYS_PLOTLYJS = (2, 28)
+
+
+def test_served_plotlyjs_decodes_typed_arrays():
+    # Dash sirve el plotly.js del paquete plotly instalado, no uno propio
+    response = app.server.test_client().get('/_dash-component-suites/plotly/package_data/plotly.min.js')
+    assert response.status_code == 200
+    version = re.search(rb'plotly\.js v(\d+)\.(\d+)\.(\d+)', response.data[:200])
+    assert version is not None
+    assert tuple(int(part) for part in version.groups()[:2]) >= TYPED_ARRAYS_PLOTLYJS
@@ -0,0 +1,35 @@
+# Formato binario de los frames en vivo que decodifica assets/script.js
+import numpy as np
+
+from tiempo_real import pack_live_frame
+
+HEADER_BYTES = 7 * 4 + 4
+N_BINS = 5
+
+
+def unpack_header(frame):
+    return np.frombuffer(frame[:7 * 4], dtype='<u4').tolist(), np.frombuffer(frame[7 * 4:HEADER_BYTES], dtype='<f4')[0]
+
+
+def test_frame_without_columns():
+    # Un bloque corto puede no completar ninguna columna del espectrograma
+    frame = pack_live_frame([0.0, 0.1], [0.5, -0.5], [], np.zeros((0, N_BINS)), N_BINS, 10.0, 100, 50, [], [], [], 20)
+
+    header, frequency_step = unpack_header(frame)
+    assert header == [2, 0, N_BINS, 0, 100, 50, 20]
+    assert frequency_step == 10.0
+    assert len(frame) == HEADER_BYTES + 4 * 4
+
+
+def test_frame_layout():
+    columns = np.arange(2 * N_BINS, dtype=np.float32).reshape(2, N_BINS)
+    frame = pack_live_frame([0.0], [0.25], [0.01, 0.02], columns, N_BINS, 10.0, 100, 50,
+                            [0.01], [120.0], [60.0], 20)
+
+    header, _ = unpack_header(frame)
+    assert header == [1, 2, N_BINS, 1, 100, 50, 20]
+    values = np.frombuffer(frame[HEADER_BYTES:], dtype='<f4')
+    np.testing.assert_array_equal(values[:2], [0.0, 0.25])
+    np.testing.assert_allclose(values[2:4], [0.01, 0.02])
+    np.testing.assert_array_equal(values[4:4 + 2 * N_BINS], columns.ravel())
+    np.testing.assert_array_equal(values[4 + 2 * N_BINS:], np.float32([0.01, 120.0, 60.0]))
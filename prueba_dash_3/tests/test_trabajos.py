@@ -0,0 +1,82 @@
+# El estado de los trabajos vive en disco: cualquier worker puede entregar el resultado
+import os
+import time
+
+import pytest
+
+import trabajos
+from almacen_audio import store_file
+from benchmark_analisis import write_fixture
+from graficas import ANALYSIS_PARAMS
+
+JOB_TIMEOUT = 60
+
+
+@pytest.fixture(scope='module')
+def audio_id(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('audio') / 'vocal.wav')
+    write_fixture(path, 1, 16000)
+    return store_file(path)
+
+
+@pytest.fixture
+def jobs_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(trabajos, 'JOBS_DIR', str(tmp_path))
+    monkeypatch.setattr(trabajos, 'jobs', {})
+    return tmp_path
+
+
+def wait_for_job(job_id):
+    deadline = time.time() + JOB_TIMEOUT
+    while time.time() < deadline:
+        status, job = trabajos.job_status(job_id)
+        if status not in ('queued', 'running'):
+            return status, job
+        time.sleep(0.05)
+    pytest.fail("analysis job timed out")
+
+
+def test_job_finishes_in_another_worker(audio_id, monkeypatch):
+    job_id = trabajos.submit_analysis(ANALYSIS_PARAMS, audio_id=audio_id)
+    # Otro worker no tiene el future del trabajo en memoria
+    monkeypatch.setattr(trabajos, 'jobs', {})
+
+    status, job = wait_for_job(job_id)
+    assert status == 'done'
+    assert job['audio_id'] == audio_id
+    assert job['entry']['mean_pitch'] > 0
+    # El resultado se entrega una sola vez
+    assert trabajos.job_status(job_id) == ('unknown', None)
+
+
+def test_unknown_jobs(audio_id):
+    assert trabajos.job_status(None) == ('unknown', None)
+    assert trabajos.job_status('../' + '0' * 29) == ('unknown', None)
+    assert trabajos.job_status('0' * 32) == ('unknown', None)
+
+
+def test_job_of_a_dead_process_is_an_error(jobs_dir):
+    # El trabajo quedó "en curso" en disco, pero el proceso que lo encoló ya no existe
+    job_id = 'a' * 32
+    trabajos._write_job_file(job_id, 'job', {'submitted': time.time(), 'pid': 2 ** 22 + 1, 'pool': 1})
+
+    status, job = trabajos.job_status(job_id)
+    assert status == 'error'
+    assert trabajos.job_status(job_id) == ('unknown', None)
+
+
+def test_job_times_out(jobs_dir, monkeypatch):
+    job_id = 'b' * 32
+    trabajos._write_job_file(job_id, 'job', {'submitted': time.time() - 10, 'pid': os.getpid(), 'pool': trabajos.pool_generation})
+
+    assert trabajos.job_status(job_id)[0] == 'running'
+    monkeypatch.setattr(trabajos, 'JOB_TIMEOUT', 5)
+    assert trabajos.job_status(job_id)[0] == 'error'
+
+
+def test_job_of_a_recreated_pool_is_an_error(jobs_dir, monkeypatch):
+    job_id = 'c' * 32
+    trabajos._write_job_file(job_id, 'job', {'submitted': time.time(), 'pid': os.getpid(), 'pool': trabajos.pool_generation})
+    monkeypatch.setattr(trabajos, 'pool_generation', trabajos.pool_generation + 1)
+
+    assert trabajos.job_status(job_id)[0] == 'error'
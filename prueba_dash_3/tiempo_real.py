@@ -0,0 +1,229 @@
+# Estructuras para el análisis en vivo: ventana circular de audio, espectrograma incremental y seguimiento de pitch
+import numpy as np
+
+
+class RingBuffer:
+    """
+    Buffer circular preasignado. Cada elemento puede ser un escalar o un arreglo de forma item_shape
+    (por ejemplo, una columna del espectrograma).
+    """
+
+    def __init__(self, capacity, item_shape=(), dtype=np.float64):
+        self.capacity = capacity
+        self.data = np.zeros((capacity,) + tuple(item_shape), dtype=dtype)
+        self.write_pos = 0
+        self.size = 0
+        self.total = 0  # Elementos escritos desde el inicio
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=self.data.dtype)
+        n = len(values)
+        if n >= self.capacity:
+            # Sólo caben los últimos elementos
+            values = values[-self.capacity:]
+            self.data[:] = values
+            self.write_pos = 0
+        else:
+            first = min(n, self.capacity - self.write_pos)
+            self.data[self.write_pos:self.write_pos + first] = values[:first]
+            self.data[:n - first] = values[first:]
+            self.write_pos = (self.write_pos + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+        self.total += n
+
+    def view(self):
+        # Elementos en orden cronológico (del más antiguo al más reciente)
+        if self.size < self.capacity:
+            return self.data[:self.size]
+        return np.concatenate((self.data[self.write_pos:], self.data[:self.write_pos]))
+
+    @property
+    def first_index(self):
+        # Índice absoluto del elemento más antiguo guardado
+        return self.total - self.size
+
+    def clear(self):
+        self.write_pos = 0
+        self.size = 0
+        self.total = 0
+
+
+class IncrementalSpectrogram:
+    """
+    Espectrograma de tiempo corto que sólo calcula las columnas nuevas de cada bloque de audio
+    y las agrega a una matriz circular. Usa los mismos valores por defecto que
+    Sound.to_spectrogram de Praat (ventana de 5 ms, paso de 2 ms, 20 Hz y 5000 Hz).
+    """
+
+    def __init__(self, rate, window_seconds, window_length=0.005, time_step=0.002,
+                 frequency_step=20.0, maximum_frequency=5000.0):
+        self.rate = rate
+        # Praat usa una ventana gaussiana de duración física 2 × window_length
+        self.window_samples = int(round(2 * window_length * rate))
+        self.hop = max(int(round(time_step * rate)), 1)
+        self.n_fft = max(int(round(rate / frequency_step)), self.window_samples)
+        self.window = np.hanning(self.window_samples)
+        self.window_power = np.sum(self.window ** 2)
+
+        self.frequency_step = rate / self.n_fft
+        frequencies = np.fft.rfftfreq(self.n_fft, 1 / rate)
+        self.n_bins = int(np.searchsorted(frequencies, maximum_frequency, side='right'))
+        self.frequencies = frequencies[:self.n_bins]
+
+        capacity = max(int(window_seconds * rate / self.hop), 1)
+        self.columns = RingBuffer(capacity, (self.n_bins,))
+        self.pending = np.zeros(0)  # Muestras que aún no completan una ventana
+
+    def update(self, samples):
+        """
+        Procesa un bloque nuevo y devuelve (tiempos, columnas en dB) de las columnas agregadas.
+        """
+        signal = np.concatenate((self.pending, np.asarray(samples, dtype=np.float64)))
+        n_frames = 0 if len(signal) < self.window_samples else (len(signal) - self.window_samples) // self.hop + 1
+
+        if n_frames == 0:
+            self.pending = signal
+            return np.zeros(0), np.zeros((0, self.n_bins))
+
+        frames = np.lib.stride_tricks.sliding_window_view(signal, self.window_samples)[:n_frames * self.hop:self.hop]
+        spectrum = np.fft.rfft(frames * self.window, n=self.n_fft, axis=1)[:, :self.n_bins]
+        power = (np.abs(spectrum) ** 2) / (self.window_power * self.rate)
+        columns_db = 10 * np.log10(power + 1e-12)
+
+        first_column = self.columns.total
+        self.columns.extend(columns_db)
+        self.pending = signal[n_frames * self.hop:]
+
+        return self.column_times(first_column, first_column + n_frames), columns_db
+
+    def column_times(self, start, stop):
+        # Tiempo (centro de la ventana) de las columnas con índices absolutos [start, stop)
+        return (np.arange(start, stop) * self.hop + self.window_samples / 2) / self.rate
+
+    def matrix(self):
+        # (tiempos, matriz frecuencia × tiempo en dB) de la ventana actual
+        first = self.columns.first_index
+        return self.column_times(first, self.columns.total), self.columns.view().T
+
+    def clear(self):
+        self.columns.clear()
+        self.pending = np.zeros(0)
+
+
+class IncrementalPitchTracker:
+    """
+    Seguimiento en vivo de la frecuencia fundamental (autocorrelación normalizada por la de la ventana,
+    el método de Sound.to_pitch de Praat) y de la intensidad. Cada bloque se procesa junto con las
+    muestras pendientes del anterior, que dan el contexto de la primera ventana, y sólo se calculan
+    los frames nuevos; el historial reciente queda en buffers circulares.
+    """
+
+    def __init__(self, rate, window_seconds, time_step=0.01, pitch_floor=75.0, pitch_ceiling=600.0,
+                 voicing_threshold=0.45, silence_threshold=0.03, octave_cost=0.01, scale=1 / 32768):
+        self.rate = rate
+        self.scale = scale  # Muestras PCM de 16 bits a amplitud [-1, 1]
+        self.voicing_threshold = voicing_threshold
+        self.silence_threshold = silence_threshold
+        # Como en Praat: la ventana cubre tres periodos del pitch mínimo
+        self.window_samples = int(round(3 * rate / pitch_floor))
+        self.hop = max(int(round(time_step * rate)), 1)
+        self.n_fft = 1 << int(np.ceil(np.log2(2 * self.window_samples)))
+        self.window = np.hanning(self.window_samples)
+
+        # Autocorrelación de la ventana, para corregir la atenuación que ésta produce en cada lag
+        window_autocorrelation = np.fft.irfft(np.abs(np.fft.rfft(self.window, self.n_fft)) ** 2, self.n_fft)
+        self.window_autocorrelation = window_autocorrelation[:self.window_samples] / window_autocorrelation[0]
+
+        max_lag = min(int(np.ceil(rate / pitch_floor)), self.window_samples // 2)
+        self.lags = np.arange(max(int(rate / pitch_ceiling), 2), max_lag + 1)
+        # Costo de octava de Praat: favorece levemente los lags cortos (frecuencias altas)
+        self.lag_penalty = octave_cost * np.log2(pitch_floor * self.lags / rate)
+
+        capacity = max(int(window_seconds * rate / self.hop), 1)
+        self.pitch = RingBuffer(capacity)
+        self.intensity = RingBuffer(capacity)
+        self.peak = 0.0  # Amplitud máxima de la grabación, referencia del umbral de silencio
+        self.pending = np.zeros(0)
+
+    def update(self, samples):
+        """
+        Procesa un bloque nuevo y devuelve (tiempos, F0 en Hz, intensidad en dB) de los frames
+        agregados. Los frames no sonoros tienen F0 = 0, como pitch.selected_array de Parselmouth.
+        """
+        signal = np.concatenate((self.pending, np.asarray(samples, dtype=np.float64) * self.scale))
+        n_frames = 0 if len(signal) < self.window_samples else (len(signal) - self.window_samples) // self.hop + 1
+
+        if n_frames == 0:
+            self.pending = signal
+            return np.zeros(0), np.zeros(0), np.zeros(0)
+
+        frames = np.lib.stride_tricks.sliding_window_view(signal, self.window_samples)[:n_frames * self.hop:self.hop]
+        frames = frames - frames.mean(axis=1, keepdims=True)
+        amplitude = np.max(np.abs(frames), axis=1)
+        self.peak = max(self.peak, float(np.max(amplitude)))
+
+        # Intensidad en dB respecto de 2e-5 Pa (la referencia de Praat), con la misma ventana
+        weighted = frames * self.window
+        mean_square = np.sum(weighted * frames, axis=1) / np.sum(self.window)
+        intensity = 10 * np.log10(np.maximum(mean_square, 1e-20) / 4e-10)
+
+        # Autocorrelación de todos los frames a la vez, normalizada por la energía y por la de la ventana
+        spectrum = np.fft.rfft(weighted, n=self.n_fft, axis=1)
+        autocorrelation = np.fft.irfft(np.abs(spectrum) ** 2, n=self.n_fft, axis=1)[:, :self.window_samples]
+        normalized = autocorrelation / np.maximum(autocorrelation[:, :1], 1e-20) / self.window_autocorrelation
+
+        best = self.lags[np.argmax(normalized[:, self.lags] - self.lag_penalty, axis=1)]
+        rows = np.arange(n_frames)
+        left, center, right = normalized[rows, best - 1], normalized[rows, best], normalized[rows, best + 1]
+        # Interpolación parabólica del máximo para una resolución menor que una muestra
+        curvature = left - 2 * center + right
+        shift = np.clip(np.divide(0.5 * (left - right), curvature, out=np.zeros(n_frames), where=curvature < 0), -0.5, 0.5)
+        voiced = (center >= self.voicing_threshold) & (amplitude >= self.silence_threshold * self.peak)
+        pitch = np.where(voiced, self.rate / (best + shift), 0.0)
+
+        first_frame = self.pitch.total
+        self.pitch.extend(pitch)
+        self.intensity.extend(intensity)
+        self.pending = signal[n_frames * self.hop:]
+
+        return self.frame_times(first_frame, first_frame + n_frames), pitch, intensity
+
+    def frame_times(self, start, stop):
+        # Tiempo (centro de la ventana) de los frames con índices absolutos [start, stop)
+        return (np.arange(start, stop) * self.hop + self.window_samples / 2) / self.rate
+
+    def history(self):
+        # (tiempos, F0, intensidad) del historial reciente
+        return self.frame_times(self.pitch.first_index, self.pitch.total), self.pitch.view(), self.intensity.view()
+
+    def clear(self):
+        self.pitch.clear()
+        self.intensity.clear()
+        self.peak = 0.0
+        self.pending = np.zeros(0)
+
+
+def pack_live_frame(wave_times, wave_values, column_times, columns, n_bins, frequency_step, max_wave_points,
+                    max_columns, pitch_times, pitch_values, intensity_values, max_pitch_points):
+    """
+    Serializa los datos nuevos de un bloque en un mensaje binario compacto (little-endian):
+    cabecera de 7 uint32 (n_wave, n_columns, n_bins, n_pitch, max_wave_points, max_columns,
+    max_pitch_points) y un float32 (frequency_step), seguida de float32: tiempos y valores del
+    oscilograma, tiempos de las columnas, columnas del espectrograma (n_columns × n_bins) y
+    tiempos, F0 e intensidad de los frames de pitch. n_bins viene del espectrograma porque un
+    bloque puede no completar ninguna columna.
+    """
+    columns = np.asarray(columns, dtype=np.float32).reshape(len(column_times), n_bins)
+    header = np.array([len(wave_times), len(column_times), n_bins, len(pitch_times),
+                       max_wave_points, max_columns, max_pitch_points], dtype='<u4')
+    return b''.join((
+        header.tobytes(),
+        np.array([frequency_step], dtype='<f4').tobytes(),
+        np.asarray(wave_times, dtype='<f4').tobytes(),
+        np.asarray(wave_values, dtype='<f4').tobytes(),
+        np.asarray(column_times, dtype='<f4').tobytes(),
+        columns.astype('<f4').tobytes(),
+        np.asarray(pitch_times, dtype='<f4').tobytes(),
+        np.asarray(pitch_values, dtype='<f4').tobytes(),
+        np.asarray(intensity_values, dtype='<f4').tobytes(),
+    ))
@@ -0,0 +1,242 @@
+# Cola de trabajos en segundo plano para que los análisis no bloqueen a los workers de Dash
+import multiprocessing
+import os
+import pickle
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from cache_analisis import cache_key
+from almacen_audio import audio_path
+from metricas import metrics
+
+JOB_WORKERS = int(os.environ.get('ANALYSIS_JOB_WORKERS', 2))
+# El estado de los trabajos se guarda en disco para que cualquier worker de gunicorn pueda consultarlo
+JOBS_DIR = os.path.abspath(os.environ.get('ANALYSIS_JOBS_DIR', 'trabajos_en_curso'))
+JOB_MAX_AGE = 60 * 60  # Segundos que se guardan los trabajos que nadie vino a buscar
+# Un trabajo sin resultado tras este tiempo (desde que se encoló) se da por perdido
+JOB_TIMEOUT = float(os.environ.get('ANALYSIS_JOB_TIMEOUT', 15 * 60))
+
+executor = None
+pool_generation = 0  # Cuántas veces este proceso creó el pool (cambia si se recrea tras romperse)
+executor_lock = threading.Lock()
+jobs = {}  # id del trabajo -> future, sólo los encolados por este proceso y aún sin terminar
+jobs_lock = threading.Lock()
+
+
+def get_executor():
+    # El pool se crea en el primer uso, ya dentro del proceso del worker
+    # (con el lock, para que dos peticiones simultáneas no creen dos pools)
+    global executor, pool_generation
+    with executor_lock:
+        if executor is None:
+            executor = ProcessPoolExecutor(max_workers=JOB_WORKERS, mp_context=multiprocessing.get_context('spawn'),
+                                           initializer=warm_up_worker)
+            pool_generation += 1
+        return executor, pool_generation
+
+
+def submit_to_pool(fn, *args):
+    """
+    Envía una tarea al pool y devuelve (future, generación del pool). Si un proceso del pool murió,
+    el pool queda roto (sus tareas terminan con BrokenProcessPool) y se crea uno nuevo.
+    """
+    global executor
+    pool, generation = get_executor()
+    try:
+        return pool.submit(fn, *args), generation
+    except BrokenProcessPool:
+        with executor_lock:
+            if executor is pool:
+                executor = None
+        pool.shutdown(wait=False)
+        pool, generation = get_executor()
+        return pool.submit(fn, *args), generation
+
+
+def warm_up_worker():
+    # Cada proceso del pool precarga el análisis al arrancar, antes de recibir su primer trabajo
+    from graficas import warm_up
+    warm_up()
+
+
+def start_workers():
+    # Arranca todos los procesos del pool (se crean a medida que se envían tareas)
+    for _ in range(JOB_WORKERS):
+        submit_to_pool(os.getpid)
+
+
+def run_analysis(params, audio_id):
+    """
+    Se ejecuta en un proceso del pool. Analiza un audio del almacén.
+    Devuelve (id del audio, clave, entrada de la caché, etapas medidas); la entrada es None si
+    el análisis falla. Las etapas [(nombre, segundos)] se registran en las métricas del proceso principal.
+    """
+    with metrics.collect_stages() as stages:
+        key, entry = analyze_job(params, audio_id)
+    return audio_id, key, entry, stages
+
+
+def analyze_job(params, audio_id):
+    from graficas import compute_analysis
+
+    key = cache_key(audio_id, params)
+
+    # Sólo se calcula el análisis: las figuras se generan cuando se abre cada pestaña
+    try:
+        analysis = compute_analysis(audio_path(audio_id))
+    except Exception as e:
+        print(f"Error al analizar el archivo: {e}")
+        return key, None
+    # La entrada de la caché no lleva las muestras: el oscilograma las lee del audio en el almacén
+    analysis.map_samples(audio_path(audio_id))
+
+    return key, {
+        'analysis': analysis,
+        'mean_pitch': analysis.mean_pitch,
+    }
+
+
+def submit_analysis(params, audio_id):
+    """
+    Encola el análisis de un audio (ver run_analysis) y devuelve el id del trabajo.
+    """
+    job_id = uuid.uuid4().hex
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    _remove_stale_jobs()
+    submitted = time.time()
+    future, generation = submit_to_pool(run_analysis, params, audio_id)
+    # El proceso y el pool que lo ejecutan permiten saber si el trabajo se perdió (ver job_lost)
+    _write_job_file(job_id, 'job', {'submitted': submitted, 'pid': os.getpid(), 'pool': generation})
+    with jobs_lock:
+        jobs[job_id] = future
+    future.add_done_callback(lambda future: _save_job_result(job_id, future))
+    return job_id
+
+
+def _save_job_result(job_id, future):
+    # Corre en el proceso que encoló el trabajo; el resultado queda en disco para el worker que lo consulte
+    try:
+        result = future.result()
+    except Exception as e:
+        print(f"Error en el trabajo de análisis: {e}")
+        result = None
+    _write_job_file(job_id, 'result', {'result': result})
+    with jobs_lock:
+        jobs.pop(job_id, None)
+
+
+def analyze_now(params, audio_id):
+    """
+    Analiza un audio del almacén en el pool y espera el resultado (para callbacks que lo necesitan
+    ya, p. ej. cuando la entrada salió de la caché). Devuelve la entrada de la caché o None.
+    """
+    future, _ = submit_to_pool(run_analysis, params, audio_id)
+    _, _, entry, stages = future.result()
+    metrics.observe_stages(stages)
+    return entry
+
+
+def job_status(job_id):
+    """
+    Estado de un trabajo: ('unknown' | 'queued' | 'running' | 'done' | 'error', datos).
+    Al terminar, los datos son el trabajo con 'audio_id', 'key' y 'entry' y el trabajo se olvida.
+    """
+    if not is_valid_job_id(job_id):
+        return 'unknown', None
+    job = _read_job_file(job_id, 'job')
+    if job is None:
+        return 'unknown', None
+
+    done = _read_job_file(job_id, 'result')
+    if done is None:
+        job['elapsed'] = time.time() - job['submitted']
+        # Sólo el proceso que encoló el trabajo sabe si sigue en la cola del pool
+        with jobs_lock:
+            future = jobs.get(job_id)
+        if not job_lost(job, future):
+            return ('queued' if future is not None and not future.running() else 'running'), job
+        # El resultado pudo escribirse después de la primera lectura
+        done = _read_job_file(job_id, 'result')
+        if done is None:
+            print(f"Trabajo de análisis perdido tras {job['elapsed']:.0f} s")
+            metrics.inc('tg_analysis_jobs_lost_total')
+            if future is not None:
+                future.cancel()
+            _remove_job_files(job_id)
+            return 'error', job
+
+    _remove_job_files(job_id)
+    if done['result'] is None:
+        return 'error', job
+    job['audio_id'], job['key'], job['entry'], stages = done['result']
+    metrics.observe_stages(stages)
+    metrics.observe('tg_stage_seconds', time.time() - job['submitted'], stage='analysis_job')
+    return ('done' if job['entry'] is not None else 'error'), job
+
+
+def job_lost(job, future):
+    """
+    Un trabajo sin resultado está perdido si superó JOB_TIMEOUT, si el proceso que lo encoló
+    (y guardaría su resultado) ya no existe, o si ese proceso recreó su pool después de encolarlo.
+    """
+    if job['elapsed'] > JOB_TIMEOUT:
+        return True
+    if future is not None:
+        return False
+    if job['pid'] == os.getpid():
+        # El future ya no está en jobs: el trabajo terminó (ver la segunda lectura) o el pool cambió
+        return job['pool'] != pool_generation
+    try:
+        os.kill(job['pid'], 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
+
+
+def is_valid_job_id(job_id):
+    return job_id is not None and re.fullmatch(r'[0-9a-f]{32}', job_id) is not None
+
+
+def _job_path(job_id, extension):
+    return os.path.join(JOBS_DIR, f"{job_id}.{extension}")
+
+
+def _write_job_file(job_id, extension, data):
+    path = _job_path(job_id, extension)
+    with open(path + '.tmp', 'wb') as f:
+        pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(path + '.tmp', path)
+
+
+def _read_job_file(job_id, extension):
+    try:
+        with open(_job_path(job_id, extension), 'rb') as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _remove_job_files(job_id):
+    for extension in ('job', 'result'):
+        try:
+            os.remove(_job_path(job_id, extension))
+        except FileNotFoundError:
+            pass
+
+
+def _remove_stale_jobs():
+    # Borrar los trabajos que la página dejó de consultar (p. ej. se cerró antes de terminar el análisis)
+    limit = time.time() - JOB_MAX_AGE
+    for name in os.listdir(JOBS_DIR):
+        path = os.path.join(JOBS_DIR, name)
+        try:
+            if os.path.getmtime(path) < limit:
+                os.remove(path)
+        except FileNotFoundError:
+            pass